@@ -0,0 +1,427 @@
+"""
+Control de admisión para la API de CuidaElMango
+
+Cada request se clasifica por endpoint (CLASES) y tiene que conseguir un lugar
+antes de ejecutarse:
+
+- Límite global de requests en vuelo, adaptativo: cuando la latencia sube
+  respecto de la normal de cada clase (Supabase lento) el límite baja, y
+  vuelve a subir de a poco cuando la latencia se recupera
+- Tope por clase (fracción del límite global): las comparaciones pesadas no
+  pueden ocupar todos los lugares
+- Sin lugar, el request espera en una cola por prioridad con un plazo por
+  clase; si vence el plazo, o la cola está llena y hay que hacer lugar, se
+  descarta primero lo de menor prioridad con 503 + Retry-After (estimado con
+  la latencia observada)
+
+Las búsquedas interactivas siguen rápidas y lo pesado se degrada de a poco.
+Un proceso = un controlador (con varios workers cada uno tiene el suyo).
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import time
+
+from metricas import contar, etapa
+
+
+class ClaseAdmision:
+    """
+    Args:
+        prioridad (int): 0 = la más importante (se descarta último)
+        fraccion (float): Tope de la clase como fracción del límite global
+        espera_maxima (float): Segundos que puede esperar en cola (0 = no espera)
+        maximo (int): Tope fijo de la clase (en vez de la fracción)
+        adaptar (bool): Si su latencia ajusta el límite global (no en streams largos)
+    """
+
+    def __init__(self, nombre, prioridad, fraccion=1.0, espera_maxima=1.0, maximo=None, adaptar=True):
+        self.nombre = nombre
+        self.prioridad = prioridad
+        self.fraccion = fraccion
+        self.espera_maxima = espera_maxima
+        self.maximo = maximo
+        self.adaptar = adaptar
+
+
+CLASES = {
+    clase.nombre: clase for clase in (
+        ClaseAdmision("interactiva", 0, fraccion=1.0, espera_maxima=0.5),
+        ClaseAdmision("general", 1, fraccion=0.75, espera_maxima=1.0),
+        ClaseAdmision("pesada", 2, fraccion=0.5, espera_maxima=2.0),
+        # Comparaciones en stream: su duración es la del stream entero, no adapta
+        # (con pesada suman 0.75, siempre quedan lugares para lo interactivo)
+        ClaseAdmision("stream", 2, fraccion=0.25, espera_maxima=2.0, adaptar=False),
+        ClaseAdmision("exportacion", 3, espera_maxima=0, maximo=2, adaptar=False),
+    )
+}
+
+# (método, prefijo de ruta, clase); la primera que coincide. None = sin control
+RUTAS = (
+    ("GET", "/metrics", None),
+    ("GET", "/test-db", None),
+    ("GET", "/productos/buscar", "interactiva"),
+    ("GET", "/productos/autocomplete", "interactiva"),
+    ("GET", "/imagenes", "interactiva"),
+    ("GET", "/productos/export", "exportacion"),
+    ("POST", "/comparar-inteligente/stream", "stream"),
+    ("POST", "/comparar-inteligente", "pesada"),
+)
+CLASE_DEFAULT = "general"
+
+# Carritos más grandes que esto (bytes del body) bajan un nivel de prioridad
+BODY_GRANDE = 8 * 1024
+
+# Límite global de requests en vuelo (el threadpool de Starlette tiene 40 threads)
+LIMITE_INICIAL = 20
+LIMITE_MINIMO = 4
+LIMITE_MAXIMO = 40
+
+# Requests esperando como máximo (entre todas las clases)
+MAXIMO_COLA = 200
+
+# Latencia "normal" de cada clase vs la reciente (promedio rápido). La normal
+# baja enseguida pero sube muy despacio: una degradación sostenida no se
+# vuelve "normal" en unos segundos
+ALFA_BASE_SUBE = 0.002
+ALFA_BASE_BAJA = 0.1
+ALFA_RECIENTE = 0.2
+
+# Cuánto más lenta que la normal se tolera antes de bajar el límite
+TOLERANCIA_LATENCIA = 2.0
+
+# Muestras de una clase antes de usarla para adaptar
+MUESTRAS_MINIMAS = 20
+
+# Retry-After (segundos)
+REINTENTO_MINIMO = 1
+REINTENTO_MAXIMO = 30
+
+
+class Rechazo(Exception):
+    """Request descartado por el control de admisión"""
+
+    def __init__(self, motivo, reintentar_en):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.reintentar_en = reintentar_en
+
+
+class _Esperando:
+    __slots__ = ("clase", "prioridad", "futuro", "cancelado")
+
+    def __init__(self, clase, prioridad, futuro):
+        self.clase = clase
+        self.prioridad = prioridad
+        self.futuro = futuro
+        self.cancelado = False
+
+
+class ControlAdmision:
+    """
+    Límite adaptativo + topes por clase + cola con prioridades y plazos
+
+    Vive en el event loop: ninguna operación bloquea ni necesita locks.
+    """
+
+    def __init__(self, clases=CLASES, limite_inicial=LIMITE_INICIAL,
+                 limite_minimo=LIMITE_MINIMO, limite_maximo=LIMITE_MAXIMO, maximo_cola=MAXIMO_COLA):
+        self.clases = clases
+        self.limite = float(limite_inicial)
+        self.limite_minimo = limite_minimo
+        self.limite_maximo = limite_maximo
+        self.maximo_cola = maximo_cola
+
+        self.en_vuelo = 0
+        self.en_vuelo_clase = dict.fromkeys(clases, 0)
+        self.en_cola_clase = dict.fromkeys(clases, 0)
+        self.rechazos = {}
+
+        # clase -> [latencia base, latencia reciente, muestras]
+        self.latencias = {nombre: [None, None, 0] for nombre in clases}
+        # Cociente reciente/base, promediado entre clases
+        self.presion = 1.0
+
+        self._cola = []
+        self._orden = itertools.count()
+
+    # ============================================
+    # CLASIFICACIÓN
+    # ============================================
+
+    def clasificar(self, metodo, ruta, largo_body=0):
+        """
+        Returns:
+            tuple: (clase, prioridad) o None si la ruta no pasa por el control
+        """
+        # Los preflight de CORS no se descartan nunca (si no el navegador ve un
+        # error de red en vez del 503)
+        if ruta == "/" or metodo == "OPTIONS":
+            return None
+
+        nombre = CLASE_DEFAULT
+        for metodo_ruta, prefijo, clase in RUTAS:
+            if metodo == metodo_ruta and ruta.startswith(prefijo):
+                nombre = clase
+                break
+
+        if nombre is None:
+            return None
+
+        prioridad = self.clases[nombre].prioridad
+        if largo_body > BODY_GRANDE:
+            prioridad += 1
+        return nombre, prioridad
+
+    # ============================================
+    # ADMISIÓN
+    # ============================================
+
+    def _tope(self, nombre):
+        clase = self.clases[nombre]
+        if clase.maximo is not None:
+            return clase.maximo
+        return max(1, int(self.limite * clase.fraccion))
+
+    def _hay_lugar(self, nombre):
+        if self.clases[nombre].maximo is not None:
+            # Las clases con tope fijo no cuentan contra el límite global
+            return self.en_vuelo_clase[nombre] < self._tope(nombre)
+        return self.en_vuelo < int(self.limite) and self.en_vuelo_clase[nombre] < self._tope(nombre)
+
+    def _ocupar(self, nombre):
+        self.en_vuelo_clase[nombre] += 1
+        if self.clases[nombre].maximo is None:
+            self.en_vuelo += 1
+
+    def reintentar_en(self, nombre):
+        """Segundos sugeridos para reintentar: lo que tarda en vaciarse lo que hay adelante"""
+        latencia = self.latencias[nombre][1] or 1.0
+        delante = len(self._cola) + self.en_vuelo_clase[nombre]
+        segundos = latencia * max(1.0, delante / max(self._tope(nombre), 1))
+        return int(min(max(math.ceil(segundos), REINTENTO_MINIMO), REINTENTO_MAXIMO))
+
+    def _rechazar(self, nombre, motivo):
+        self.rechazos[(nombre, motivo)] = self.rechazos.get((nombre, motivo), 0) + 1
+        return Rechazo(motivo, self.reintentar_en(nombre))
+
+    async def entrar(self, nombre, prioridad):
+        """
+        Espera un lugar para un request de la clase
+
+        Raises:
+            Rechazo: Si no hubo lugar dentro del plazo de la clase (o se descartó para hacer lugar)
+        """
+        # Sin saltearse a los que ya esperan con igual o mayor prioridad
+        if self._hay_lugar(nombre) and not any(
+            not e.cancelado and e.prioridad <= prioridad and e.clase == nombre for _, _, e in self._cola
+        ):
+            self._ocupar(nombre)
+            return
+
+        clase = self.clases[nombre]
+        if clase.espera_maxima <= 0:
+            raise self._rechazar(nombre, "lleno")
+
+        # Si con la latencia actual no va a entrar a tiempo, mejor avisar ya
+        reciente = self.latencias[nombre][1]
+        if reciente is not None:
+            espera = (self.en_cola_clase[nombre] + 1) * reciente / self._tope(nombre)
+            if espera > clase.espera_maxima:
+                raise self._rechazar(nombre, "espera_estimada")
+
+        if len(self._cola) >= self.maximo_cola:
+            # Hacer lugar descartando al de menor prioridad (el más nuevo entre iguales)
+            peor = max(self._cola, key=lambda item: (item[0], item[1]))
+            if peor[0] <= prioridad:
+                raise self._rechazar(nombre, "cola_llena")
+            self._cola.remove(peor)
+            heapq.heapify(self._cola)
+            self._sacar_de_cola(peor[2])
+            peor[2].futuro.set_exception(self._rechazar(peor[2].clase, "descartado"))
+
+        esperando = _Esperando(nombre, prioridad, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._cola, (prioridad, next(self._orden), esperando))
+        self.en_cola_clase[nombre] += 1
+
+        try:
+            hechos, _ = await asyncio.wait({esperando.futuro}, timeout=clase.espera_maxima)
+        except asyncio.CancelledError:
+            # El cliente se fue mientras esperaba: devolver el lugar si ya se lo habían dado
+            if esperando.futuro.done() and not esperando.futuro.exception():
+                self.salir(nombre, None)
+            else:
+                self._abandonar(esperando)
+            raise
+
+        if not hechos:
+            self._abandonar(esperando)
+            raise self._rechazar(nombre, "plazo")
+
+        esperando.futuro.result()  # relanza el Rechazo si lo descartaron
+
+    def _abandonar(self, esperando):
+        if esperando.futuro.done():
+            return
+        esperando.cancelado = True
+        esperando.futuro.cancel()
+        self._sacar_de_cola(esperando)
+        self._cola = [item for item in self._cola if item[2] is not esperando]
+        heapq.heapify(self._cola)
+
+    def _sacar_de_cola(self, esperando):
+        self.en_cola_clase[esperando.clase] -= 1
+
+    def salir(self, nombre, segundos):
+        """Libera el lugar y aprende de la latencia observada (segundos None: no aprende)"""
+        self.en_vuelo_clase[nombre] -= 1
+        if self.clases[nombre].maximo is None:
+            self.en_vuelo -= 1
+        if segundos is not None and self.clases[nombre].adaptar:
+            self._adaptar(nombre, segundos)
+        self._despachar()
+
+    def _despachar(self):
+        """Admite a los que esperan, en orden de prioridad, mientras su clase tenga lugar"""
+        pendientes = []
+        while self._cola:
+            item = heapq.heappop(self._cola)
+            esperando = item[2]
+            if esperando.cancelado:
+                continue
+            if self._hay_lugar(esperando.clase):
+                self._ocupar(esperando.clase)
+                self._sacar_de_cola(esperando)
+                esperando.futuro.set_result(True)
+            else:
+                pendientes.append(item)
+                if self.en_vuelo >= int(self.limite):
+                    break
+        for item in pendientes:
+            heapq.heappush(self._cola, item)
+
+    # ============================================
+    # LÍMITE ADAPTATIVO
+    # ============================================
+
+    def _adaptar(self, nombre, segundos):
+        """
+        Límite estilo gradiente: limite * min(1, tolerancia / presión) + sqrt(limite),
+        suavizado. Con latencias normales crece de a poco hasta el máximo; con
+        la latencia reciente muy por encima de la base, baja proporcionalmente.
+        """
+        latencia = self.latencias[nombre]
+        if latencia[0] is None:
+            latencia[0] = latencia[1] = segundos
+        else:
+            alfa = ALFA_BASE_SUBE if segundos > latencia[0] else ALFA_BASE_BAJA
+            latencia[0] += alfa * (segundos - latencia[0])
+            latencia[1] += ALFA_RECIENTE * (segundos - latencia[1])
+        latencia[2] += 1
+        if latencia[2] < MUESTRAS_MINIMAS or latencia[0] <= 0:
+            return
+
+        self.presion += ALFA_RECIENTE * (latencia[1] / latencia[0] - self.presion)
+        gradiente = min(1.0, max(0.5, TOLERANCIA_LATENCIA / self.presion))
+        if gradiente == 1.0 and self.en_vuelo < self.limite / 2:
+            # Con poca carga la latencia no dice nada sobre un límite más alto
+            return
+        nuevo = self.limite * gradiente + math.sqrt(self.limite)
+        self.limite = min(max(0.9 * self.limite + 0.1 * nuevo, self.limite_minimo), self.limite_maximo)
+
+    # ============================================
+    # ESTADO
+    # ============================================
+
+    def estado(self):
+        return {
+            "limite": round(self.limite, 1),
+            "presion": round(self.presion, 2),
+            "en_vuelo": self.en_vuelo,
+            "en_vuelo_clase": dict(self.en_vuelo_clase),
+            "en_cola_clase": dict(self.en_cola_clase),
+            "rechazos": {f"{clase}:{motivo}": n for (clase, motivo), n in self.rechazos.items()},
+        }
+
+    def exportar(self):
+        """Series Prometheus del controlador (se agregan a /metrics)"""
+        lineas = [
+            "# TYPE cuidaelmango_admision_limite gauge",
+            f"cuidaelmango_admision_limite {self.limite:.2f}",
+            "# TYPE cuidaelmango_admision_presion gauge",
+            f"cuidaelmango_admision_presion {self.presion:.4f}",
+            "# TYPE cuidaelmango_admision_en_vuelo gauge",
+        ]
+        lineas += [f'cuidaelmango_admision_en_vuelo{{clase="{c}"}} {n}' for c, n in self.en_vuelo_clase.items()]
+        lineas.append("# TYPE cuidaelmango_admision_en_cola gauge")
+        lineas += [f'cuidaelmango_admision_en_cola{{clase="{c}"}} {n}' for c, n in self.en_cola_clase.items()]
+        lineas.append("# TYPE cuidaelmango_admision_rechazos_total counter")
+        lineas += [
+            f'cuidaelmango_admision_rechazos_total{{clase="{c}",motivo="{m}"}} {n}'
+            for (c, m), n in sorted(self.rechazos.items())
+        ]
+        return "\n".join(lineas) + "\n"
+
+
+class MiddlewareAdmision:
+    """
+    Middleware ASGI: pide lugar al controlador antes de pasar el request
+
+    El lugar se libera cuando termina la respuesta (en streams, al final del
+    stream). Los rechazos son 503 con Retry-After y el detalle en JSON.
+    """
+
+    def __init__(self, app, control):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        largo = 0
+        for nombre, valor in scope.get("headers", ()):
+            if nombre == b"content-length":
+                largo = int(valor) if valor.isdigit() else 0
+                break
+
+        clasificacion = self.control.clasificar(scope["method"], scope["path"], largo)
+        if clasificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        clase, prioridad = clasificacion
+        try:
+            with etapa("cola"):
+                await self.control.entrar(clase, prioridad)
+        except Rechazo as rechazo:
+            contar(f"rechazo_{clase}")
+            await self._rechazar(send, rechazo, clase)
+            return
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.salir(clase, time.perf_counter() - inicio)
+
+    async def _rechazar(self, send, rechazo, clase):
+        cuerpo = json.dumps({
+            "detail": "Servidor saturado, reintentar más tarde",
+            "clase": clase,
+            "motivo": rechazo.motivo,
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"retry-after", str(rechazo.reintentar_en).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
@@ -0,0 +1,293 @@
+"""
+Alertas de precio para CuidaElMango
+
+Cada scrape arma un lote con los cambios de precio/promo de la corrida y el
+motor lo evalúa contra todas las reglas de seguimiento de los usuarios:
+
+- Tipos de regla: producto, cluster (el mismo producto en cualquier tienda)
+  y marca+categoría
+- Las reglas se buscan por (tipo, clave) con un índice, a partir de las claves
+  que aparecen en el lote: el costo depende del tamaño del lote y de las reglas
+  que coinciden, no de la cantidad total de reglas o usuarios
+- Las notificaciones quedan en una tabla outbox local; otro proceso las envía
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from catalogo import DIR_COMPARTIDO, WAL_COMPARTIDO
+
+
+RUTA_ALERTAS = os.path.join(DIR_COMPARTIDO, "alertas.sqlite")
+
+TIPOS_REGLA = ("producto", "cluster", "marca_categoria")
+
+# Texto que ponen los scrapers cuando el producto no tiene promo
+SIN_PROMO = "Precio Regular"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS reglas (
+    id INTEGER PRIMARY KEY,
+    usuario_id TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    tienda TEXT,
+    caida_minima_pct REAL NOT NULL DEFAULT 0,
+    incluir_promos INTEGER NOT NULL DEFAULT 1,
+    creada TEXT NOT NULL
+);
+
+-- Lo único que se consulta al evaluar un lote
+CREATE INDEX IF NOT EXISTS idx_reglas_clave ON reglas (tipo, clave);
+
+CREATE INDEX IF NOT EXISTS idx_reglas_usuario ON reglas (usuario_id);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    usuario_id TEXT NOT NULL,
+    regla_id INTEGER NOT NULL,
+    producto_id INTEGER NOT NULL,
+    tienda TEXT,
+    precio_anterior REAL,
+    precio REAL NOT NULL,
+    caida_pct REAL,
+    promo TEXT,
+    ts INTEGER NOT NULL,
+    creada TEXT NOT NULL,
+    enviada INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_pendientes ON outbox (enviada, id);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_usuario ON outbox (usuario_id, id);
+"""
+
+
+def claves_evento(evento):
+    """
+    Claves de regla que puede disparar un evento de cambio de precio
+
+    Returns:
+        list: Tuplas (tipo, clave)
+    """
+    claves = [("producto", str(evento["producto_id"]))]
+    if evento.get("cluster_id") is not None:
+        claves.append(("cluster", str(evento["cluster_id"])))
+    if evento.get("marca_id") and evento.get("categoria"):
+        claves.append(("marca_categoria", f"{evento['marca_id']}|{evento['categoria']}"))
+    return claves
+
+
+def clave_regla(tipo, producto_id=None, cluster_id=None, marca_id=None, categoria=None):
+    """Clave indexada de una regla nueva (mismo formato que claves_evento)"""
+    if tipo == "producto" and producto_id is not None:
+        return str(producto_id)
+    if tipo == "cluster" and cluster_id is not None:
+        return str(cluster_id)
+    if tipo == "marca_categoria" and marca_id and categoria:
+        return f"{marca_id}|{categoria}"
+    raise ValueError(f"Faltan datos para una regla de tipo {tipo}")
+
+
+def promo_real(texto):
+    """Texto de la promo, o None si no hay (vacío o SIN_PROMO)"""
+    if not texto or texto.strip().lower() == SIN_PROMO.lower():
+        return None
+    return texto
+
+
+def caida_pct(evento):
+    anterior = evento.get("precio_anterior")
+    if not anterior or evento["precio"] >= anterior:
+        return 0
+    return round((anterior - evento["precio"]) / anterior * 100, 2)
+
+
+def dispara(regla, evento):
+    """
+    True si el evento cumple la regla: baja al menos caida_minima_pct,
+    o aparece una promo nueva (si la regla incluye promos)
+
+    La primera observación de un producto (sin precio anterior) no dispara:
+    no hay contra qué comparar.
+    """
+    if evento.get("precio_anterior") is None:
+        return False
+
+    if regla["tienda"] and regla["tienda"] != evento.get("tienda"):
+        return False
+
+    caida = caida_pct(evento)
+    if caida > 0 and caida >= regla["caida_minima_pct"]:
+        return True
+
+    promo = promo_real(evento.get("promo"))
+    promo_nueva = promo and promo != promo_real(evento.get("promo_anterior"))
+    return bool(regla["incluir_promos"] and promo_nueva)
+
+
+class MotorAlertas:
+    """
+    Reglas de seguimiento + outbox de notificaciones
+
+    Una conexión por thread, igual que la réplica y el histórico.
+    """
+
+    def __init__(self, ruta=RUTA_ALERTAS, wal=WAL_COMPARTIDO):
+        self.ruta = ruta
+        self.wal = wal
+        self._local = threading.local()
+        self._esquema_creado = False
+        self._lock = threading.Lock()
+
+    def _crear_esquema(self):
+        with self._lock:
+            if self._esquema_creado:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            with sqlite3.connect(self.ruta) as conexion:
+                conexion.executescript(ESQUEMA)
+            self._esquema_creado = True
+
+    def conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            if not self._esquema_creado:
+                self._crear_esquema()
+            conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+            conexion.row_factory = sqlite3.Row
+            conexion.execute(f"PRAGMA journal_mode={'WAL' if self.wal else 'DELETE'}")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    # ============================================
+    # REGLAS
+    # ============================================
+
+    def agregar_regla(self, usuario_id, tipo, clave, tienda=None, caida_minima_pct=0, incluir_promos=True):
+        """
+        Returns:
+            int: id de la regla
+        """
+        if tipo not in TIPOS_REGLA:
+            raise ValueError(f"Tipo de regla inválido: {tipo} (opciones: {', '.join(TIPOS_REGLA)})")
+
+        conexion = self.conexion()
+        with conexion:
+            cursor = conexion.execute(
+                "INSERT INTO reglas (usuario_id, tipo, clave, tienda, caida_minima_pct, incluir_promos, creada) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (usuario_id, tipo, clave, tienda, caida_minima_pct or 0, int(incluir_promos),
+                 datetime.now().isoformat())
+            )
+        return cursor.lastrowid
+
+    def borrar_regla(self, usuario_id, regla_id):
+        conexion = self.conexion()
+        with conexion:
+            cursor = conexion.execute(
+                "DELETE FROM reglas WHERE id = ? AND usuario_id = ?", (regla_id, usuario_id)
+            )
+        return cursor.rowcount > 0
+
+    def reglas_usuario(self, usuario_id):
+        return [
+            dict(fila) for fila in self.conexion().execute(
+                "SELECT * FROM reglas WHERE usuario_id = ? ORDER BY id", (usuario_id,)
+            )
+        ]
+
+    # ============================================
+    # EVALUACIÓN
+    # ============================================
+
+    def evaluar(self, eventos):
+        """
+        Evalúa un lote de cambios de precio contra todas las reglas
+
+        Las claves del lote van a una tabla temporal y se cruzan con reglas por
+        el índice (tipo, clave); un usuario recibe una sola notificación por
+        producto aunque lo sigan varias de sus reglas.
+
+        Args:
+            eventos (list): Dicts con producto_id, tienda, precio_anterior, precio,
+                            promo_anterior, promo, ts y opcionalmente cluster_id,
+                            marca_id, categoria
+
+        Returns:
+            int: Notificaciones agregadas al outbox
+        """
+        if not eventos:
+            return 0
+
+        conexion = self.conexion()
+        ahora = datetime.now().isoformat()
+
+        with conexion:
+            conexion.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS lote (evento INTEGER, tipo TEXT, clave TEXT)"
+            )
+            conexion.execute("DELETE FROM lote")
+            conexion.executemany(
+                "INSERT INTO lote VALUES (?, ?, ?)",
+                [
+                    (indice, tipo, clave)
+                    for indice, evento in enumerate(eventos)
+                    for tipo, clave in claves_evento(evento)
+                ]
+            )
+
+            coincidencias = conexion.execute(
+                "SELECT lote.evento, r.id, r.usuario_id, r.tienda, r.caida_minima_pct, r.incluir_promos "
+                "FROM lote JOIN reglas r ON r.tipo = lote.tipo AND r.clave = lote.clave "
+                "ORDER BY lote.evento, r.id"
+            ).fetchall()
+
+            notificaciones = {}
+            for fila in coincidencias:
+                evento = eventos[fila["evento"]]
+                clave = (fila["usuario_id"], evento["producto_id"])
+                if clave in notificaciones or not dispara(fila, evento):
+                    continue
+                notificaciones[clave] = (
+                    fila["usuario_id"], fila["id"], evento["producto_id"], evento.get("tienda"),
+                    evento.get("precio_anterior"), evento["precio"], caida_pct(evento),
+                    promo_real(evento.get("promo")), evento["ts"], ahora
+                )
+
+            conexion.executemany(
+                "INSERT INTO outbox (usuario_id, regla_id, producto_id, tienda, precio_anterior, "
+                "precio, caida_pct, promo, ts, creada) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                list(notificaciones.values())
+            )
+            conexion.execute("DELETE FROM lote")
+
+        return len(notificaciones)
+
+    # ============================================
+    # OUTBOX
+    # ============================================
+
+    def pendientes(self, limite=500):
+        """Notificaciones sin enviar, en orden de llegada"""
+        return [
+            dict(fila) for fila in self.conexion().execute(
+                "SELECT * FROM outbox WHERE enviada = 0 ORDER BY id LIMIT ?", (limite,)
+            )
+        ]
+
+    def marcar_enviadas(self, ids):
+        conexion = self.conexion()
+        with conexion:
+            conexion.executemany("UPDATE outbox SET enviada = 1 WHERE id = ?", [(i,) for i in ids])
+
+    def notificaciones_usuario(self, usuario_id, limite=50):
+        return [
+            dict(fila) for fila in self.conexion().execute(
+                "SELECT * FROM outbox WHERE usuario_id = ? ORDER BY id DESC LIMIT ?",
+                (usuario_id, limite)
+            )
+        ]
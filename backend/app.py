@@ -1,13 +1,52 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
-from database import get_supabase_admin
-from matching import calcular_match_score, encontrar_mejores_matches
+from datetime import date
+import asyncio
+import threading
+from admision import ControlAdmision, MiddlewareAdmision
+from database import get_repositorio, get_storage, get_variable
+from matching import calcular_match_score, encontrar_mejores_matches, get_nivel_confianza
+from metricas import MiddlewareMetricas, RegistroMetricas, contar, etapa, muestreador_configurado
+from autocomplete import IndiceAutocompletado
+from cache import CacheRespuestas
+from catalogo import version_catalogo
+from clusters import ClustersProductos
+from emparejamiento import TIENDAS, buscar_vecindario
+from equivalencias import MapaEquivalencias
+from exportacion import (
+    FORMATOS, crear_cursor, filtros_exportacion, fin_bloque, generar_exportacion, leer_cursor, nombre_archivo
+)
+from historial import HistorialPrecios
+from imagenes import CACHE_CONTROL, HOSTS_PERMITIDOS, CacheImagenes, ErrorImagen
+from alertas import MotorAlertas, clave_regla
+from gastos import RegistroGastos, items_gasto
+from models import Gasto
+from optimizador import optimizar_compra
+from promociones import total_con_promo
+from serializacion import (
+    RespuestaJSON, GZipSinStreaming, GZIP_MINIMO,
+    compactar_fila, compactar_comparacion, serializar
+)
+from utils import marca_canonica, normalizar_texto
+from repositorio import RepositorioReplica
+from snapshot import SnapshotCompartido
 
 # Inicializar FastAPI
 app = FastAPI(title="CuidaElMango API")
 
+# Control de admisión: topes por clase de endpoint, cola con plazos y 503 al
+# saturarse. Se agrega antes que CORS para quedar adentro: los 503 salen con
+# Access-Control-Allow-Origin y los preflight los contesta CORS sin pasar por
+# acá (también queda dentro de las métricas, así los rechazos se miden)
+control_admision = None
+if get_variable("CUIDAELMANGO_ADMISION", "1") != "0":
+    control_admision = ControlAdmision()
+    app.add_middleware(MiddlewareAdmision, control=control_admision)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -17,8 +56,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Cliente Supabase
-supabase = get_supabase_admin()
+# Comprimir respuestas grandes (búsquedas y comparaciones)
+app.add_middleware(GZipSinStreaming, minimum_size=GZIP_MINIMO)
+
+# Server-Timing + histogramas para /metrics (el último agregado es el más externo:
+# el total incluye gzip)
+registro_metricas = RegistroMetricas()
+if get_variable("CUIDAELMANGO_METRICAS", "1") != "0":
+    app.add_middleware(MiddlewareMetricas, registro=registro_metricas, muestreador=muestreador_configurado())
+
+# Catálogo (Supabase, réplica local o memoria según CUIDAELMANGO_STORAGE);
+# no se conecta hasta la primera consulta
+repositorio = get_repositorio()
+
+# Cada cuánto se sincroniza la réplica local (si se usa)
+REPLICA_SYNC_SEGUNDOS = int(get_variable("CUIDAELMANGO_REPLICA_SYNC", "300"))
+
+# Snapshot del catálogo compartido entre workers (mmap), si ya se publicó uno
+snapshot_catalogo = SnapshotCompartido()
+
+# Índice de autocompletado (se construye al iniciar y con cada versión nueva del catálogo)
+indice_autocompletado = IndiceAutocompletado()
+lock_autocompletado = threading.Lock()
+
+# Equivalencias guardadas, en ambas direcciones
+mapa_equivalencias = MapaEquivalencias()
+
+# Clusters de equivalentes (union-find), se actualizan con cada equivalencia nueva
+clusters_productos = ClustersProductos()
+
+# Histórico de precios (lo escriben los scrapers; acá solo se leen los rollups)
+historial_precios = HistorialPrecios()
+
+# Reglas de alertas de precio y su outbox (los scrapers evalúan los cambios)
+motor_alertas = MotorAlertas()
+
+# Gastos de los usuarios con rollups por día/mes/categoría/tienda
+registro_gastos = RegistroGastos()
+
+# Cache de lecturas (búsquedas y equivalencias)
+cache_respuestas = CacheRespuestas()
+
+# Proxy de imágenes de las tiendas (cache en disco con miniaturas)
+cache_imagenes = CacheImagenes(
+    maximo_bytes=int(get_variable("CUIDAELMANGO_IMAGENES_MB", "512")) * 1024 * 1024,
+    hosts=(get_variable("CUIDAELMANGO_IMAGENES_HOSTS") or ",".join(HOSTS_PERMITIDOS)).split(",")
+)
+
+# Columnas por uso (nunca select("*"))
+COLUMNAS_BUSQUEDA = (
+    "id,nombre,tienda,marca,peso,peso_unidad,categoria,variante,precio,promo,imagen_url,url,"
+    "promo_tipo,promo_cantidad,promo_factor,precio_efectivo"
+)
+COLUMNAS_BUSQUEDA_COMPACTA = "id,nombre,tienda,marca,precio,precio_efectivo,imagen_url"
+COLUMNAS_MATCHING = COLUMNAS_BUSQUEDA + ",nombre_limpio,peso_base,unidad_familia,marca_id,variante_id,firma_nombre"
+
+# Promo del producto de origen: se lee del catálogo, el frontend no la manda
+COLUMNAS_PROMO = ("promo", "promo_tipo", "promo_cantidad", "promo_factor", "precio_efectivo")
+
+# Productos del carrito que se emparejan a la vez en modo streaming
+CONCURRENCIA_STREAM = 4
 
 
 # ============================================
@@ -35,10 +132,25 @@ class ProductoComparacion(BaseModel):
     categoria: Optional[str] = None
     variante: Optional[str] = None
     precio: float
+    cantidad: int = 1
 
 
+class ReglaAlerta(BaseModel):
+    usuario_id: str
+    tipo: str  # producto | cluster | marca_categoria
+    producto_id: Optional[int] = None
+    cluster_id: Optional[int] = None
+    marca: Optional[str] = None
+    categoria: Optional[str] = None
+    tienda: Optional[str] = None
+    caida_minima_pct: float = 0
+    incluir_promos: bool = True
+
 class RequestComparacion(BaseModel):
     productos: List[ProductoComparacion]
+    max_tiendas: int = 2
+    costo_fijo_tienda: float = 0
+    usar_precio_efectivo: bool = False  # totales con las promos aplicadas a cada cantidad
 
 
 # ============================================
@@ -52,8 +164,16 @@ async def root():
         "version": "2.0",
         "endpoints": [
             "/productos/buscar",
+            "/productos/autocomplete",
+            "/productos/export",
+            "/imagenes",
             "/comparar-inteligente",
-            "/equivalencias"
+            "/equivalencias",
+            "/productos/{producto_id}/cluster",
+            "/productos/{producto_id}/historial",
+            "/alertas",
+            "/gastos",
+            "/metrics"
         ]
     }
 
@@ -61,62 +181,379 @@ async def root():
 @app.get("/test-db")
 async def test_db():
     try:
-        result = supabase.table("productos").select("count").execute()
-        return {"status": "ok", "message": "Conexión a Supabase exitosa"}
+        repositorio.verificar()
+        return {"status": "ok", "message": f"Conexión exitosa ({get_storage()})"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
+@app.get("/metrics")
+async def metricas():
+    """
+    Histogramas de requests, etapas y contadores en formato Prometheus (de este proceso)
+    """
+    contenido = registro_metricas.exportar()
+    if control_admision is not None:
+        contenido += control_admision.exportar()
+    return Response(
+        contenido,
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 # ============================================
-# ENDPOINTS DE BÚSQUEDA
+# INICIO
 # ============================================
 
-@app.get("/productos/buscar")
-async def buscar_productos(query: str, tienda: Optional[str] = None, limit: int = 50):
+def cargar_equivalencias():
     """
-    Busca productos por nombre (con normalización de acentos)
+    (Re)carga el mapa de equivalencias y los clusters
+    """
+    version = version_catalogo()
+    filas = repositorio.listar_equivalencias()
+    mapa_equivalencias.cargar(filas, version)
+    clusters_productos.cargar(filas, version)
+
+
+def asegurar_equivalencias_actualizadas():
+    """
+    Recarga el mapa si un scrape publicó otra versión del catálogo
+    """
+    if mapa_equivalencias.version != version_catalogo():
+        cargar_equivalencias()
+
+
+def cargar_autocompletado():
+    """
+    (Re)construye el índice de autocompletado conservando la popularidad acumulada
     """
+    version = version_catalogo()
+    popularidad = indice_autocompletado.popularidad()
+
+    # Sobre el snapshot mapeado si hay uno (compartido entre workers, sin ir
+    # a la base); si no, en memoria desde el repositorio
     try:
-        busqueda_query = supabase.table("productos").select("*")
-        
-        # Filtrar por tienda si se especifica
-        if tienda:
-            busqueda_query = busqueda_query.eq("tienda", tienda)
+        snapshot = snapshot_catalogo.actual()
+    except ValueError as e:
+        print(f"⚠️  Snapshot ignorado: {e}")
+        snapshot = None
+
+    if snapshot is not None:
+        indice_autocompletado.construir_desde_snapshot(snapshot, popularidad, version)
+    else:
+        productos = repositorio.listar_productos("id,nombre,tienda,marca,precio")
+        indice_autocompletado.construir(productos, popularidad, version)
+
+
+def asegurar_autocompletado_actualizado():
+    """
+    Reconstruye el índice si un scrape publicó otra versión del catálogo
+
+    Reconstruye un solo thread; los pedidos que llegan mientras tanto siguen
+    con el índice anterior en vez de esperar.
+    """
+    if indice_autocompletado.version == version_catalogo():
+        return
+    if not lock_autocompletado.acquire(blocking=False):
+        return
+    try:
+        if indice_autocompletado.version != version_catalogo():
+            cargar_autocompletado()
+    finally:
+        lock_autocompletado.release()
+
+
+def sincronizar_replica():
+    """
+    Trae los cambios de Supabase a la réplica local (incremental)
+    """
+    copiados = repositorio.sincronizar()
+    if copiados:
+        print(f"🔄 Réplica: {copiados} productos actualizados")
+    return copiados
+
+
+async def mantener_replica():
+    """
+    Sincroniza la réplica cada REPLICA_SYNC_SEGUNDOS o apenas se publica
+    una versión nueva del catálogo
+    """
+    version = version_catalogo()
+    espera = 0
+    
+    while True:
+        await asyncio.sleep(5)
+        espera += 5
         
-        # Buscar por nombre normalizado
-        busqueda_query = busqueda_query.ilike("nombre_normalizado", f"%{query}%")
-        busqueda_query = busqueda_query.limit(limit)
+        if version_catalogo() == version and espera < REPLICA_SYNC_SEGUNDOS:
+            continue
         
-        result = busqueda_query.execute()
+        version = version_catalogo()
+        espera = 0
+        try:
+            await run_in_threadpool(sincronizar_replica)
+        except Exception as e:
+            print(f"❌ Error sincronizando réplica: {e}")
+
+
+@app.on_event("startup")
+async def construir_indices():
+    if isinstance(repositorio, RepositorioReplica) and repositorio.escritor is not None:
+        try:
+            sincronizar_replica()
+        except Exception as e:
+            # Sin conexión se sigue con lo que ya tenga la réplica
+            print(f"⚠️  No se pudo sincronizar la réplica: {e}")
+        asyncio.get_running_loop().create_task(mantener_replica())
+    
+    try:
+        cargar_autocompletado()
+        print(f"✅ Índice de autocompletado: {len(indice_autocompletado)} productos")
+    except Exception as e:
+        print(f"❌ Error construyendo índice de autocompletado: {e}")
+
+    try:
+        cargar_equivalencias()
+        print(f"✅ Mapa de equivalencias: {len(mapa_equivalencias)} productos")
+    except Exception as e:
+        print(f"❌ Error cargando equivalencias: {e}")
+
+
+# ============================================
+# CACHE HTTP
+# ============================================
+
+async def responder_cacheado(request: Request, clave, calcular):
+    """
+    Sirve desde el cache (calculando una sola vez si falta) con ETag
+
+    Si el cliente manda If-None-Match con el mismo ETag se responde 304 sin cuerpo.
+    """
+    entrada = await cache_respuestas.obtener_o_calcular(clave, calcular)
+    headers = {"ETag": entrada.etag, "Cache-Control": "no-cache"}
+
+    if request.headers.get("if-none-match") == entrada.etag:
+        return Response(status_code=304, headers=headers)
+
+    return RespuestaJSON(entrada.valor, headers=headers)
+
+
+# ============================================
+# ENDPOINTS DE BÚSQUEDA
+# ============================================
+
+@app.get("/productos/buscar")
+async def buscar_productos(
+    request: Request,
+    query: str,
+    tienda: Optional[str] = None,
+    limit: int = 50,
+    compacto: bool = False,
+    ordenar: Optional[str] = None
+):
+    """
+    Busca productos por nombre (con normalización de acentos)
+    
+    compacto=true devuelve solo lo que se muestra en la lista de resultados;
+    ordenar=precio_efectivo ordena por lo que se paga con la promo aplicada
+    """
+    if ordenar not in (None, "precio_efectivo"):
+        raise HTTPException(status_code=400, detail="ordenar solo acepta 'precio_efectivo'")
+    
+    query_normalizada = normalizar_texto(query)
+    clave = ("buscar", query_normalizada, tienda, limit, compacto, ordenar, version_catalogo())
+    columnas = COLUMNAS_BUSQUEDA_COMPACTA if compacto else COLUMNAS_BUSQUEDA
+
+    async def buscar():
+        with etapa("db"):
+            productos = await run_in_threadpool(
+                repositorio.filtrar_productos,
+                columnas,
+                tienda=tienda,
+                nombre_contiene=query_normalizada,
+                limit=limit,
+                ordenar=ordenar
+            )
         
         return {
-            "query": query,
-            "count": len(result.data) if result.data else 0,
-            "productos": result.data or []
+            "query": query_normalizada,
+            "count": len(productos),
+            "productos": productos
         }
+
+    try:
+        return await responder_cacheado(request, clave, buscar)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/productos/autocomplete")
+async def autocompletar_productos(q: str, tienda: Optional[str] = None, limit: int = 5):
+    """
+    Sugerencias por prefijo para ambas tiendas en una sola llamada
+    (ordenadas por popularidad: selecciones y comparaciones)
+    """
+    if indice_autocompletado.version != version_catalogo():
+        try:
+            await run_in_threadpool(asegurar_autocompletado_actualizado)
+        except Exception as e:
+            # Se sigue sugiriendo con el índice anterior
+            print(f"❌ Error reconstruyendo índice de autocompletado: {e}")
+    
+    return {
+        "query": q,
+        "sugerencias": indice_autocompletado.sugerir(q, limite=limit, tienda=tienda)
+    }
+
+
+@app.get("/productos/export")
+async def exportar_productos(
+    tienda: Optional[str] = None,
+    categoria: Optional[str] = None,
+    desde: Optional[str] = None,
+    columnas: Optional[str] = None,
+    formato: str = "ndjson",
+    comprimir: bool = True,
+    cursor: Optional[str] = None,
+    limite: Optional[int] = None
+):
+    """
+    Catálogo completo (o filtrado) en streaming, recorrido por keyset
+    
+    - formato: ndjson | csv; comprimir=true lo manda como .gz (application/gzip)
+    - desde: solo productos con ultima_actualizacion >= desde (ISO 8601)
+    - cursor: retoma una exportación (ya trae los filtros; no se combinan)
+    - limite: filas por respuesta; si quedan más, el header X-Export-Siguiente
+      trae el cursor del bloque siguiente
+    
+    La memoria del servidor no depende del tamaño del catálogo.
+    """
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail="formato debe ser 'ndjson' o 'csv'")
+    if limite is not None and limite < 1:
+        raise HTTPException(status_code=400, detail="limite debe ser mayor a 0")
+    
+    try:
+        if cursor:
+            if any((tienda, categoria, desde, columnas)):
+                raise ValueError("Con cursor no se pasan filtros (el cursor ya los trae)")
+            filtros, despues_de = leer_cursor(cursor)
+        else:
+            filtros, despues_de = filtros_exportacion(tienda, categoria, desde, columnas), 0
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    headers = {
+        "Content-Disposition": f'attachment; filename="{nombre_archivo(formato, comprimir)}"',
+        "Cache-Control": "no-store",
+    }
+    # El bloque termina exactamente en el id del cursor siguiente
+    hasta_id = None
+    if limite is not None:
+        try:
+            with etapa("db"):
+                hasta_id = await run_in_threadpool(fin_bloque, repositorio, filtros, despues_de, limite)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        if hasta_id is not None:
+            headers["X-Export-Siguiente"] = crear_cursor(filtros, hasta_id)
+    
+    # Generador sincrónico: Starlette lo itera en el threadpool, de a una página
+    return StreamingResponse(
+        generar_exportacion(repositorio, filtros, despues_de, formato, comprimir, hasta_id),
+        media_type="application/gzip" if comprimir else FORMATOS[formato],
+        headers=headers
+    )
+
+
+@app.get("/imagenes")
+async def imagen_producto(request: Request, url: str, ancho: Optional[int] = None):
+    """
+    Imagen de un producto a través de la cache local
+    
+    ancho: uno de imagenes.ANCHOS para una miniatura (sin ancho: el original).
+    El ETag es el hash del contenido; el navegador la guarda por un año.
+    """
+    try:
+        imagen = await cache_imagenes.obtener(url, ancho)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ErrorImagen as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    
+    headers = {"Cache-Control": CACHE_CONTROL, "ETag": imagen["etag"]}
+    if request.headers.get("if-none-match") == imagen["etag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(imagen["ruta"], media_type=imagen["tipo"], headers=headers)
+
+
+@app.post("/productos/{producto_id}/seleccion")
+async def registrar_seleccion(producto_id: int):
+    """
+    Registra que el usuario eligió un producto (suma popularidad)
+    """
+    indice_autocompletado.registrar_uso(producto_id)
+    return {"success": True}
+
+
 # ============================================
 # ENDPOINTS DE COMPARACIÓN INTELIGENTE
 # ============================================
 
+@app.get("/productos/{producto_id}/historial")
+async def historial_producto(
+    request: Request,
+    producto_id: int,
+    granularidad: str = "dia",
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None
+):
+    """
+    Serie de precios (min/max/promedio/cierre) por día o semana
+
+    Sale de los rollups precalculados: nunca recorre el histórico crudo.
+    """
+    if granularidad not in ("dia", "semana"):
+        raise HTTPException(status_code=400, detail="granularidad debe ser 'dia' o 'semana'")
+    
+    async def calcular():
+        serie = await run_in_threadpool(
+            historial_precios.serie, producto_id, granularidad, desde, hasta
+        )
+        return {
+            "producto_id": producto_id,
+            "granularidad": granularidad,
+            "serie": serie
+        }
+    
+    try:
+        clave = ("historial", producto_id, granularidad, desde, hasta, version_catalogo())
+        return await responder_cacheado(request, clave, calcular)
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/comparar-inteligente")
-async def comparar_inteligente(request: RequestComparacion):
+async def comparar_inteligente(request: RequestComparacion, compacto: bool = False):
     """
     Compara productos usando matching inteligente
     
     Para cada producto seleccionado:
-    1. Busca candidatos en la tienda opuesta
+    1. Busca candidatos en cada una de las otras tiendas
     2. Calcula score de matching
     3. Retorna el mejor match + alternativas
+    
+    Al final arma el plan de compra óptimo (una tienda o dividido en
+    hasta max_tiendas tiendas, sumando costo_fijo_tienda por cada una)
+    
+    compacto=true omite match_detalles y columnas que no se muestran, y manda
+    las alternativas por id (sus datos van una vez en "alternativas")
     """
     
     try:
         resultados = {
-            "Carrefour": [],
-            "Disco": [],
+            **{tienda: [] for tienda in TIENDAS},
             "metadata": {
                 "total_productos": len(request.productos),
                 "matches_encontrados": 0,
@@ -125,159 +562,383 @@ async def comparar_inteligente(request: RequestComparacion):
             }
         }
         
+        asegurar_equivalencias_actualizadas()
+        equivalentes = obtener_equivalentes_guardados(request.productos)
+        
+        filas_por_producto = []
         for producto in request.productos:
-            tienda_origen = producto.tienda
-            tienda_opuesta = "Disco" if tienda_origen == "Carrefour" else "Carrefour"
-            
-            # Agregar producto origen a su tienda
-            resultados[tienda_origen].append({
-                **producto.dict(),
-                "es_origen": True
-            })
-            
-            # Buscar candidatos en tienda opuesta
-            candidatos = await buscar_candidatos(producto, tienda_opuesta)
-            
-            if not candidatos:
-                # No hay candidatos
-                resultados[tienda_opuesta].append({
-                    "id": f"missing-{producto.id}",
-                    "nombre": "❌ Producto no disponible",
-                    "tienda": tienda_opuesta,
-                    "precio": 0,
-                    "no_disponible": True,
-                    "producto_origen_id": producto.id
-                })
-                resultados["metadata"]["productos_sin_match"] += 1
-                continue
-            
-            # Calcular scores para candidatos
-            matches = encontrar_mejores_matches(producto.dict(), candidatos, top_n=5)
-            
-            mejor_match = matches[0]
-            
-            # Agregar mejor match
-            resultados[tienda_opuesta].append({
-                **mejor_match,
-                "es_match_automatico": True,
-                "producto_origen_id": producto.id,
-                "alternativas": matches[1:4] if len(matches) > 1 else []
-            })
+            por_tienda = await emparejar_producto(producto, equivalentes)
+            filas_por_producto.append(por_tienda)
             
-            resultados["metadata"]["matches_encontrados"] += 1
-            
-            if mejor_match["match_score"] >= 80:
-                resultados["metadata"]["matches_alta_confianza"] += 1
-        
-        # Calcular totales
-        resultados["totales"] = {
-            "Carrefour": sum(
-                p.get("precio", 0) 
-                for p in resultados["Carrefour"] 
-                if not p.get("no_disponible")
-            ),
-            "Disco": sum(
-                p.get("precio", 0) 
-                for p in resultados["Disco"] 
-                if not p.get("no_disponible")
-            )
-        }
+            for tienda, fila in por_tienda.items():
+                resultados.setdefault(tienda, []).append(fila)
+                contar_match(resultados["metadata"], fila)
         
-        # Determinar mejor opción
-        if resultados["totales"]["Carrefour"] > 0 and resultados["totales"]["Disco"] > 0:
-            if resultados["totales"]["Carrefour"] < resultados["totales"]["Disco"]:
-                mejor_opcion = "Carrefour"
-                ahorro = resultados["totales"]["Disco"] - resultados["totales"]["Carrefour"]
-            else:
-                mejor_opcion = "Disco"
-                ahorro = resultados["totales"]["Carrefour"] - resultados["totales"]["Disco"]
-            
-            resultados["recomendacion"] = {
-                "tienda": mejor_opcion,
-                "ahorro": round(ahorro, 2),
-                "porcentaje": round(
-                    (ahorro / max(resultados["totales"]["Carrefour"], resultados["totales"]["Disco"])) * 100, 
-                    1
-                )
-            }
+        with etapa("optimizacion"):
+            resultados.update(calcular_resumen(request, filas_por_producto))
+        
+        if compacto:
+            compactar_comparacion(resultados, TIENDAS)
         
-        return resultados
+        return RespuestaJSON(resultados)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def buscar_candidatos(producto: ProductoComparacion, tienda: str):
+@app.post("/comparar-inteligente/stream")
+async def comparar_inteligente_stream(
+    request: RequestComparacion,
+    formato: str = "ndjson",
+    compacto: bool = False
+):
     """
-    Busca productos candidatos para matching
+    Igual que /comparar-inteligente pero emite cada producto apenas se empareja
+    
+    Formatos:
+    - ndjson: una línea JSON por registro (application/x-ndjson)
+    - sse: Server-Sent Events (text/event-stream)
     
-    Estrategia:
-    1. Marca + categoría + peso similar (±30%)
-    2. Fallback: Marca + categoría
-    3. Fallback: Solo marca
-    4. Fallback: Categoría + palabra clave
-    """
-    
-    candidatos = []
-    
-    # Estrategia 1: Marca + categoría + peso
-    if producto.marca and producto.categoria and producto.peso:
-        query = supabase.table("productos").select("*")
-        query = query.eq("tienda", tienda)
-        query = query.eq("marca", producto.marca)
-        query = query.eq("categoria", producto.categoria)
-        
-        # Peso ±30%
-        peso_min = producto.peso * 0.7
-        peso_max = producto.peso * 1.3
-        query = query.gte("peso", peso_min)
-        query = query.lte("peso", peso_max)
-        
-        result = query.limit(10).execute()
-        
-        if result.data:
-            candidatos = result.data
-    
-    # Estrategia 2: Marca + categoría (sin filtro de peso)
-    if not candidatos and producto.marca and producto.categoria:
-        result = supabase.table("productos").select("*") \
-            .eq("tienda", tienda) \
-            .eq("marca", producto.marca) \
-            .eq("categoria", producto.categoria) \
-            .limit(10) \
-            .execute()
-        
-        if result.data:
-            candidatos = result.data
-    
-    # Estrategia 3: Solo marca
-    if not candidatos and producto.marca:
-        result = supabase.table("productos").select("*") \
-            .eq("tienda", tienda) \
-            .eq("marca", producto.marca) \
-            .limit(10) \
-            .execute()
-        
-        if result.data:
-            candidatos = result.data
-    
-    # Estrategia 4: Categoría + nombre normalizado
-    if not candidatos and producto.categoria:
-        # Extraer palabra clave del nombre
-        palabras = producto.nombre.lower().split()
-        palabra_clave = next((p for p in palabras if len(p) > 4), palabras[0] if palabras else "")
-        
-        if palabra_clave:
-            result = supabase.table("productos").select("*") \
-                .eq("tienda", tienda) \
-                .eq("categoria", producto.categoria) \
-                .ilike("nombre_normalizado", f"%{palabra_clave}%") \
-                .limit(10) \
-                .execute()
+    Registros:
+    - {"tipo": "item", "indice", "producto_origen_id", "resultados": {tienda: fila}}
+    - {"tipo": "resumen", "metadata", "totales", "recomendacion", "plan_optimo"}
+    - {"tipo": "error", "detalle"} si algo falla a mitad del stream
+    
+    Los items pueden llegar en otro orden que el del carrito (usar "indice").
+    Con compacto=true cada item trae sus alternativas en "alternativas" (por id).
+    """
+    if formato not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="formato debe ser 'ndjson' o 'sse'")
+    
+    try:
+        asegurar_equivalencias_actualizadas()
+        equivalentes = obtener_equivalentes_guardados(request.productos)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    def codificar(registro):
+        contenido = serializar(registro)
+        if formato == "sse":
+            return b"event: " + registro["tipo"].encode() + b"\ndata: " + contenido + b"\n\n"
+        return contenido + b"\n"
+    
+    async def emparejar_con_indice(indice, producto):
+        return indice, await emparejar_producto(producto, equivalentes)
+    
+    async def generar():
+        metadata = {
+            "total_productos": len(request.productos),
+            "matches_encontrados": 0,
+            "matches_alta_confianza": 0,
+            "productos_sin_match": 0
+        }
+        # Solo se guarda lo necesario para los totales, no las filas completas
+        compactas = [None] * len(request.productos)
+        
+        pendientes = set()
+        siguientes = iter(enumerate(request.productos))
+        
+        try:
+            while True:
+                # Ventana deslizante: nunca más de CONCURRENCIA_STREAM en vuelo
+                for indice, producto in siguientes:
+                    pendientes.add(asyncio.ensure_future(emparejar_con_indice(indice, producto)))
+                    if len(pendientes) >= CONCURRENCIA_STREAM:
+                        break
+                
+                if not pendientes:
+                    break
+                
+                listos, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                
+                for tarea in listos:
+                    indice, por_tienda = tarea.result()
+                    
+                    for fila in por_tienda.values():
+                        contar_match(metadata, fila)
+                    compactas[indice] = {
+                        tienda: {
+                            "id": fila.get("id"),
+                            "precio": fila.get("precio"),
+                            "promo_cantidad": fila.get("promo_cantidad"),
+                            "promo_factor": fila.get("promo_factor"),
+                            "no_disponible": fila.get("no_disponible", False)
+                        }
+                        for tienda, fila in por_tienda.items()
+                    }
+                    
+                    registro = {
+                        "tipo": "item",
+                        "indice": indice,
+                        "producto_origen_id": request.productos[indice].id,
+                        "resultados": por_tienda
+                    }
+                    if compacto:
+                        alternativas = {}
+                        registro["resultados"] = {
+                            tienda: compactar_fila(fila, alternativas)
+                            for tienda, fila in por_tienda.items()
+                        }
+                        registro["alternativas"] = alternativas
+                    
+                    yield codificar(registro)
             
-            if result.data:
-                candidatos = result.data
+            yield codificar({
+                "tipo": "resumen",
+                "metadata": metadata,
+                **calcular_resumen(request, compactas)
+            })
+        
+        except Exception as e:
+            yield codificar({"tipo": "error", "detalle": str(e)})
+        
+        finally:
+            # Si el cliente cortó la conexión no seguir trabajando
+            for tarea in pendientes:
+                tarea.cancel()
+    
+    media_type = "text/event-stream" if formato == "sse" else "application/x-ndjson"
+    return StreamingResponse(generar(), media_type=media_type)
+
+
+async def emparejar_producto(producto: ProductoComparacion, equivalentes):
+    """
+    Busca el equivalente de un producto del carrito en cada una de las otras tiendas
+
+    Returns:
+        dict: tienda -> fila (el origen, un match o "no disponible")
+    """
+    indice_autocompletado.registrar_uso(producto.id)
+    
+    # La promo del origen sale de su fila del catálogo (vino con los equivalentes)
+    fila_origen = equivalentes.get(producto.id) or {}
+    por_tienda = {
+        producto.tienda: {
+            **producto.dict(),
+            **{columna: fila_origen.get(columna) for columna in COLUMNAS_PROMO},
+            "es_origen": True
+        }
+    }
+    
+    for tienda in TIENDAS:
+        if tienda != producto.tienda:
+            por_tienda[tienda] = await emparejar_en_tienda(producto, tienda, equivalentes)
+    
+    return por_tienda
+
+
+async def emparejar_en_tienda(producto: ProductoComparacion, tienda: str, equivalentes):
+    """
+    Mejor match de un producto en una tienda
+    """
+    # Equivalencia guardada o corregida: no hace falta buscar ni puntuar
+    equivalente = elegir_equivalente(producto.id, tienda, equivalentes)
+    if equivalente:
+        indice_autocompletado.registrar_uso(equivalente["id"], peso=0.5)
+        return equivalente
+    
+    # Buscar candidatos en la tienda
+    candidatos = await buscar_candidatos(producto, tienda)
+    
+    if not candidatos:
+        # No hay candidatos
+        return {
+            "id": f"missing-{producto.id}",
+            "nombre": "❌ Producto no disponible",
+            "tienda": tienda,
+            "precio": 0,
+            "no_disponible": True,
+            "producto_origen_id": producto.id
+        }
+    
+    # Calcular scores para candidatos
+    with etapa("scoring"):
+        matches = encontrar_mejores_matches(producto.dict(), candidatos, top_n=5)
+    
+    mejor_match = matches[0]
+    indice_autocompletado.registrar_uso(mejor_match["id"], peso=0.5)
+    
+    return {
+        **mejor_match,
+        "es_match_automatico": True,
+        "producto_origen_id": producto.id,
+        "alternativas": matches[1:4] if len(matches) > 1 else []
+    }
+
+
+def contar_match(metadata, fila):
+    """
+    Actualiza los contadores de metadata con una fila de resultado
+    """
+    if fila.get("es_origen"):
+        return
+    
+    if fila.get("no_disponible"):
+        metadata["productos_sin_match"] += 1
+        return
+    
+    metadata["matches_encontrados"] += 1
+    if fila.get("match_score", 0) >= 80:
+        metadata["matches_alta_confianza"] += 1
+
+
+def precio_para_resumen(fila, cantidad, usar_precio_efectivo):
+    """
+    Lo que cuesta la cantidad pedida de una fila, con o sin la promo aplicada
+    """
+    if usar_precio_efectivo:
+        return total_con_promo(fila["precio"], cantidad, fila.get("promo_cantidad"), fila.get("promo_factor"))
+    return round(fila["precio"] * cantidad, 2)
+
+
+def calcular_resumen(request: RequestComparacion, filas_por_producto):
+    """
+    Totales por tienda, recomendación de tienda única y plan de compra óptimo
+
+    Args:
+        request (RequestComparacion): Pedido (cantidades, max_tiendas, costo_fijo_tienda
+            y usar_precio_efectivo)
+        filas_por_producto (list): Por producto, dict tienda -> fila
+
+    Returns:
+        dict: totales, recomendacion (si aplica) y plan_optimo
+    """
+    tiendas = list(TIENDAS)
+    for por_tienda in filas_por_producto:
+        tiendas.extend(t for t in por_tienda if t not in tiendas)
+    
+    # Vector de precios por producto (None = no disponible en esa tienda),
+    # ya multiplicado por la cantidad pedida
+    precios = [
+        [
+            precio_para_resumen(por_tienda[t], producto.cantidad, request.usar_precio_efectivo)
+            if t in por_tienda and not por_tienda[t].get("no_disponible") else None
+            for t in tiendas
+        ]
+        for producto, por_tienda in zip(request.productos, filas_por_producto)
+    ]
+    
+    # Calcular totales
+    totales = {
+        tienda: sum(fila[i] for fila in precios if fila[i] is not None)
+        for i, tienda in enumerate(tiendas)
+    }
+    resumen = {"totales": totales, "precio_efectivo": request.usar_precio_efectivo}
+    
+    # Determinar mejor opción (tienda única)
+    con_total = {tienda: total for tienda, total in totales.items() if total > 0}
+    if len(con_total) >= 2:
+        mejor_opcion = min(con_total, key=con_total.get)
+        mas_cara = max(con_total.values())
+        ahorro = mas_cara - con_total[mejor_opcion]
+        
+        resumen["recomendacion"] = {
+            "tienda": mejor_opcion,
+            "ahorro": round(ahorro, 2),
+            "porcentaje": round((ahorro / mas_cara) * 100, 1)
+        }
     
+    # Plan óptimo (puede dividir la compra)
+    if filas_por_producto:
+        optimo = optimizar_compra(
+            precios,
+            tiendas,
+            max_tiendas=request.max_tiendas,
+            costo_fijo_tienda=request.costo_fijo_tienda
+        )
+        plan = optimo["plan"]
+        una = optimo["mejor_tienda_unica"]
+        
+        resumen["plan_optimo"] = {
+            "metodo": optimo["metodo"],
+            "tiendas": plan["tiendas"],
+            "totales_por_tienda": plan["totales_por_tienda"],
+            "costo_fijo": plan["costo_fijo"],
+            "total": plan["total"],
+            "productos_faltantes": plan["productos_faltantes"],
+            "asignacion": [
+                {
+                    "producto_origen_id": producto.id,
+                    "tienda": tienda,
+                    "producto_id": por_tienda[tienda]["id"] if tienda else None,
+                    "precio": por_tienda[tienda]["precio"] if tienda else None
+                }
+                for producto, por_tienda, tienda in zip(
+                    request.productos, filas_por_producto, plan["asignacion"]
+                )
+            ],
+            "mejor_tienda_unica": una["tiendas"][0] if una["tiendas"] else None,
+            "ahorro_vs_tienda_unica": round(max(0, una["total"] - plan["total"]), 2)
+        }
+    
+    return resumen
+
+
+def obtener_equivalentes_guardados(productos):
+    """
+    Trae en una sola consulta las filas de los productos del carrito (para su
+    promo) y de todos sus equivalentes confirmados
+
+    Returns:
+        dict: producto_id -> fila de productos
+    """
+    ids = {producto.id for producto in productos}
+    ids |= {
+        otro_id
+        for producto in productos
+        for otro_id, _, _ in mapa_equivalencias.confirmados(producto.id)
+    }
+    if not ids:
+        return {}
+    
+    with etapa("db"):
+        filas = repositorio.obtener_productos(ids, COLUMNAS_MATCHING)
+    return {fila["id"]: fila for fila in filas}
+
+
+def elegir_equivalente(producto_id: int, tienda: str, equivalentes):
+    """
+    Arma el resultado de matching a partir de una equivalencia guardada
+
+    Returns:
+        dict: Producto con el mismo formato que un match automático, o None
+    """
+    for otro_id, confianza, corregido in mapa_equivalencias.confirmados(producto_id):
+        fila = equivalentes.get(otro_id)
+        if not fila or fila.get("tienda") != tienda:
+            continue
+        
+        return {
+            **fila,
+            "match_score": confianza,
+            "match_nivel": get_nivel_confianza(confianza),
+            "match_detalles": [
+                "✓ Corregido por el usuario" if corregido else "✓ Equivalencia guardada"
+            ],
+            "es_match_automatico": False,
+            "corregido_manualmente": corregido,
+            "producto_origen_id": producto_id,
+            "alternativas": []
+        }
+    
+    return None
+
+
+async def buscar_candidatos(producto: ProductoComparacion, tienda: str):
+    """
+    Busca productos candidatos para matching
+
+    Es el vecindario de bloqueo de emparejamiento.buscar_vecindario (marca +
+    categoría + peso ±30%, con fallbacks), el mismo que usa el matching
+    incremental después de cada scrape.
+    """
+    # El acceso al catálogo es bloqueante: al threadpool para no frenar el event loop
+    with etapa("db"):
+        candidatos = await run_in_threadpool(
+            buscar_vecindario, repositorio, producto.dict(), tienda, COLUMNAS_MATCHING
+        )
+
+    contar("candidatos", len(candidatos))
     return candidatos
 
 
@@ -293,46 +954,274 @@ async def crear_equivalencia(producto_a_id: int, producto_b_id: int):
     """
     
     try:
-        result = supabase.table("equivalencias").upsert({
-            "producto_a_id": producto_a_id,
-            "producto_b_id": producto_b_id,
-            "confianza": 100,
-            "corregido_por_usuario": True
-        }).execute()
+        asegurar_equivalencias_actualizadas()
+        
+        # La corrección nueva reemplaza a las anteriores de cada producto hacia
+        # la tienda del otro (si no, la más vieja seguiría ganando)
+        ids = {producto_a_id, producto_b_id}
+        ids |= set(mapa_equivalencias.vecinos(producto_a_id)) | set(mapa_equivalencias.vecinos(producto_b_id))
+        tienda_de = {fila["id"]: fila["tienda"] for fila in repositorio.obtener_productos(ids, "id,tienda")}
+        reemplazadas = mapa_equivalencias.correcciones_reemplazadas(producto_a_id, producto_b_id, tienda_de)
+        if reemplazadas:
+            repositorio.borrar_equivalencias(reemplazadas)
+            for origen, otro_id in reemplazadas:
+                mapa_equivalencias.quitar(origen, otro_id)
+                cache_respuestas.invalidar(("equivalencias", otro_id))
+        
+        data = repositorio.guardar_equivalencia(producto_a_id, producto_b_id, 100, corregido=True)
         
-        return {"success": True, "data": result.data}
+        mapa_equivalencias.agregar(producto_a_id, producto_b_id, 100, corregido=True)
+        
+        # Unir los clusters y guardar solo los productos que cambiaron de cluster
+        cambios = clusters_productos.unir(producto_a_id, producto_b_id)
+        if cambios:
+            repositorio.asignar_clusters(cambios)
+        
+        cache_respuestas.invalidar(("equivalencias", producto_a_id))
+        cache_respuestas.invalidar(("equivalencias", producto_b_id))
+        cache_respuestas.invalidar(("cluster",))
+        
+        return {"success": True, "data": data}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/equivalencias/{producto_id}")
-async def buscar_equivalencia(producto_id: int):
+async def buscar_equivalencia(request: Request, producto_id: int):
     """
     Busca si existe una equivalencia guardada para un producto
     """
-    
-    try:
-        # Buscar en ambas direcciones
-        result_a = supabase.table("equivalencias").select("*, productos!producto_b_id(*)") \
-            .eq("producto_a_id", producto_id) \
-            .execute()
+
+    async def buscar():
+        asegurar_equivalencias_actualizadas()
+        vecinos = mapa_equivalencias.vecinos(producto_id)
         
-        result_b = supabase.table("equivalencias").select("*, productos!producto_a_id(*)") \
-            .eq("producto_b_id", producto_id) \
-            .execute()
+        with etapa("db"):
+            filas = repositorio.obtener_productos(vecinos, COLUMNAS_MATCHING)
+        productos = {fila["id"]: fila for fila in filas}
         
-        equivalencias = result_a.data + result_b.data
+        equivalencias = [
+            {
+                "producto_a_id": producto_id,
+                "producto_b_id": otro_id,
+                "confianza": confianza,
+                "corregido_por_usuario": corregido,
+                "productos": productos.get(otro_id)
+            }
+            for otro_id, (confianza, corregido) in vecinos.items()
+        ]
         
         return {
             "encontrado": len(equivalencias) > 0,
             "equivalencias": equivalencias
         }
+    
+    try:
+        return await responder_cacheado(
+            request, ("equivalencias", producto_id, version_catalogo()), buscar
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/productos/{producto_id}/cluster")
+async def obtener_cluster(request: Request, producto_id: int):
+    """
+    El mismo producto en todas las tiendas (clausura transitiva de las equivalencias fuertes)
+
+    Returns:
+        dict: cluster_id, productos del cluster y el más barato por tienda
+    """
+
+    async def buscar():
+        asegurar_equivalencias_actualizadas()
+        cluster_id = clusters_productos.cluster(producto_id)
+        
+        # Los miembros salen de los clusters en memoria (los mismos que dan el
+        # cluster_id): la columna cluster_id de la base solo está al día si
+        # corrió clusters.py
+        ids = sorted(clusters_productos.miembros(cluster_id)) if cluster_id is not None else [producto_id]
+        
+        with etapa("db"):
+            productos = await run_in_threadpool(repositorio.obtener_productos, ids, COLUMNAS_BUSQUEDA)
+        productos.sort(key=lambda p: p["id"])
+        
+        if not productos:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        
+        por_tienda = {}
+        for producto in productos:
+            actual = por_tienda.get(producto["tienda"])
+            if actual is None or (producto.get("precio") or 0) < (actual.get("precio") or 0):
+                por_tienda[producto["tienda"]] = producto
+        
+        return {
+            "producto_id": producto_id,
+            "cluster_id": cluster_id,
+            "productos": productos,
+            "por_tienda": por_tienda
+        }
+    
+    try:
+        return await responder_cacheado(
+            request, ("cluster", producto_id, version_catalogo()), buscar
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================================
+# ALERTAS DE PRECIO
+# ============================================
+
+@app.post("/alertas")
+async def crear_alerta(regla: ReglaAlerta):
+    """
+    Crea una regla de seguimiento (por producto, cluster o marca + categoría)
+    """
+    try:
+        clave = clave_regla(
+            regla.tipo,
+            producto_id=regla.producto_id,
+            cluster_id=regla.cluster_id,
+            marca_id=marca_canonica(regla.marca),
+            categoria=regla.categoria
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    regla_id = await run_in_threadpool(
+        motor_alertas.agregar_regla, regla.usuario_id, regla.tipo, clave,
+        regla.tienda, regla.caida_minima_pct, regla.incluir_promos
+    )
+    return {"success": True, "regla_id": regla_id}
+
+
+@app.get("/alertas/{usuario_id}")
+async def listar_alertas(usuario_id: str, limite: int = 50):
+    """
+    Reglas del usuario y sus últimas notificaciones
+    """
+    reglas = await run_in_threadpool(motor_alertas.reglas_usuario, usuario_id)
+    notificaciones = await run_in_threadpool(motor_alertas.notificaciones_usuario, usuario_id, limite)
+    return {"reglas": reglas, "notificaciones": notificaciones}
+
+
+@app.delete("/alertas/{usuario_id}/{regla_id}")
+async def borrar_alerta(usuario_id: str, regla_id: int):
+    borrada = await run_in_threadpool(motor_alertas.borrar_regla, usuario_id, regla_id)
+    if not borrada:
+        raise HTTPException(status_code=404, detail="Regla no encontrada")
+    return {"success": True}
+
+
+# ============================================
+# GASTOS
+# ============================================
+
+def precios_en_otras_tiendas(producto_ids):
+    """
+    Precio del equivalente más barato en cada tienda (según los clusters)
+
+    Returns:
+        dict: producto_id -> {tienda: precio}
+    """
+    asegurar_equivalencias_actualizadas()
+    
+    miembros = {}
+    for producto_id in producto_ids:
+        cluster_id = clusters_productos.cluster(producto_id)
+        if cluster_id is not None:
+            miembros[producto_id] = clusters_productos.miembros(cluster_id)
+    
+    ids = set().union(*miembros.values()) if miembros else set()
+    with etapa("db"):
+        filas = {fila["id"]: fila for fila in repositorio.obtener_productos(ids, "id,tienda,precio")}
+    
+    precios = {}
+    for producto_id, grupo in miembros.items():
+        por_tienda = {}
+        for otro_id in grupo:
+            fila = filas.get(otro_id)
+            if not fila or fila.get("precio") is None:
+                continue
+            if fila["tienda"] not in por_tienda or fila["precio"] < por_tienda[fila["tienda"]]:
+                por_tienda[fila["tienda"]] = fila["precio"]
+        precios[producto_id] = por_tienda
+    
+    return precios
+
+
+@app.post("/gastos")
+async def cargar_gastos(gastos: List[Gasto]):
+    """
+    Carga un lote de gastos y actualiza los rollups
+    """
+    try:
+        producto_ids = {
+            item.get("producto_id")
+            for gasto in gastos
+            for item in items_gasto(gasto.productos)
+            if item.get("producto_id") is not None
+        }
+        precios = await run_in_threadpool(precios_en_otras_tiendas, producto_ids)
+        guardados = await run_in_threadpool(registro_gastos.ingerir, gastos, precios)
+        
+        return {"success": True, "guardados": guardados}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/gastos/{usuario_id}/tendencias")
+async def tendencias_gasto(
+    usuario_id: str,
+    granularidad: str = "mes",
+    dimension: str = "total",
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None
+):
+    """
+    Gasto por día o mes (total, por categoría o por tienda) y el acumulado histórico
+    """
+    try:
+        serie = await run_in_threadpool(
+            registro_gastos.tendencia, usuario_id, granularidad, dimension, desde, hasta
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    totales = await run_in_threadpool(registro_gastos.totales, usuario_id, dimension)
+    
+    return {
+        "usuario_id": usuario_id,
+        "granularidad": granularidad,
+        "dimension": dimension,
+        "serie": serie,
+        "acumulado": totales
+    }
+
+
+@app.get("/gastos/{usuario_id}/otra-tienda")
+async def gasto_en_otra_tienda(usuario_id: str, mes: Optional[str] = None):
+    """
+    Cuánto habrían costado las compras del usuario en cada otra tienda
+    (mes 'AAAA-MM', o todo el historial si no se indica)
+    """
+    comparacion = await run_in_threadpool(registro_gastos.costo_otra_tienda, usuario_id, mes)
+    
+    return {
+        "usuario_id": usuario_id,
+        "mes": mes,
+        "tiendas": comparacion
+    }
+
+
 # ============================================
 # EJECUTAR
 # ============================================
@@ -0,0 +1,329 @@
+"""
+Índice de autocompletado para CuidaElMango
+Busca por prefijo sobre nombres y marcas normalizados, ordenando por popularidad
+
+Si hay un snapshot publicado, las claves y los datos de los productos se leen
+del mmap compartido entre workers (snapshot.py); cada worker guarda solo la
+popularidad y los top-k precalculados.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+import heapq
+
+from utils import normalizar_texto
+
+
+# Prefijos de hasta este largo tienen el top-k precalculado
+LARGO_PRECALCULADO = 4
+
+# Sugerencias guardadas por prefijo y tienda
+TOP_K = 10
+
+# Claves más largas se recortan (alcanza para distinguir y ahorra memoria)
+LARGO_MAXIMO_CLAVE = 40
+
+# Prefijos más largos con más entradas que esto también tienen el top-k
+# precalculado; al resto se le recorre el rango entero en cada pedido
+RANGO_MAXIMO = 500
+
+
+def generar_claves(nombre, marca=None):
+    """
+    Genera las claves de búsqueda de un producto
+
+    Se indexa el nombre desde cada palabra ("leche entera serenisima",
+    "entera serenisima", "serenisima") para que el prefijo coincida con
+    cualquier palabra, más la marca sola.
+
+    Args:
+        nombre (str): Nombre del producto
+        marca (str): Marca detectada (opcional)
+
+    Returns:
+        set: Claves normalizadas
+    """
+    claves = set()
+    palabras = normalizar_texto(nombre).split()
+
+    for i in range(len(palabras)):
+        claves.add(' '.join(palabras[i:])[:LARGO_MAXIMO_CLAVE])
+
+    marca_normalizada = normalizar_texto(marca)
+    if marca_normalizada:
+        claves.add(marca_normalizada[:LARGO_MAXIMO_CLAVE])
+
+    return claves
+
+
+class _EstadoIndice:
+    """
+    Todo lo que arma construir(); al reconstruir se reemplaza entero
+
+    filas/claves/posiciones son listas propias o vistas sobre el snapshot.
+    """
+
+    __slots__ = ("filas", "claves", "posiciones", "largos", "popularidad", "top", "version",
+                 "posicion_de", "tienda_de")
+
+    def __init__(self, filas=(), claves=(), posiciones=(), posicion_de=None, tienda_de=None, version=None):
+        self.filas = filas
+        self.claves = claves
+        self.posiciones = posiciones
+        self.posicion_de = posicion_de or (lambda producto_id: None)
+        self.tienda_de = tienda_de or (lambda posicion: filas[posicion][2])
+        self.largos = array('H')
+        self.popularidad = array('d')
+        self.top = {}
+        self.version = version
+
+    def orden(self, posicion):
+        # Más popular primero; a igual popularidad, nombres más cortos (más genéricos)
+        return (-self.popularidad[posicion], self.largos[posicion], posicion)
+
+
+class _FilasSnapshot:
+    """Secuencia de filas (id, nombre, tienda, marca, precio) leídas del snapshot"""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __getitem__(self, posicion):
+        return self._snapshot.fila(posicion)
+
+
+class IndiceAutocompletado:
+    """
+    Arreglo ordenado de claves + búsqueda binaria
+
+    - Prefijos cortos (los más frecuentes y con más resultados) se resuelven
+      con un top-k precalculado por tienda: una lectura de diccionario.
+    - Prefijos largos con muchas entradas (más de RANGO_MAXIMO, p. ej. "leche")
+      también tienen su top-k precalculado.
+    - El resto acota su rango con bisect (a lo sumo RANGO_MAXIMO entradas) y
+      elige el top-k del rango entero con un heap acotado (nsmallest).
+
+    construir() arma un estado nuevo y lo publica con una sola asignación: se
+    puede reconstruir cuando cambia la versión del catálogo mientras otros
+    pedidos siguen sugiriendo con el anterior.
+    """
+
+    def __init__(self, top_k=TOP_K, largo_precalculado=LARGO_PRECALCULADO):
+        self.top_k = top_k
+        self.largo_precalculado = largo_precalculado
+        self._estado = _EstadoIndice()
+
+    def __len__(self):
+        return len(self._estado.filas)
+
+    @property
+    def version(self):
+        """Versión del catálogo con la que se construyó (None si todavía no)"""
+        return self._estado.version
+
+    def construir(self, productos, popularidad=None, version=None):
+        """
+        Reconstruye el índice completo en memoria
+
+        Args:
+            productos (list): Dicts con id, nombre, tienda, marca y precio
+            popularidad (dict): Peso inicial por producto_id (opcional)
+            version (str): Versión del catálogo con la que se construyó
+        """
+        filas = []
+        posicion_por_id = {}
+
+        entradas = []
+        for producto in productos:
+            posicion = len(filas)
+            filas.append((
+                producto['id'],
+                producto['nombre'],
+                producto['tienda'],
+                producto.get('marca'),
+                producto.get('precio'),
+            ))
+            posicion_por_id[producto['id']] = posicion
+            for clave in generar_claves(producto['nombre'], producto.get('marca')):
+                entradas.append((clave, posicion))
+
+        entradas.sort()
+        estado = _EstadoIndice(
+            filas=filas,
+            claves=[clave for clave, _ in entradas],
+            posiciones=array('i', (posicion for _, posicion in entradas)),
+            posicion_de=posicion_por_id.get,
+            version=version
+        )
+        self._publicar(estado, popularidad)
+
+    def construir_desde_snapshot(self, snapshot, popularidad=None, version=None):
+        """
+        Reconstruye el índice sobre un snapshot mapeado (snapshot.SnapshotCatalogo)
+
+        Claves, posiciones y filas se leen del mmap sin copiarlos; solo la
+        popularidad, el largo de cada nombre y los top-k quedan en el worker.
+        """
+        estado = _EstadoIndice(
+            filas=_FilasSnapshot(snapshot),
+            claves=snapshot.claves,
+            posiciones=snapshot.columnas["posicion"],
+            posicion_de=snapshot.posicion,
+            tienda_de=snapshot.tienda,
+            version=version
+        )
+        self._publicar(estado, popularidad)
+
+    def _publicar(self, estado, popularidad):
+        popularidad = popularidad or {}
+        for fila in estado.filas:
+            estado.largos.append(min(len(fila[1]), 0xFFFF))
+            estado.popularidad.append(float(popularidad.get(fila[0], 0)))
+
+        self._precalcular_top(estado)
+        self._estado = estado
+
+    def popularidad(self):
+        """
+        Popularidad acumulada, para no perderla al reconstruir
+
+        Returns:
+            dict: {producto_id: popularidad} de los productos con uso registrado
+        """
+        estado = self._estado
+        return {
+            estado.filas[posicion][0]: valor
+            for posicion, valor in enumerate(estado.popularidad)
+            if valor
+        }
+
+    def _prefijos(self, estado, claves):
+        # Los cortos siempre; los largos solo si tienen top precalculado
+        prefijos = set()
+        for clave in claves:
+            for largo in range(1, len(clave) + 1):
+                prefijo = clave[:largo]
+                if largo <= self.largo_precalculado or prefijo in estado.top:
+                    prefijos.add(prefijo)
+        return prefijos
+
+    def _precalcular_top(self, estado):
+        # Prefijos cortos: se recorren las claves una vez (un producto cuenta
+        # una sola vez por prefijo aunque varias de sus claves lo compartan)
+        candidatos = {}
+        for clave, posicion in zip(estado.claves, estado.posiciones):
+            tienda = estado.tienda_de(posicion)
+            for largo in range(1, min(len(clave), self.largo_precalculado) + 1):
+                candidatos.setdefault(clave[:largo], {}).setdefault(tienda, set()).add(posicion)
+
+        estado.top = {
+            prefijo: {
+                tienda: heapq.nsmallest(self.top_k, posiciones, key=estado.orden)
+                for tienda, posiciones in por_tienda.items()
+            }
+            for prefijo, por_tienda in candidatos.items()
+        }
+
+        # Prefijos largos con rangos grandes: se parte cada rango grande por el
+        # carácter siguiente y solo se baja por los pedazos que siguen grandes
+        claves = estado.claves
+        rangos = [(0, len(claves), 0)]
+        while rangos:
+            inicio, fin, largo = rangos.pop()
+            largo += 1
+            if largo > LARGO_MAXIMO_CLAVE:
+                continue
+            while inicio < fin:
+                prefijo = claves[inicio][:largo]
+                if len(prefijo) < largo:
+                    # La clave entera es más corta: va primero en su rango, se saltea
+                    inicio = bisect_right(claves, prefijo, inicio, fin)
+                    continue
+                corte = bisect_left(claves, prefijo + '\uffff', inicio, fin)
+                if corte - inicio > RANGO_MAXIMO:
+                    if largo > self.largo_precalculado:
+                        estado.top[prefijo] = self._top_rango(estado, inicio, corte, self.top_k)
+                    rangos.append((inicio, corte, largo))
+                inicio = corte
+
+    def registrar_uso(self, producto_id, peso=1):
+        """
+        Suma popularidad a un producto (seleccionado o comparado)
+
+        Solo se tocan los top-k de los prefijos del producto: O(prefijos * k)
+        """
+        estado = self._estado
+        posicion = estado.posicion_de(producto_id)
+        if posicion is None:
+            return
+
+        estado.popularidad[posicion] += peso
+        _, nombre, tienda, marca, _ = estado.filas[posicion]
+
+        for prefijo in self._prefijos(estado, generar_claves(nombre, marca)):
+            top = estado.top.setdefault(prefijo, {}).setdefault(tienda, [])
+            if posicion not in top:
+                top.append(posicion)
+            top.sort(key=estado.orden)
+            del top[self.top_k:]
+
+    def sugerir(self, texto, limite=5, tienda=None):
+        """
+        Sugerencias por prefijo agrupadas por tienda
+
+        Args:
+            texto (str): Lo que escribió el usuario
+            limite (int): Máximo de sugerencias por tienda
+            tienda (str): Filtrar por tienda (opcional)
+
+        Returns:
+            dict: {tienda: [productos]}
+        """
+        prefijo = normalizar_texto(texto)[:LARGO_MAXIMO_CLAVE]
+        if not prefijo:
+            return {}
+
+        estado = self._estado
+        precalculado = len(prefijo) <= self.largo_precalculado or prefijo in estado.top
+        if precalculado and limite <= self.top_k:
+            por_tienda = {
+                nombre_tienda: posiciones[:limite]
+                for nombre_tienda, posiciones in estado.top.get(prefijo, {}).items()
+            }
+        else:
+            por_tienda = self._buscar_rango(estado, prefijo, limite)
+
+        return {
+            nombre_tienda: [self._como_dict(estado, posicion) for posicion in posiciones]
+            for nombre_tienda, posiciones in por_tienda.items()
+            if tienda is None or nombre_tienda == tienda
+        }
+
+    def _buscar_rango(self, estado, prefijo, limite):
+        inicio = bisect_left(estado.claves, prefijo)
+        fin = bisect_left(estado.claves, prefijo + '\uffff', inicio)
+        return self._top_rango(estado, inicio, fin, limite)
+
+    def _top_rango(self, estado, inicio, fin, limite):
+        # Todo el rango: el top-k por popularidad puede estar en cualquier parte
+        candidatos = {}
+        for posicion in set(estado.posiciones[inicio:fin]):
+            candidatos.setdefault(estado.tienda_de(posicion), []).append(posicion)
+
+        return {
+            tienda: heapq.nsmallest(limite, posiciones, key=estado.orden)
+            for tienda, posiciones in candidatos.items()
+        }
+
+    def _como_dict(self, estado, posicion):
+        producto_id, nombre, tienda, marca, precio = estado.filas[posicion]
+        return {
+            "id": producto_id,
+            "nombre": nombre,
+            "tienda": tienda,
+            "marca": marca,
+            "precio": precio,
+        }
@@ -0,0 +1,79 @@
+"""
+Backfill de las columnas derivadas al ingestar (features de matching y promo
+estructurada) para productos cargados antes de que los scrapers las guardaran
+
+Uso: python backfill_features.py
+     python backfill_features.py --cantidades   # además relee peso/pack del nombre
+(antes correr migraciones/001_features_match.sql y 003_promociones.sql en Supabase)
+"""
+
+from database import get_supabase_admin
+from promociones import campos_promo
+from utils import calcular_features_match, extraer_atributos_producto
+
+
+# Filas por pedido
+PAGINA = 1000
+
+COLUMNAS_ORIGEN = "id,nombre,tienda,nombre_limpio,marca,peso,peso_unidad,cantidad_unidades,variante,precio,promo"
+
+
+# Columnas que se releen del nombre con --cantidades
+COLUMNAS_CANTIDAD = ("peso", "peso_unidad", "cantidad_unidades")
+
+
+def backfill(cantidades=False):
+    """
+    Recalcula las columnas derivadas de todos los productos a partir de los atributos guardados
+
+    Args:
+        cantidades (bool): Volver a extraer peso, unidad y pack del nombre (para
+                           productos leídos con el parser de cantidades anterior)
+
+    Returns:
+        int: Productos actualizados
+    """
+    cliente = get_supabase_admin()
+    actualizados = 0
+    desde = 0
+
+    while True:
+        result = cliente.table("productos").select(COLUMNAS_ORIGEN) \
+            .order("id") \
+            .range(desde, desde + PAGINA - 1) \
+            .execute()
+
+        filas = result.data or []
+        if cantidades:
+            for fila in filas:
+                atributos = extraer_atributos_producto(fila["nombre"])
+                fila.update({columna: atributos[columna] for columna in COLUMNAS_CANTIDAD})
+
+        if filas:
+            # nombre y tienda van para que el upsert cumpla los NOT NULL
+            cliente.table("productos").upsert([
+                {
+                    "id": fila["id"],
+                    "nombre": fila["nombre"],
+                    "tienda": fila["tienda"],
+                    **({columna: fila[columna] for columna in COLUMNAS_CANTIDAD} if cantidades else {}),
+                    **calcular_features_match(fila),
+                    **campos_promo(fila.get("promo"), fila["precio"])
+                }
+                for fila in filas
+            ]).execute()
+            actualizados += len(filas)
+            print(f"  {actualizados} productos...")
+
+        if len(filas) < PAGINA:
+            break
+        desde += PAGINA
+
+    return actualizados
+
+
+if __name__ == "__main__":
+    import sys
+
+    total = backfill(cantidades="--cantidades" in sys.argv[1:])
+    print(f"✅ Columnas derivadas actualizadas en {total} productos")
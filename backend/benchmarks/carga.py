@@ -0,0 +1,394 @@
+"""
+Prueba de carga de la API de CuidaElMango
+
+Genera un catálogo sintético (datos.generar_catalogo), lo carga en un
+almacenamiento local (memoria o réplica SQLite, sin Supabase) y le pega a la
+app con N usuarios concurrentes que mezclan búsquedas, autocompletado,
+comparaciones y clusters. Reporta por endpoint: throughput, percentiles de
+latencia y tasa de errores.
+
+Por defecto la app corre en el mismo proceso (httpx + ASGITransport): mide la
+app sin red, pero el generador de carga comparte la CPU con ella. Para medir
+un servidor real (uvicorn con varios workers) usar --url contra un servidor
+levantado sobre la réplica que genera `python benchmarks/datos.py` con la
+misma semilla y --por-tienda (así existen los ids de los carritos).
+
+Uso:
+    python benchmarks/carga.py                                        # 20k/tienda en memoria, 32 usuarios, 30s
+    python benchmarks/carga.py --por-tienda 100000 --storage sqlite --concurrencia 64
+    python benchmarks/carga.py --mezcla buscar=5,comparar=1           # solo esos escenarios
+    python benchmarks/carga.py --url http://localhost:8000 --por-tienda 100000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(DIRECTORIO))
+
+
+# Peso de cada escenario en la mezcla por defecto
+MEZCLA_DEFAULT = {"buscar": 50, "autocomplete": 30, "comparar": 12, "cluster": 8}
+
+# Productos por carrito en las comparaciones
+CARRITO_MIN = 1
+CARRITO_MAX = 15
+
+PERCENTILES = (50, 90, 95, 99)
+
+TIMEOUT_SEGUNDOS = 30
+
+
+# ============================================
+# ESCENARIOS
+# ============================================
+# Cada escenario recibe el generador aleatorio y el catálogo, y devuelve
+# (endpoint, método, ruta, kwargs de httpx). El endpoint agrupa las métricas
+# (sin los ids, para que /productos/{id}/cluster cuente como uno solo).
+
+def _palabras(producto):
+    return [p for p in (producto.get("nombre_limpio") or "").split() if len(p) > 2]
+
+
+def escenario_buscar(aleatorio, catalogo):
+    producto = aleatorio.choice(catalogo.productos)
+    palabras = _palabras(producto) or [producto["nombre"].split()[0].lower()]
+    query = " ".join(palabras[:aleatorio.choice((1, 1, 2))])
+
+    parametros = {"query": query, "limit": aleatorio.choice((20, 50))}
+    if aleatorio.random() < 0.3:
+        parametros["tienda"] = producto["tienda"]
+    if aleatorio.random() < 0.5:
+        parametros["compacto"] = "true"
+    if aleatorio.random() < 0.15:
+        parametros["ordenar"] = "precio_efectivo"
+    return "GET /productos/buscar", "GET", "/productos/buscar", {"params": parametros}
+
+
+def escenario_autocomplete(aleatorio, catalogo):
+    producto = aleatorio.choice(catalogo.productos)
+    palabras = _palabras(producto) or [producto["nombre"].lower()]
+    palabra = aleatorio.choice(palabras)
+    prefijo = palabra[:aleatorio.randint(2, max(2, min(6, len(palabra))))]
+    return "GET /productos/autocomplete", "GET", "/productos/autocomplete", {"params": {"q": prefijo}}
+
+
+def escenario_comparar(aleatorio, catalogo):
+    tienda = aleatorio.choice(list(catalogo.por_tienda))
+    cantidad = aleatorio.randint(CARRITO_MIN, CARRITO_MAX)
+    carrito = []
+    for producto in aleatorio.sample(catalogo.por_tienda[tienda], cantidad):
+        item = {campo: producto[campo] for campo in Catalogo.CAMPOS_COMPARACION if producto.get(campo) is not None}
+        item["cantidad"] = aleatorio.choice((1, 1, 1, 2, 3))
+        carrito.append(item)
+
+    cuerpo = {"productos": carrito, "usar_precio_efectivo": aleatorio.random() < 0.5}
+    return "POST /comparar-inteligente", "POST", "/comparar-inteligente", {"json": cuerpo}
+
+
+def escenario_cluster(aleatorio, catalogo):
+    producto = aleatorio.choice(catalogo.productos)
+    ruta = f"/productos/{producto['id']}/cluster"
+    return "GET /productos/{id}/cluster", "GET", ruta, {}
+
+
+ESCENARIOS = {
+    "buscar": escenario_buscar,
+    "autocomplete": escenario_autocomplete,
+    "comparar": escenario_comparar,
+    "cluster": escenario_cluster,
+}
+
+
+def parsear_mezcla(texto):
+    """
+    "buscar=5,comparar=1" → {"buscar": 5, "comparar": 1}
+    """
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        nombre = nombre.strip()
+        if nombre not in ESCENARIOS:
+            raise ValueError(f"Escenario inválido: {nombre} (opciones: {', '.join(ESCENARIOS)})")
+        mezcla[nombre] = float(peso or 1)
+    return mezcla
+
+
+class Catalogo:
+    """Productos generados, indexados para armar pedidos rápido"""
+
+    CAMPOS_COMPARACION = (
+        "id", "nombre", "tienda", "marca", "peso", "peso_unidad", "categoria", "variante",
+        "precio", "promo_cantidad", "promo_factor",
+    )
+
+    def __init__(self, productos):
+        self.productos = productos
+        self.por_tienda = {}
+        for producto in productos:
+            self.por_tienda.setdefault(producto["tienda"], []).append(producto)
+
+
+# ============================================
+# MÉTRICAS
+# ============================================
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not ordenados:
+        return None
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados))) - 1))
+    return ordenados[indice]
+
+
+class Metricas:
+    """Latencias y estados por endpoint (solo lo que termina fuera del calentamiento)"""
+
+    def __init__(self):
+        self.latencias = {}
+        self.estados = {}
+        self.errores = {}
+
+    def registrar(self, endpoint, segundos, estado):
+        self.latencias.setdefault(endpoint, []).append(segundos)
+        estados = self.estados.setdefault(endpoint, {})
+        estados[estado] = estados.get(estado, 0) + 1
+        if estado == "error" or (isinstance(estado, int) and estado >= 400):
+            self.errores[endpoint] = self.errores.get(endpoint, 0) + 1
+
+    def resumen(self, duracion):
+        """
+        Returns:
+            dict: endpoint -> solicitudes, rps, errores, tasa_error, estados, p50/p90/p95/p99/max/media (ms)
+        """
+        endpoints = {}
+        todas = []
+        for endpoint, latencias in sorted(self.latencias.items()):
+            todas.extend(latencias)
+            endpoints[endpoint] = self._resumen_lista(
+                latencias, self.errores.get(endpoint, 0), duracion,
+                {str(estado): cantidad for estado, cantidad in self.estados[endpoint].items()}
+            )
+
+        endpoints["TOTAL"] = self._resumen_lista(todas, sum(self.errores.values()), duracion)
+        return endpoints
+
+    @staticmethod
+    def _resumen_lista(latencias, errores, duracion, estados=None):
+        ordenadas = sorted(latencias)
+        resumen = {
+            "solicitudes": len(ordenadas),
+            "rps": round(len(ordenadas) / duracion, 1) if duracion else 0,
+            "errores": errores,
+            "tasa_error": round(errores / len(ordenadas), 4) if ordenadas else 0,
+        }
+        for p in PERCENTILES:
+            valor = percentil(ordenadas, p)
+            resumen[f"p{p}_ms"] = round(valor * 1000, 2) if valor is not None else None
+        resumen["max_ms"] = round(ordenadas[-1] * 1000, 2) if ordenadas else None
+        resumen["media_ms"] = round(sum(ordenadas) / len(ordenadas) * 1000, 2) if ordenadas else None
+        if estados is not None:
+            resumen["estados"] = estados
+        return resumen
+
+
+def imprimir(resumen):
+    print(f"\n{'endpoint':32} {'req':>8} {'req/s':>9} {'err%':>7} "
+          + " ".join(f"{'p' + str(p):>9}" for p in PERCENTILES) + f" {'max':>9}")
+    for endpoint, datos in resumen.items():
+        if endpoint == "TOTAL":
+            print("-" * 110)
+        print(f"{endpoint:32} {datos['solicitudes']:>8,} {datos['rps']:>9,.1f} {datos['tasa_error'] * 100:>6.2f}% "
+              + " ".join(
+                  f"{datos[f'p{p}_ms']:>7.1f}ms" if datos[f"p{p}_ms"] is not None else f"{'-':>9}"
+                  for p in PERCENTILES
+              )
+              + (f" {datos['max_ms']:>7.1f}ms" if datos["max_ms"] is not None else f" {'-':>9}"))
+
+
+# ============================================
+# GENERADOR DE CARGA
+# ============================================
+
+async def usuario(cliente, aleatorio, catalogo, mezcla, metricas, inicio_medicion, fin, pausa):
+    """Un usuario virtual: pide en loop hasta `fin`, eligiendo escenario según la mezcla"""
+    nombres = list(mezcla)
+    pesos = [mezcla[nombre] for nombre in nombres]
+
+    while time.perf_counter() < fin:
+        escenario = ESCENARIOS[aleatorio.choices(nombres, pesos)[0]]
+        endpoint, metodo, ruta, kwargs = escenario(aleatorio, catalogo)
+
+        inicio = time.perf_counter()
+        try:
+            respuesta = await cliente.request(metodo, ruta, **kwargs)
+            await respuesta.aread()
+            estado = respuesta.status_code
+        except Exception:
+            estado = "error"
+        terminado = time.perf_counter()
+
+        if terminado >= inicio_medicion:
+            metricas.registrar(endpoint, terminado - inicio, estado)
+
+        if pausa:
+            await asyncio.sleep(aleatorio.expovariate(1 / pausa))
+
+
+async def correr_carga(cliente, catalogo, mezcla, concurrencia, segundos, calentamiento=0, pausa=0, semilla=42):
+    """
+    Corre la carga con `concurrencia` usuarios durante calentamiento + segundos
+
+    Returns:
+        dict: Resumen por endpoint (ver Metricas.resumen)
+    """
+    metricas = Metricas()
+    ahora = time.perf_counter()
+    inicio_medicion = ahora + calentamiento
+    fin = inicio_medicion + segundos
+
+    await asyncio.gather(*[
+        usuario(cliente, random.Random(semilla + i), catalogo, mezcla, metricas, inicio_medicion, fin, pausa)
+        for i in range(concurrencia)
+    ])
+    return metricas.resumen(segundos)
+
+
+async def cliente_en_proceso(productos):
+    """
+    Carga los productos en el repositorio de la app y devuelve un cliente ASGI
+
+    El almacenamiento ya quedó elegido por CUIDAELMANGO_STORAGE antes de importar la app.
+    """
+    import httpx
+    import app as api
+    from datos import guardar_catalogo_sqlite
+
+    if hasattr(api.repositorio, "replica"):
+        guardar_catalogo_sqlite(productos, api.repositorio.replica.ruta)
+    else:
+        api.repositorio.guardar_productos(productos)
+
+    await api.construir_indices()
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=api.app),
+        base_url="http://carga",
+        timeout=TIMEOUT_SEGUNDOS
+    )
+
+
+def cliente_remoto(url, concurrencia):
+    import httpx
+
+    return httpx.AsyncClient(
+        base_url=url,
+        timeout=TIMEOUT_SEGUNDOS,
+        limits=httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    )
+
+
+# ============================================
+# MAIN
+# ============================================
+
+def configurar_almacenamiento(storage):
+    """
+    Elige el almacenamiento de la app (antes de importarla) con un DATA_DIR descartable
+    """
+    os.environ["CUIDAELMANGO_STORAGE"] = storage
+    if "CUIDAELMANGO_DATA_DIR" not in os.environ:
+        os.environ["CUIDAELMANGO_DATA_DIR"] = tempfile.mkdtemp(prefix="cuidaelmango-carga-")
+    if storage == "sqlite":
+        os.environ["CUIDAELMANGO_REPLICA"] = os.path.join(os.environ["CUIDAELMANGO_DATA_DIR"], "replica.sqlite")
+
+
+async def main_async(args, mezcla):
+    from datos import generar_catalogo
+
+    inicio = time.perf_counter()
+    productos = generar_catalogo(args.por_tienda, args.semilla)
+    catalogo = Catalogo(productos)
+    print(f"🧪 Catálogo: {len(productos):,} productos ({args.por_tienda:,} por tienda) "
+          f"en {time.perf_counter() - inicio:.1f}s")
+
+    if args.url:
+        cliente = cliente_remoto(args.url, args.concurrencia)
+        destino = args.url
+    else:
+        inicio = time.perf_counter()
+        cliente = await cliente_en_proceso(productos)
+        destino = f"en proceso ({args.storage})"
+        print(f"📦 Cargado en {args.storage} en {time.perf_counter() - inicio:.1f}s")
+
+    print(f"🚀 {args.concurrencia} usuarios contra {destino}: {args.calentamiento:g}s de calentamiento "
+          f"+ {args.segundos:g}s medidos, mezcla {mezcla}")
+
+    async with cliente:
+        return await correr_carga(
+            cliente, catalogo, mezcla, args.concurrencia, args.segundos,
+            calentamiento=args.calentamiento, pausa=args.pausa, semilla=args.semilla
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API de CuidaElMango")
+    parser.add_argument("--por-tienda", type=int, default=20000, help="Productos por tienda del catálogo sintético")
+    parser.add_argument("--storage", choices=("memoria", "sqlite"), default="memoria",
+                        help="Almacenamiento local de la app en proceso")
+    parser.add_argument("--url", help="Probar un servidor ya levantado en vez de la app en proceso")
+    parser.add_argument("--concurrencia", type=int, default=32, help="Usuarios virtuales simultáneos")
+    parser.add_argument("--segundos", type=float, default=30, help="Duración medida")
+    parser.add_argument("--calentamiento", type=float, default=5, help="Segundos iniciales que no se miden")
+    parser.add_argument("--pausa", type=float, default=0, help="Pausa media entre pedidos de un usuario (s)")
+    parser.add_argument("--mezcla", help="Pesos de los escenarios, ej: buscar=5,autocomplete=3,comparar=1")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Archivo JSON (default: benchmarks/resultados/carga-<fecha>-<commit>.json)")
+    args = parser.parse_args()
+
+    try:
+        mezcla = parsear_mezcla(args.mezcla) if args.mezcla else dict(MEZCLA_DEFAULT)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not args.url:
+        configurar_almacenamiento(args.storage)
+
+    from micro import DIRECTORIO_RESULTADOS, commit_actual
+
+    resumen = asyncio.run(main_async(args, mezcla))
+    imprimir(resumen)
+
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_actual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "destino": args.url or f"en-proceso:{args.storage}",
+        "productos_por_tienda": args.por_tienda,
+        "concurrencia": args.concurrencia,
+        "segundos": args.segundos,
+        "mezcla": mezcla,
+        "endpoints": resumen,
+    }
+
+    salida = args.salida or os.path.join(
+        DIRECTORIO_RESULTADOS,
+        f"carga-{datetime.now():%Y%m%d-%H%M%S}-{resultados['commit'] or 'sin-commit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Corpus etiquetado y benchmark del parser de cantidades
+
+Compara cantidades.analizar_cantidades contra la extracción anterior por
+regex (peso simple primero, después pack, después cuatro patrones de
+cantidad) en aciertos sobre CORPUS y en µs por nombre.
+
+Uso:
+    python benchmarks/corpus_cantidades.py              # aciertos + velocidad
+    python benchmarks/corpus_cantidades.py --errores    # lista los nombres que cada parser lee mal
+"""
+
+import argparse
+import os
+import re
+import sys
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(DIRECTORIO))
+
+from cantidades import UNIDADES, analizar_cantidades
+from datos import generar_nombres
+from micro import medir, ciclo
+
+
+# (nombre, peso, unidad canónica, cantidad de unidades)
+CORPUS = [
+    # Peso simple
+    ("Atún al natural La Campagnola 170 g", 170, "g", None),
+    ("Aceite de oliva Natura 1.5 L", 1.5, "l", None),
+    ("Coca Cola Zero 2.25 lt", 2.25, "l", None),
+    ("Oreo Clásica 117g", 117, "g", None),
+    ("Fideos Matarazzo tirabuzones 500 gr", 500, "g", None),
+    ("Mayonesa Hellmanns 475g", 475, "g", None),
+    ("Leche Serenísima entera 1L", 1, "l", None),
+    ("Aceite Girasol Cocinero 1,5 lts", 1.5, "l", None),
+    ("Cerveza Heineken 710cc", 710, "ml", None),
+    ("Jabón en polvo Skip 3 kg", 3, "kg", None),
+    ("Detergente Magistral 750 ml", 750, "ml", None),
+    ("Gaseosa Sprite 2,25 litros", 2.25, "l", None),
+    ("Azúcar Ledesma 1 kilo", 1, "kg", None),
+    ("Harina Pureza 1 kgs", 1, "kg", None),
+    ("Yerba Playadito 500 grs", 500, "g", None),
+    ("Arroz Gallo Oro 1000 gramos", 1000, "g", None),
+    ("Enjuague bucal Listerine 500 cm3", 500, "ml", None),
+    ("Queso rallado 1/2 kg", 0.5, "kg", None),
+    ("Agua Villavicencio 1.500 ml", 1500, "ml", None),
+    ("Dulce de leche Sancor 400 G.", 400, "g", None),
+    ("Yerba Taragüi x 500 g", 500, "g", None),
+    ("Galletitas Terrabusi Tita 3 x 36 g (108 g)", 36, "g", 3),
+    # Pack delante
+    ("Agua mineral 6 x 1.5L", 1.5, "l", 6),
+    ("Gaseosa Coca Cola 6x2.25 lt", 2.25, "l", 6),
+    ("Cerveza Quilmes 12 x 354cc", 354, "ml", 12),
+    ("Yogur Sancor pack 4 x 125 g", 125, "g", 4),
+    ("Agua Glaciar 2 X 6,5 L", 6.5, "l", 2),
+    ("Jugo Cepita 8 × 200 ml", 200, "ml", 8),
+    ("Atún Gomes 3x170g", 170, "g", 3),
+    # Pack detrás
+    ("Cerveza Brahma lata 473 ml x 6", 473, "ml", 6),
+    ("Leche La Serenísima 1 L x 12 u", 1, "l", 12),
+    ("Gaseosa Pepsi 354 cc x 6 unidades", 354, "ml", 6),
+    ("Alfajor Milka 42g x6", 42, "g", 6),
+    # Pack y peso separados
+    ("Pack x 6 Quilmes Clásica 1 L", 1, "l", 6),
+    ("Pack x 12 Yogur bebible Ilolay 190 g", 190, "g", 12),
+    ("Pack 24 Cerveza Andes 473 ml", 473, "ml", 24),
+    ("Agua saborizada Levité 1.5 L pack x 6", 1.5, "l", 6),
+    # Solo cantidad
+    ("Huevos blancos x 12 u", None, None, 12),
+    ("Huevos color 30 unidades", None, None, 30),
+    ("Pañales Pampers x50", None, None, 50),
+    ("Saquitos de té Taragüi x 25 u.", None, None, 25),
+    ("Servilletas Elite 2 uds", None, None, 2),
+    ("Limones pack x 6", None, None, 6),
+    # Sin cantidades (o que no son cantidades)
+    ("Promo Coca Cola 2x1", None, None, None),
+    ("Toallas de cocina 30 x 40 cm", None, None, None),
+    ("Seven Up Free", None, None, None),
+    ("Cepillo dental Oral-B Indicator", None, None, None),
+    ("Televisor Philips 43 pulgadas", None, None, None),
+    ("Fernet Branca 750 ml 2x1", 750, "ml", None),
+]
+
+
+# ============================================
+# EXTRACCIÓN ANTERIOR (REFERENCIA)
+# ============================================
+
+def extraer_regex_anterior(nombre):
+    """Peso y cantidad como se extraían antes del parser de una pasada"""
+    nombre_lower = nombre.lower().strip()
+    peso = unidad = cantidad = None
+
+    peso_patterns = [
+        r'(\d+(?:[.,]\d+)?)\s*(kg|g|l|lt|ml|cc|gr|grs|lts)\b',
+        r'(\d+(?:[.,]\d+)?)\s*x\s*(\d+(?:[.,]\d+)?)\s*(kg|g|l|lt|ml|cc|gr)\b'
+    ]
+    for pattern in peso_patterns:
+        peso_match = re.search(pattern, nombre_lower)
+        if peso_match:
+            if len(peso_match.groups()) == 2:
+                peso = float(peso_match.group(1).replace(',', '.'))
+                unidad = peso_match.group(2)
+            else:
+                cantidad = int(peso_match.group(1))
+                peso = float(peso_match.group(2).replace(',', '.'))
+                unidad = peso_match.group(3)
+            break
+
+    if not cantidad:
+        for pattern in [r'pack\s*x?\s*(\d+)', r'x\s*(\d+)\s*u', r'(\d+)\s*unidades', r'x\s*(\d+)(?!\d)']:
+            cantidad_match = re.search(pattern, nombre_lower)
+            if cantidad_match:
+                cantidad = int(cantidad_match.group(1))
+                break
+
+    return {"peso": peso, "peso_unidad": unidad, "cantidad_unidades": cantidad}
+
+
+def extraer_una_pasada(nombre):
+    return analizar_cantidades(nombre.lower().strip())
+
+
+# ============================================
+# EVALUACIÓN
+# ============================================
+
+def es_correcto(resultado, peso, unidad, cantidad):
+    unidad_leida = UNIDADES.get(resultado["peso_unidad"], resultado["peso_unidad"])
+    peso_leido = resultado["peso"]
+    return (
+        (peso_leido is None if peso is None else peso_leido is not None and abs(peso_leido - peso) < 1e-9)
+        and unidad_leida == unidad
+        and resultado["cantidad_unidades"] == cantidad
+    )
+
+
+def evaluar(extraer, mostrar_errores=False):
+    """
+    Returns:
+        int: Nombres del corpus leídos correctamente
+    """
+    aciertos = 0
+    for nombre, peso, unidad, cantidad in CORPUS:
+        resultado = extraer(nombre)
+        if es_correcto(resultado, peso, unidad, cantidad):
+            aciertos += 1
+        elif mostrar_errores:
+            print(f"    ✗ {nombre:45} esperado {peso} {unidad} x{cantidad}, "
+                  f"leído {resultado['peso']} {resultado['peso_unidad']} x{resultado['cantidad_unidades']}")
+    return aciertos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aciertos y velocidad del parser de cantidades")
+    parser.add_argument("--segundos", type=float, default=1.0, help="Tiempo medido por caso")
+    parser.add_argument("--errores", action="store_true", help="Mostrar los nombres mal leídos")
+    args = parser.parse_args()
+
+    parsers = {"regex anterior": extraer_regex_anterior, "una pasada": extraer_una_pasada}
+
+    print(f"\nACIERTOS ({len(CORPUS)} nombres etiquetados)")
+    for nombre, extraer in parsers.items():
+        aciertos = evaluar(extraer, args.errores)
+        print(f"  {nombre:40} {aciertos:>4}/{len(CORPUS)} ({aciertos / len(CORPUS):.0%})")
+
+    print("\nVELOCIDAD (nombres sintéticos + corpus)")
+    nombres = generar_nombres(2000) + [nombre for nombre, *_ in CORPUS]
+    for nombre, extraer in parsers.items():
+        siguiente = ciclo(nombres)
+        medir(nombre, lambda: extraer(siguiente()), args.segundos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+Datos sintéticos para benchmarks de CuidaElMango
+
+Nombres con la forma de los que publican las tiendas ("Galletitas Oreo
+Clásica 117 g", "Pack x 6 Cerveza Quilmes 1 L") y filas completas como las
+que guardan los scrapers (atributos, features de matching y promo).
+Siempre con semilla fija, así dos corridas miden exactamente lo mismo.
+
+generar_catalogo arma catálogos del tamaño de una tienda real (100k+ productos
+por tienda) para las pruebas de carga: marcas de MARCAS_CONOCIDAS, categorías
+de las SECCIONES de los scrapers y el mismo producto en cada tienda redactado
+a su manera.
+"""
+
+import ast
+import glob
+import os
+import random
+import sys
+from functools import lru_cache
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promociones import campos_promo
+from utils import MARCAS_CONOCIDAS, MARCAS_CANONICAS, calcular_features_match, extraer_atributos_producto
+
+
+DIRECTORIO_SCRAPERS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scrapers")
+
+
+TIENDAS = ["Carrefour", "Disco"]
+
+# (tipo de producto, categoría, marcas, presentaciones)
+TIPOS = [
+    ("Galletitas", "almacen", ["Oreo", "Terrabusi", "Bagley", "Tofi", "Criollitas"], ["117 g", "300 g", "500g"]),
+    ("Gaseosa", "bebidas", ["Coca Cola", "Pepsi", "Sprite", "Fanta", "Seven Up"], ["500 ml", "1.5 L", "2.25 lt"]),
+    ("Cerveza", "bebidas", ["Quilmes", "Brahma", "Stella Artois", "Heineken", "Andes"], ["473 ml", "1 L", "710cc"]),
+    ("Aceite de girasol", "almacen", ["Natura", "Cocinero", "Lira", "Cañuelas"], ["900 ml", "1.5 L", "3 lt"]),
+    ("Atún al natural", "almacen", ["La Campagnola", "Gomes", "Cuisine"], ["170 g", "120g"]),
+    ("Fideos tirabuzón", "almacen", ["Matarazzo", "Lucchetti", "Don Vicente", "Favorita"], ["500 gr", "1 kg"]),
+    ("Leche entera", "lacteos", ["La Serenísima", "Sancor", "Ilolay", "Tregar"], ["1 L", "500 ml"]),
+    ("Yogur bebible", "lacteos", ["La Serenísima", "Sancor", "Milkaut"], ["900 g", "200 g"]),
+    ("Mayonesa", "almacen", ["Hellmanns", "Natura", "Danica"], ["237 g", "475g", "1 kg"]),
+    ("Detergente", "limpieza", ["Magistral", "Cif", "Ala"], ["300 ml", "500 ml", "750 ml"]),
+    ("Shampoo", "perfumeria", ["Sedal", "Pantene", "Dove", "Plusbelle"], ["400 ml", "750 ml"]),
+    ("Jabón en polvo", "limpieza", ["Skip", "Ala", "Ace"], ["800 g", "3 kg"]),
+]
+
+VARIANTES = ["", "", "", "Clásica", "Original", "Light", "Zero", "Sin Azúcar", "Mini", "Premium"]
+
+PROMOS = ["Precio Regular"] * 6 + ["2DO AL 70%", "25% OFF", "3x2", "2x1", "Lleva 4 paga 3", "15% OFF"]
+
+
+def generar_nombre(aleatorio):
+    """Un nombre de producto con el formato de las tiendas"""
+    tipo, _, marcas, presentaciones = aleatorio.choice(TIPOS)
+    partes = [tipo, aleatorio.choice(marcas)]
+
+    variante = aleatorio.choice(VARIANTES)
+    if variante:
+        partes.append(variante)
+    partes.append(aleatorio.choice(presentaciones))
+
+    nombre = " ".join(partes)
+    if aleatorio.random() < 0.08:
+        nombre = f"Pack x {aleatorio.choice([4, 6, 12])} {nombre}"
+    return nombre
+
+
+def generar_nombres(cantidad, semilla=42):
+    aleatorio = random.Random(semilla)
+    return [generar_nombre(aleatorio) for _ in range(cantidad)]
+
+
+def _fila_producto(producto_id, nombre, tienda, categoria, precio, promo):
+    """Fila con las mismas columnas que guardan los scrapers"""
+    atributos = extraer_atributos_producto(nombre)
+    producto = {
+        "id": producto_id,
+        "nombre": nombre,
+        "nombre_limpio": atributos["nombre_limpio"],
+        "marca": atributos["marca"],
+        "peso": atributos["peso"],
+        "peso_unidad": atributos["peso_unidad"],
+        "cantidad_unidades": atributos["cantidad_unidades"],
+        "variante": atributos["variante"],
+        "tienda": tienda,
+        "categoria": categoria,
+        "precio": precio,
+        "promo": promo,
+        "url": f"https://example.com/{tienda.lower()}/{producto_id}",
+        "imagen_url": None,
+        "ultima_actualizacion": "2026-01-01T00:00:00",
+    }
+    producto.update(calcular_features_match(atributos))
+    producto.update(campos_promo(promo, precio))
+    return producto
+
+
+def generar_productos(cantidad, semilla=42, tiendas=TIENDAS):
+    """
+    Catálogo sintético con las mismas columnas que guardan los scrapers
+
+    Cada nombre aparece en varias tiendas (con precio y redacción levemente
+    distintos) para que el matching tenga candidatos reales.
+
+    Args:
+        cantidad (int): Productos a generar (aproximado: se reparte entre tiendas)
+        semilla (int): Semilla del generador
+        tiendas (list): Tiendas
+
+    Returns:
+        list: Dicts de productos con id correlativo
+    """
+    aleatorio = random.Random(semilla)
+    productos = []
+
+    while len(productos) < cantidad:
+        tipo, categoria, marcas, presentaciones = aleatorio.choice(TIPOS)
+        marca = aleatorio.choice(marcas)
+        variante = aleatorio.choice(VARIANTES)
+        presentacion = aleatorio.choice(presentaciones)
+        precio_base = aleatorio.randint(300, 9000)
+
+        for tienda in tiendas:
+            if len(productos) >= cantidad:
+                break
+            if aleatorio.random() < 0.15:
+                # No todas las tiendas tienen todo
+                continue
+
+            partes = [tipo, marca, variante, presentacion]
+            if aleatorio.random() < 0.3:
+                partes = [marca, tipo, variante, presentacion]
+            nombre = " ".join(p for p in partes if p)
+
+            precio = round(precio_base * aleatorio.uniform(0.85, 1.15), 2)
+            promo = aleatorio.choice(PROMOS)
+            productos.append(_fila_producto(len(productos) + 1, nombre, tienda, categoria, precio, promo))
+
+    return productos
+
+
+# ============================================
+# CATÁLOGOS COMPLETOS (PRUEBAS DE CARGA)
+# ============================================
+
+# (tipo de producto, sección de los scrapers, marcas, presentaciones (valor, unidad), precio base)
+# Las marcas salen de MARCAS_CONOCIDAS; None es la marca propia de cada tienda.
+TIPOS_CATALOGO = [
+    ("Galletitas dulces", "almacen", ["oreo", "terrabusi", "bagley", "tofi", "georgalos", None], [(117, "g"), (300, "g"), (500, "g")], 1400),
+    ("Galletitas crackers", "almacen", ["criollitas", "express", "club social", "bagley", None], [(100, "g"), (300, "g")], 1100),
+    ("Alfajor", "almacen", ["milka", "terrabusi", "shot", "arcor", "tofi"], [(40, "g"), (55, "g"), (6, "u")], 900),
+    ("Aceite de girasol", "almacen", ["natura", "cocinero", "lira", "cañuelas", "morixe", None], [(900, "ml"), (1.5, "l"), (3, "l")], 2800),
+    ("Aceite de maíz", "almacen", ["mazola", "natura", "patito"], [(900, "ml"), (1.5, "l")], 3400),
+    ("Mayonesa", "almacen", ["hellmanns", "natura", "danica", None], [(237, "g"), (475, "g"), (1, "kg")], 1900),
+    ("Arroz largo fino", "almacen", ["gallo", "molinos", "marolio", "muy bien", None], [(500, "g"), (1, "kg")], 1500),
+    ("Fideos tirabuzón", "almacen", ["matarazzo", "lucchetti", "don vicente", "favorita", "marolio", None], [(500, "g"), (1, "kg")], 1200),
+    ("Fideos spaghetti", "pastas", ["matarazzo", "lucchetti", "don vicente", "favorita"], [(500, "g")], 1250),
+    ("Atún al natural", "almacen", ["la campagnola", "gomes", "cuisine", "lomitos", "argenova", None], [(170, "g"), (120, "g")], 2300),
+    ("Arvejas en lata", "almacen", ["la campagnola", "marolio", "abc", None], [(300, "g"), (350, "g")], 800),
+    ("Gaseosa cola", "bebidas", ["coca cola", "pepsi", None], [(500, "ml"), (1.5, "l"), (2.25, "l")], 2200),
+    ("Gaseosa lima limón", "bebidas", ["sprite", "seven up", "schweppes"], [(500, "ml"), (1.5, "l"), (2.25, "l")], 2000),
+    ("Gaseosa naranja", "bebidas", ["fanta", "schweppes"], [(500, "ml"), (2.25, "l")], 2000),
+    ("Cerveza rubia", "bebidas", ["quilmes", "brahma", "stella artois", "heineken", "andes", "corona", "budweiser"], [(473, "ml"), (1, "l"), (710, "cc")], 1600),
+    ("Leche entera", "lacteos", ["la serenisima", "sancor", "ilolay", "tregar", "la paulina", None], [(1, "l"), (500, "ml")], 1300),
+    ("Yogur bebible", "lacteos", ["la serenisima", "sancor", "milkaut", "ilolay"], [(900, "g"), (200, "g")], 1700),
+    ("Manteca", "lacteos", ["la serenisima", "sancor", "tregar", "milkaut"], [(100, "g"), (200, "g")], 1900),
+    ("Queso cremoso", "quesos", ["la paulina", "sancor", "milkaut", "tregar", "casanto", None], [(500, "g"), (1, "kg")], 7500),
+    ("Queso rallado", "quesos", ["la serenisima", "sancor", "la paulina"], [(40, "g"), (150, "g")], 2600),
+    ("Hamburguesas", "congelados", ["swift", "paladini", "granja del sol", None], [(4, "u"), (320, "g")], 3900),
+    ("Medallones de pollo", "congelados", ["granja del sol", "swift", None], [(380, "g"), (760, "g")], 4200),
+    ("Salchichas", "carnes", ["paladini", "swift", None], [(6, "u"), (225, "g")], 1800),
+    ("Pan lactal", "panaderia", ["bagley", "molinos", None], [(390, "g"), (550, "g")], 2900),
+    ("Cacao en polvo", "desayuno", ["arcor", "molinos", None], [(180, "g"), (360, "g")], 2500),
+    ("Mermelada", "desayuno", ["arcor", "la campagnola", "abc"], [(390, "g"), (454, "g")], 2100),
+    ("Detergente", "limpieza", ["magistral", "cif", "ala", "vivere", None], [(300, "ml"), (500, "ml"), (750, "ml")], 1500),
+    ("Lavandina", "limpieza", ["ayudin", "procenex", None], [(1, "l"), (2, "l")], 1100),
+    ("Desinfectante en aerosol", "limpieza", ["lysoform", "procenex"], [(360, "cc"), (485, "cc")], 3800),
+    ("Limpiador de baño", "limpieza", ["mr musculo", "cif", "procenex"], [(500, "ml"), (900, "ml")], 2700),
+    ("Jabón en polvo", "limpieza", ["skip", "ala", None], [(800, "g"), (3, "kg")], 5600),
+    ("Suavizante", "limpieza", ["vivere", "suave", None], [(900, "ml"), (3, "l")], 3100),
+    ("Shampoo", "perfumeria", ["sedal", "pantene", "dove", "plusbelle", "head shoulders", "loreal"], [(400, "ml"), (750, "ml")], 3600),
+    ("Desodorante", "perfumeria", ["rexona", "axe", "dove", "nivea"], [(150, "ml"), (90, "g")], 2900),
+    ("Crema corporal", "perfumeria", ["nivea", "dove", None], [(200, "ml"), (400, "ml")], 4500),
+]
+
+# Variantes y descripciones de línea (multiplican los productos distintos por tipo)
+VARIANTES_CATALOGO = ["", "", "", "clasica", "original", "light", "zero", "sin azucar", "integral", "premium", "mini"]
+LINEAS_CATALOGO = [
+    "", "", "", "", "familiar", "economico", "extra", "doble", "suave", "intenso", "natural",
+    "reducido en grasas", "organico", "con vitaminas", "fuente de fibra", "edicion limitada",
+]
+
+# Sabores, solo para los tipos que los tienen
+SABORES = ["sabor frutilla", "sabor chocolate", "sabor limon", "sabor vainilla", "sabor durazno"]
+TIPOS_CON_SABOR = {"Galletitas dulces", "Alfajor", "Yogur bebible", "Mermelada", "Cacao en polvo"}
+
+# Marcas propias por tienda (para los tipos con None entre las marcas)
+MARCAS_PROPIAS = {"Carrefour": "Carrefour", "Disco": "Cuisine & Co"}
+
+# Fracción del catálogo base que tiene cada tienda
+COBERTURA_TIENDA = 0.85
+
+# Variación de precio del mismo producto entre tiendas
+DISPERSION_PRECIO = 0.15
+
+
+@lru_cache(maxsize=None)
+def secciones_scrapers():
+    """
+    Categorías de las SECCIONES de todos los scrapers
+
+    Se leen del código con ast (los scrapers importan Playwright y tienen
+    guiones en el nombre, así que no se pueden importar).
+
+    Returns:
+        frozenset: Claves de categoría
+    """
+    categorias = set()
+    for ruta in glob.glob(os.path.join(DIRECTORIO_SCRAPERS, "*-scraper.py")):
+        with open(ruta, encoding="utf-8") as archivo:
+            arbol = ast.parse(archivo.read())
+        for nodo in arbol.body:
+            if (isinstance(nodo, ast.Assign) and len(nodo.targets) == 1
+                    and getattr(nodo.targets[0], "id", None) == "SECCIONES"):
+                categorias.update(ast.literal_eval(nodo.value))
+    return frozenset(categorias)
+
+
+@lru_cache(maxsize=None)
+def tipos_catalogo():
+    """
+    TIPOS_CATALOGO validado contra los scrapers y MARCAS_CONOCIDAS
+
+    Se descartan los tipos de secciones que ningún scraper recorre y las
+    marcas que dejaron de estar en MARCAS_CONOCIDAS.
+    """
+    secciones = secciones_scrapers()
+    conocidas = set(MARCAS_CONOCIDAS)
+    tipos = []
+    for tipo, categoria, marcas, presentaciones, precio in TIPOS_CATALOGO:
+        if secciones and categoria not in secciones:
+            continue
+        marcas = [marca for marca in marcas if marca is None or marca in conocidas]
+        if marcas:
+            tipos.append((tipo, categoria, marcas, presentaciones, precio))
+    return tipos
+
+
+def _formatear_presentacion(aleatorio, valor, unidad):
+    """La misma presentación escrita como la escribe cada tienda ("1.5 L", "1,5lt", "1500 ml")"""
+    if unidad == "u":
+        return aleatorio.choice([f"x {valor} u", f"{valor} unidades", f"x{valor}"])
+
+    if unidad in ("l", "kg") and valor < 10 and aleatorio.random() < 0.2:
+        # Litros/kilos pasados a la unidad chica
+        valor, unidad = int(valor * 1000), "ml" if unidad == "l" else "g"
+
+    alias = {
+        "g": ["g", "gr", "grs"],
+        "kg": ["kg"],
+        "ml": ["ml", "cc"],
+        "cc": ["cc", "ml"],
+        "l": ["l", "lt", "lts"],
+    }[unidad]
+    texto = f"{valor:g}"
+    if aleatorio.random() < 0.3:
+        texto = texto.replace(".", ",")
+    separador = aleatorio.choice(["", " "])
+    return f"{texto}{separador}{aleatorio.choice(alias)}"
+
+
+def _redaccion_tienda(aleatorio, tipo, marca, variante, linea, presentacion):
+    """Nombre del producto como lo publica una tienda (orden, mayúsculas y unidades propias)"""
+    valor, unidad = presentacion
+    formato = _formatear_presentacion(aleatorio, valor, unidad)
+
+    if aleatorio.random() < 0.3:
+        partes = [marca, tipo, variante, linea, formato]
+    else:
+        partes = [tipo, marca, variante, linea, formato]
+    nombre = " ".join(p for p in partes if p)
+
+    sorteo = aleatorio.random()
+    if sorteo < 0.25:
+        return nombre.upper()
+    if sorteo < 0.85:
+        return nombre.title()
+    return nombre[:1].upper() + nombre[1:]
+
+
+def generar_catalogo(productos_por_tienda, semilla=42, tiendas=TIENDAS):
+    """
+    Catálogo sintético del tamaño de una tienda real
+
+    Se arma un catálogo base (tipo + marca + variante + línea + presentación)
+    y cada tienda publica ~COBERTURA_TIENDA de esos productos con su propia
+    redacción y precio: los equivalentes entre tiendas son casi-duplicados,
+    como los que tiene que encontrar el matching.
+
+    Args:
+        productos_por_tienda (int): Productos aproximados por tienda
+        semilla (int): Semilla del generador
+        tiendas (list): Tiendas
+
+    Returns:
+        list: Dicts de productos con id correlativo (mismas columnas que los scrapers)
+    """
+    aleatorio = random.Random(semilla)
+    tipos = tipos_catalogo()
+    productos = []
+    por_tienda = dict.fromkeys(tiendas, 0)
+
+    while min(por_tienda.values()) < productos_por_tienda:
+        tipo, categoria, marcas, presentaciones, precio_tipo = aleatorio.choice(tipos)
+        marca = aleatorio.choice(marcas)
+        variante = aleatorio.choice(VARIANTES_CATALOGO)
+        linea = aleatorio.choice(LINEAS_CATALOGO)
+        if tipo in TIPOS_CON_SABOR and aleatorio.random() < 0.5:
+            linea = aleatorio.choice(SABORES)
+        presentacion = aleatorio.choice(presentaciones)
+
+        # Precio de referencia: el del tipo escalado por la presentación
+        escala = presentacion[0] / presentaciones[0][0] if presentacion[1] == presentaciones[0][1] else 1.8
+        precio_base = precio_tipo * max(escala, 0.5) ** 0.85 * aleatorio.uniform(0.7, 1.4)
+
+        for tienda in tiendas:
+            if por_tienda[tienda] >= productos_por_tienda or aleatorio.random() > COBERTURA_TIENDA:
+                continue
+
+            marca_tienda = marca or MARCAS_PROPIAS.get(tienda, tienda)
+            marca_tienda = next(
+                (alias for alias, canonica in MARCAS_CANONICAS.items()
+                 if canonica == marca_tienda and aleatorio.random() < 0.2),
+                marca_tienda
+            )
+            nombre = _redaccion_tienda(aleatorio, tipo, marca_tienda, variante, linea, presentacion)
+
+            precio = round(precio_base * aleatorio.uniform(1 - DISPERSION_PRECIO, 1 + DISPERSION_PRECIO), 2)
+            promo = aleatorio.choice(PROMOS)
+            productos.append(_fila_producto(len(productos) + 1, nombre, tienda, categoria, precio, promo))
+            por_tienda[tienda] += 1
+
+    return productos
+
+
+def guardar_catalogo_sqlite(productos, ruta, lote=5000):
+    """
+    Escribe el catálogo en una réplica SQLite (para CUIDAELMANGO_STORAGE=sqlite)
+
+    Returns:
+        str: Ruta de la base
+    """
+    from replica import ReplicaCatalogo
+
+    replica = ReplicaCatalogo(ruta)
+    for inicio in range(0, len(productos), lote):
+        replica.guardar_productos(productos[inicio:inicio + lote])
+    return ruta
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Genera un catálogo sintético en una réplica SQLite")
+    parser.add_argument("ruta", help="Archivo SQLite de salida")
+    parser.add_argument("--por-tienda", type=int, default=100000, help="Productos por tienda")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    catalogo = generar_catalogo(args.por_tienda, args.semilla)
+    print(f"🧪 {len(catalogo):,} productos generados en {time.perf_counter() - inicio:.1f}s")
+    guardar_catalogo_sqlite(catalogo, args.ruta)
+    print(f"💾 Réplica en {args.ruta} (usar CUIDAELMANGO_STORAGE=sqlite CUIDAELMANGO_REPLICA={args.ruta})")
@@ -0,0 +1,285 @@
+"""
+Micro-benchmarks de los caminos calientes de CuidaElMango
+
+Mide ops/seg y memoria asignada por operación (tracemalloc) de:
+- extraer_atributos_producto y analizar_cantidades
+- similar_strings
+- calcular_match_score
+- encontrar_mejores_matches
+- comparar_inteligente completo, contra RepositorioMemoria (sin red)
+
+Uso:
+    python benchmarks/micro.py                       # corre todo y guarda JSON
+    python benchmarks/micro.py --solo matching       # solo un grupo (extraccion, matching, comparacion)
+    python benchmarks/micro.py --comparar base.json  # marca regresiones contra otra corrida
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(DIRECTORIO))
+
+# La app se importa contra un catálogo en memoria y un DATA_DIR descartable
+os.environ.setdefault("CUIDAELMANGO_STORAGE", "memoria")
+if "CUIDAELMANGO_DATA_DIR" not in os.environ:
+    os.environ["CUIDAELMANGO_DATA_DIR"] = tempfile.mkdtemp(prefix="cuidaelmango-bench-")
+
+from datos import generar_nombres, generar_productos
+from matching import calcular_match_score, encontrar_mejores_matches, similar_strings
+from cantidades import analizar_cantidades
+from utils import extraer_atributos_producto
+
+
+DIRECTORIO_RESULTADOS = os.path.join(DIRECTORIO, "resultados")
+
+# Tiempo mínimo medido por caso
+SEGUNDOS_DEFAULT = 1.0
+
+# Operaciones medidas con tracemalloc (activo hace todo más lento, va aparte)
+OPERACIONES_MEMORIA = 200
+
+# Caída de ops/seg a partir de la cual --comparar marca regresión
+UMBRAL_REGRESION = 0.10
+
+
+def medir(nombre, operacion, segundos=SEGUNDOS_DEFAULT):
+    """
+    Ops/seg de una operación sin argumentos y memoria que usa por operación
+
+    bytes_por_op es el pico de memoria asignada durante una operación (promedio)
+    y bytes_retenidos lo que quedó vivo después de OPERACIONES_MEMORIA operaciones.
+
+    Returns:
+        dict: nombre, operaciones, segundos, ops_seg, us_por_op, bytes_por_op, bytes_retenidos
+    """
+    # Calentamiento (caches, imports perezosos)
+    for _ in range(10):
+        operacion()
+
+    gc.collect()
+    operaciones = 0
+    lote = 1
+    inicio = time.perf_counter()
+    transcurrido = 0
+    while transcurrido < segundos:
+        for _ in range(lote):
+            operacion()
+        operaciones += lote
+        transcurrido = time.perf_counter() - inicio
+        lote = min(lote * 2, 10000)
+
+    tracemalloc.start()
+    inicial, _ = tracemalloc.get_traced_memory()
+    picos = 0
+    for _ in range(OPERACIONES_MEMORIA):
+        actual, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        operacion()
+        _, pico = tracemalloc.get_traced_memory()
+        picos += pico - actual
+    final, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    resultado = {
+        "nombre": nombre,
+        "operaciones": operaciones,
+        "segundos": round(transcurrido, 4),
+        "ops_seg": round(operaciones / transcurrido, 1),
+        "us_por_op": round(transcurrido / operaciones * 1e6, 2),
+        "bytes_por_op": round(picos / OPERACIONES_MEMORIA, 1),
+        "bytes_retenidos": max(0, final - inicial),
+    }
+    print(f"  {nombre:40} {resultado['ops_seg']:>12,.1f} ops/s {resultado['us_por_op']:>10,.2f} µs/op "
+          f"{resultado['bytes_por_op']:>10,.0f} B/op")
+    return resultado
+
+
+def ciclo(valores):
+    """Operación que recorre los valores de a uno (para no medir siempre el mismo caso)"""
+    estado = {"i": 0}
+
+    def siguiente():
+        valor = valores[estado["i"] % len(valores)]
+        estado["i"] += 1
+        return valor
+
+    return siguiente
+
+
+# ============================================
+# CASOS
+# ============================================
+
+def casos_extraccion():
+    nombres = generar_nombres(2000)
+    siguiente = ciclo(nombres)
+    siguiente_cantidades = ciclo([nombre.lower() for nombre in nombres])
+    return {
+        "extraer_atributos_producto": lambda: extraer_atributos_producto(siguiente()),
+        "analizar_cantidades": lambda: analizar_cantidades(siguiente_cantidades()),
+    }
+
+
+def casos_matching():
+    productos = generar_productos(2000)
+    lista_pares = [(productos[i], productos[i + 1]) for i in range(len(productos) - 1)]
+    pares = ciclo(lista_pares)
+    nombres = ciclo([(a["nombre_limpio"], b["nombre_limpio"]) for a, b in lista_pares])
+
+    # Origen + 10 candidatos de la otra tienda, como devuelve buscar_candidatos
+    por_tienda = {}
+    for producto in productos:
+        por_tienda.setdefault(producto["tienda"], []).append(producto)
+    tiendas = list(por_tienda)
+    grupos = ciclo([
+        (origen, por_tienda[tiendas[1]][i:i + 10])
+        for i, origen in enumerate(por_tienda[tiendas[0]][:500])
+    ])
+
+    def match_score():
+        a, b = pares()
+        return calcular_match_score(a, b)
+
+    def similitud():
+        a, b = nombres()
+        return similar_strings(a, b)
+
+    def mejores_matches():
+        origen, candidatos = grupos()
+        return encontrar_mejores_matches(origen, candidatos, top_n=5)
+
+    return {
+        "similar_strings": similitud,
+        "calcular_match_score": match_score,
+        "encontrar_mejores_matches (10 candidatos)": mejores_matches,
+    }
+
+
+def casos_comparacion():
+    import app as api
+
+    productos = generar_productos(5000)
+    api.repositorio.guardar_productos(productos)
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(api.construir_indices())
+
+    carritos = []
+    origenes = [p for p in productos if p["tienda"] == api.TIENDAS[0]]
+    for i in range(0, 200, 10):
+        carritos.append(api.RequestComparacion(productos=[
+            api.ProductoComparacion(**{
+                campo: p[campo] for campo in api.ProductoComparacion.model_fields if p.get(campo) is not None
+            })
+            for p in origenes[i:i + 10]
+        ]))
+    siguiente = ciclo(carritos)
+
+    def comparar():
+        return loop.run_until_complete(api.comparar_inteligente(siguiente()))
+
+    return {
+        "comparar_inteligente (10 productos)": comparar,
+    }
+
+
+GRUPOS = {
+    "extraccion": casos_extraccion,
+    "matching": casos_matching,
+    "comparacion": casos_comparacion,
+}
+
+
+# ============================================
+# RESULTADOS
+# ============================================
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=DIRECTORIO, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def comparar(resultados, archivo_base, umbral=UMBRAL_REGRESION):
+    """
+    Compara ops/seg contra otra corrida
+
+    Returns:
+        list: Nombres de los casos que empeoraron más que el umbral
+    """
+    with open(archivo_base, encoding="utf-8") as archivo:
+        base = {caso["nombre"]: caso for caso in json.load(archivo)["casos"]}
+
+    print(f"\nComparación contra {archivo_base}:")
+    regresiones = []
+    for caso in resultados["casos"]:
+        anterior = base.get(caso["nombre"])
+        if anterior is None:
+            continue
+        cambio = caso["ops_seg"] / anterior["ops_seg"] - 1
+        marca = ""
+        if cambio < -umbral:
+            marca = "  ⚠ REGRESIÓN"
+            regresiones.append(caso["nombre"])
+        print(f"  {caso['nombre']:40} {cambio * 100:+7.1f}% ops/s "
+              f"({anterior['bytes_por_op']:,.0f} → {caso['bytes_por_op']:,.0f} B/op){marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de CuidaElMango")
+    parser.add_argument("--segundos", type=float, default=SEGUNDOS_DEFAULT, help="Tiempo medido por caso")
+    parser.add_argument("--solo", choices=list(GRUPOS), help="Correr un solo grupo")
+    parser.add_argument("--salida", help="Archivo JSON (default: benchmarks/resultados/<fecha>-<commit>.json)")
+    parser.add_argument("--comparar", help="JSON de otra corrida para detectar regresiones")
+    args = parser.parse_args()
+
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_actual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "segundos_por_caso": args.segundos,
+        "casos": [],
+    }
+
+    for grupo, armar in GRUPOS.items():
+        if args.solo and args.solo != grupo:
+            continue
+
+        print(f"\n{grupo.upper()}")
+        for nombre, operacion in armar().items():
+            resultados["casos"].append(medir(nombre, operacion, args.segundos))
+
+    salida = args.salida or os.path.join(
+        DIRECTORIO_RESULTADOS,
+        f"{datetime.now():%Y%m%d-%H%M%S}-{resultados['commit'] or 'sin-commit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados en {salida}")
+
+    if args.comparar:
+        regresiones = comparar(resultados, args.comparar)
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Cache de respuestas para CuidaElMango
+LRU acotado con TTL + coalescing de pedidos idénticos concurrentes
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict, namedtuple
+
+
+MAX_ENTRADAS = 2000
+TTL_SEGUNDOS = 300
+
+EntradaCache = namedtuple("EntradaCache", ["valor", "etag", "expira"])
+
+
+def calcular_etag(valor):
+    """
+    ETag fuerte a partir del contenido serializado
+    """
+    contenido = json.dumps(valor, sort_keys=True, default=str).encode("utf-8")
+    return '"' + hashlib.blake2b(contenido, digest_size=16).hexdigest() + '"'
+
+
+class CacheRespuestas:
+    """
+    Cache en proceso
+
+    - Claves: tuplas (namespace, parámetros normalizados..., versión del catálogo)
+    - Expira por TTL y desaloja por LRU al pasar max_entradas
+    - Si varios pedidos piden la misma clave ausente, solo uno va a la base
+      y el resto espera ese resultado (single-flight)
+    """
+
+    def __init__(self, max_entradas=MAX_ENTRADAS, ttl=TTL_SEGUNDOS):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+
+        self._entradas = OrderedDict()
+        self._en_vuelo = {}
+
+        self.aciertos = 0
+        self.fallos = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obtener(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+
+        if entrada.expira < time.monotonic():
+            del self._entradas[clave]
+            return None
+
+        self._entradas.move_to_end(clave)
+        return entrada
+
+    def guardar(self, clave, valor):
+        entrada = EntradaCache(valor, calcular_etag(valor), time.monotonic() + self.ttl)
+
+        self._entradas[clave] = entrada
+        self._entradas.move_to_end(clave)
+
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+        return entrada
+
+    async def obtener_o_calcular(self, clave, calcular):
+        """
+        Retorna la entrada cacheada o la calcula una sola vez
+
+        Args:
+            clave (tuple): Clave normalizada
+            calcular (callable): Corutina sin argumentos que produce el valor
+
+        Returns:
+            EntradaCache: valor + etag
+        """
+        entrada = self.obtener(clave)
+        if entrada is not None:
+            self.aciertos += 1
+            return entrada
+
+        # El cálculo corre en una tarea aparte: si el pedido que lo lanzó se
+        # cancela (el cliente se desconectó), los demás siguen esperándolo
+        tarea = self._en_vuelo.get(clave)
+        if tarea is not None:
+            self.aciertos += 1
+        else:
+            self.fallos += 1
+            tarea = asyncio.ensure_future(self._calcular(clave, calcular))
+            # Si nadie más esperaba, evitar el warning de excepción no recuperada
+            tarea.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._en_vuelo[clave] = tarea
+
+        return await asyncio.shield(tarea)
+
+    async def _calcular(self, clave, calcular):
+        try:
+            return self.guardar(clave, await calcular())
+        finally:
+            del self._en_vuelo[clave]
+
+    def invalidar(self, prefijo=()):
+        """
+        Borra las entradas cuya clave empieza con el prefijo (todas si es vacío)
+
+        Returns:
+            int: Entradas borradas
+        """
+        claves = [clave for clave in self._entradas if clave[:len(prefijo)] == prefijo]
+        for clave in claves:
+            del self._entradas[clave]
+        return len(claves)
@@ -0,0 +1,142 @@
+"""
+Cantidades para CuidaElMango
+
+Lee peso/volumen y unidades por pack del nombre de un producto en una sola
+pasada. PATRON_CANTIDADES es un lexer de expresiones de cantidad: una
+alternativa con nombre por cada forma, y un solo finditer recorre el nombre
+de izquierda a derecha devolviendo cada expresión ya completa (el pack con
+su peso, el peso con su "x 6"), sin regex que compitan entre sí.
+
+Formas reconocidas:
+- pack delante:       6 x 1.5L, 12x354cc                    → cantidad 6, peso 1.5 l
+- peso simple:        500 g, 1,5 lts, 2.25 litros, 1/2 kg   → peso
+- pack detrás:        354 ml x 6, 1 L x 12 u                → peso 354 ml, cantidad 6
+- solo cantidad:      pack x 6, pack 24, x 6 u, x6, 30 unidades
+- peso marcado con x: "Yerba x 500 g" es un peso, no un pack de 500
+
+Un número seguido de "x" y otro número sin unidad ("Promo 2x1", "30 x 40")
+no es cantidad. Las unidades salen canónicas: g, kg, ml, l.
+"""
+
+import re
+
+
+# Alias de cada unidad → unidad canónica
+UNIDADES = {
+    'g': 'g', 'gr': 'g', 'grs': 'g', 'grm': 'g', 'grms': 'g', 'gramo': 'g', 'gramos': 'g',
+    'kg': 'kg', 'kgs': 'kg', 'kilo': 'kg', 'kilos': 'kg', 'kilogramo': 'kg', 'kilogramos': 'kg',
+    'ml': 'ml', 'mls': 'ml', 'cc': 'ml', 'cm3': 'ml', 'mililitro': 'ml', 'mililitros': 'ml',
+    'l': 'l', 'lt': 'l', 'lts': 'l', 'ltr': 'l', 'ltrs': 'l', 'litro': 'l', 'litros': 'l',
+}
+
+# Unidades chicas: ahí "1.500" es mil quinientos y no uno coma cinco
+UNIDADES_CHICAS = {'g', 'ml'}
+
+# Palabras que cuentan unidades ("x 6 u", "30 unidades")
+PALABRAS_UNIDAD = ['u', 'un', 'unid', 'unidad', 'unidades', 'ud', 'uds']
+
+
+def _alternativas(palabras):
+    # Las más largas primero, para que "grs" no se lea como "g"
+    return '|'.join(sorted(palabras, key=len, reverse=True))
+
+
+_LETRA = r'a-zñáéíóú'
+_NUMERO = r'\d+(?:[.,]\d+)*(?:/\d+)?'
+_ENTERO = r'\d+(?![.,]?\d)'
+_UNIDAD = rf'(?:{_alternativas(UNIDADES)})(?![{_LETRA}\d])'
+_CONTEO = rf'\s*(?:{_alternativas(PALABRAS_UNIDAD)})(?![{_LETRA}])'
+_POR = r'\s*[x×*]\s*'
+_INICIO = rf'(?<![{_LETRA}\d.,/])'
+
+# El lookahead descarta de una las posiciones que no pueden empezar una
+# cantidad; sin él cada letra del nombre prueba las cinco alternativas
+PATRON_CANTIDADES = re.compile(rf"""
+    (?=[\dx×*p]){_INICIO}
+    (?:
+        (?P<pack>\d+){_POR}(?P<pack_peso>{_NUMERO})\s*(?P<pack_unidad>{_UNIDAD})
+      | (?:[x×]\s*)?(?P<peso>{_NUMERO})\s*(?P<unidad>{_UNIDAD})
+            (?:{_POR}(?P<peso_cantidad>{_ENTERO})(?!\s*{_UNIDAD})(?:{_CONTEO})?)?
+      | (?P<conteo>{_ENTERO}){_CONTEO}
+      | (?<!\d\s)[x×*]\s*(?P<por>{_ENTERO})(?!\s*{_UNIDAD})(?:{_CONTEO})?
+      | packs?(?:{_POR}|\s*)(?P<pack_cantidad>{_ENTERO})(?!\s*(?:{_UNIDAD}|[x×*]))(?:{_CONTEO})?
+    )
+""", re.VERBOSE)
+
+
+def _numero(texto, unidad=None):
+    """
+    Valor de un número escrito como en las tiendas ("1,5", "2.25", "1.000", "1/2")
+
+    Returns:
+        float: Valor, o None si no es un número válido
+    """
+    if texto.isdigit():
+        return float(texto)
+
+    if '/' in texto:
+        numerador, denominador = texto.split('/')
+        return int(numerador) / int(denominador) if int(denominador) else None
+
+    if '.' in texto and ',' in texto:
+        # 1.500,5: punto de miles y coma decimal
+        texto = texto.replace('.', '').replace(',', '.')
+    elif texto.count('.') + texto.count(',') > 1:
+        return None
+    else:
+        entero, _, decimales = texto.replace(',', '.').partition('.')
+        if len(decimales) == 3 and unidad in UNIDADES_CHICAS:
+            # 1.500 ml: separador de miles
+            texto = entero + decimales
+        else:
+            texto = texto.replace(',', '.')
+    return float(texto)
+
+
+def analizar_cantidades(texto):
+    """
+    Peso/volumen y cantidad de unidades de un nombre de producto
+
+    Si hay varias expresiones gana la primera de cada tipo; todas se
+    devuelven en `tramos` para sacarlas del nombre limpio.
+
+    Args:
+        texto (str): Nombre en minúsculas
+
+    Returns:
+        dict: {"peso", "peso_unidad", "cantidad_unidades", "tramos"} con
+              tramos = [(inicio, fin)] de las expresiones reconocidas
+    """
+    peso = unidad = cantidad = None
+    tramos = []
+
+    for match in PATRON_CANTIDADES.finditer(texto or ''):
+        (pack, pack_peso, pack_unidad, peso_leido, unidad_leida,
+         peso_cantidad, conteo, por, pack_cantidad) = match.groups()
+        if pack is not None:
+            pack_unidad = UNIDADES[pack_unidad]
+            leido = _numero(pack_peso, pack_unidad)
+            if peso is None and leido:
+                peso, unidad = leido, pack_unidad
+                cantidad = cantidad or int(pack) or None
+        elif peso_leido is not None:
+            unidad_leida = UNIDADES[unidad_leida]
+            leido = _numero(peso_leido, unidad_leida)
+            if peso is None and leido:
+                peso, unidad = leido, unidad_leida
+            if peso_cantidad and cantidad is None:
+                cantidad = int(peso_cantidad) or None
+        elif cantidad is None:
+            cantidad = int(conteo or por or pack_cantidad) or None
+        tramos.append(match.span())
+
+    return {'peso': peso, 'peso_unidad': unidad, 'cantidad_unidades': cantidad, 'tramos': tramos}
+
+
+if __name__ == "__main__":
+    import sys
+
+    for nombre in sys.argv[1:] or ["Agua 6 x 1.5L", "Cerveza Quilmes 473 ml x 6 u", "Pack x 12 Yogur 190 g"]:
+        cantidades = analizar_cantidades(nombre.lower())
+        print(f"{nombre:40} → {cantidades['peso']} {cantidades['peso_unidad']} "
+              f"x{cantidades['cantidad_unidades']}")
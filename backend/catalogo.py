@@ -0,0 +1,69 @@
+"""
+Versión del catálogo para CuidaElMango
+Los scrapers publican una versión nueva al terminar; la API la usa para invalidar caches
+"""
+
+import os
+import time
+
+
+DATA_DIR = os.environ.get(
+    "CUIDAELMANGO_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+)
+
+# Lo que escriben los scrapers y lee la API (versión, snapshot, histórico,
+# alertas, planificador, firmas de matching y cola). Con trabajadores en
+# varias máquinas tiene que ser un volumen que vean todas (y la API), con
+# CUIDAELMANGO_COMPARTIDO_WAL=0: WAL necesita memoria compartida entre
+# procesos y no anda sobre un volumen de red. La réplica sigue en DATA_DIR
+# (una por máquina).
+DIR_COMPARTIDO = os.environ.get("CUIDAELMANGO_COMPARTIDO_DIR", DATA_DIR)
+WAL_COMPARTIDO = os.environ.get("CUIDAELMANGO_COMPARTIDO_WAL", "1") != "0"
+
+ARCHIVO_VERSION = os.path.join(DIR_COMPARTIDO, "catalogo.version")
+
+# (mtime, version) de la última lectura: solo se relee el archivo si cambió
+_ultima_lectura = (None, "0")
+
+
+def version_catalogo():
+    """
+    Retorna la versión actual del catálogo ("0" si nunca se publicó)
+
+    Cuesta un os.stat por llamada; el contenido solo se lee cuando cambia el archivo.
+    """
+    global _ultima_lectura
+
+    try:
+        mtime = os.stat(ARCHIVO_VERSION).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+
+    if mtime != _ultima_lectura[0]:
+        with open(ARCHIVO_VERSION, encoding="utf-8") as archivo:
+            _ultima_lectura = (mtime, archivo.read().strip() or "0")
+
+    return _ultima_lectura[1]
+
+
+def publicar_version():
+    """
+    Publica una versión nueva del catálogo (al terminar un scrape)
+
+    Escribe a un temporal y lo renombra para que nadie lea un archivo a medias.
+
+    Returns:
+        str: Versión publicada
+    """
+    os.makedirs(DIR_COMPARTIDO, exist_ok=True)
+
+    version = str(time.time_ns())
+    temporal = f"{ARCHIVO_VERSION}.{os.getpid()}.tmp"
+
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        archivo.write(version)
+    os.replace(temporal, ARCHIVO_VERSION)
+
+    print(f"📦 Catálogo publicado: versión {version}")
+    return version
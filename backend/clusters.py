@@ -0,0 +1,144 @@
+"""
+Clusters de productos equivalentes para CuidaElMango
+
+Union-find sobre las equivalencias fuertes (correcciones del usuario y pares
+automáticos de confianza alta): cada producto queda en el cluster de "el mismo
+producto en todas las tiendas". El cluster_id es el menor id del grupo, así no
+cambia mientras se sigan agregando equivalencias.
+
+Job completo: python clusters.py
+"""
+
+from equivalencias import UMBRAL_CONFIRMADA
+
+
+# Confianza mínima de un par automático para unir clusters
+# (la clausura transitiva propaga errores, así que no se baja de UMBRAL_CONFIRMADA)
+UMBRAL_CLUSTER = max(UMBRAL_CONFIRMADA, 90)
+
+
+def es_enlace_fuerte(confianza, corregido):
+    return bool(corregido) or (confianza or 0) >= UMBRAL_CLUSTER
+
+
+class ClustersProductos:
+    """
+    Union-find con unión hacia el menor id
+
+    Solo guarda productos que tienen al menos una equivalencia fuerte; el resto
+    es un cluster de un solo producto.
+    """
+
+    def __init__(self):
+        self._padre = {}
+        self._miembros = {}
+        self.version = None
+
+    def __len__(self):
+        return len(self._padre)
+
+    def cargar(self, filas, version=None):
+        """
+        Reconstruye los clusters desde las filas de la tabla equivalencias
+
+        Args:
+            filas (list): Dicts con producto_a_id, producto_b_id, confianza, corregido_por_usuario
+            version (str): Versión del catálogo con la que se cargó
+        """
+        self._padre = {}
+        self._miembros = {}
+        for fila in filas:
+            if es_enlace_fuerte(fila.get('confianza'), fila.get('corregido_por_usuario')):
+                self.unir(fila['producto_a_id'], fila['producto_b_id'])
+        self.version = version
+
+    def _raiz(self, producto_id):
+        raiz = producto_id
+        while self._padre[raiz] != raiz:
+            raiz = self._padre[raiz]
+
+        # Compresión de caminos
+        while self._padre[producto_id] != raiz:
+            self._padre[producto_id], producto_id = raiz, self._padre[producto_id]
+
+        return raiz
+
+    def _asegurar(self, producto_id):
+        if producto_id not in self._padre:
+            self._padre[producto_id] = producto_id
+            self._miembros[producto_id] = {producto_id}
+
+    def unir(self, producto_a_id, producto_b_id):
+        """
+        Une los clusters de dos productos
+
+        Returns:
+            dict: producto_id -> cluster_id nuevo, solo de los productos que cambiaron
+                  (para persistir incrementalmente)
+        """
+        nuevos = {i for i in (producto_a_id, producto_b_id) if i not in self._padre}
+        self._asegurar(producto_a_id)
+        self._asegurar(producto_b_id)
+
+        raiz_a = self._raiz(producto_a_id)
+        raiz_b = self._raiz(producto_b_id)
+
+        if raiz_a == raiz_b:
+            return {i: raiz_a for i in nuevos}
+
+        raiz, absorbida = min(raiz_a, raiz_b), max(raiz_a, raiz_b)
+        self._padre[absorbida] = raiz
+
+        movidos = self._miembros.pop(absorbida)
+        self._miembros[raiz] |= movidos
+
+        cambios = {i: raiz for i in movidos}
+        cambios.update({i: raiz for i in nuevos})
+        return cambios
+
+    def cluster(self, producto_id):
+        """
+        Returns:
+            int: cluster_id, o None si el producto no tiene equivalencias fuertes
+        """
+        if producto_id not in self._padre:
+            return None
+        return self._raiz(producto_id)
+
+    def miembros(self, cluster_id):
+        return self._miembros.get(cluster_id, set())
+
+    def asignaciones(self):
+        """
+        Returns:
+            dict: producto_id -> cluster_id de todos los productos agrupados
+        """
+        return {producto_id: self._raiz(producto_id) for producto_id in self._padre}
+
+
+def recalcular_clusters(repositorio):
+    """
+    Job completo: recalcula todos los clusters y guarda solo los cluster_id que cambiaron
+    (incluye limpiar los de productos que quedaron sin equivalencias fuertes)
+
+    Returns:
+        int: Productos actualizados
+    """
+    clusters = ClustersProductos()
+    clusters.cargar(repositorio.listar_equivalencias())
+    nuevas = clusters.asignaciones()
+
+    cambios = {}
+    for fila in repositorio.listar_productos("id,cluster_id"):
+        nuevo = nuevas.get(fila["id"])
+        if fila.get("cluster_id") != nuevo:
+            cambios[fila["id"]] = nuevo
+
+    repositorio.asignar_clusters(cambios)
+    return len(cambios)
+
+
+if __name__ == "__main__":
+    from database import get_repositorio
+    actualizados = recalcular_clusters(get_repositorio())
+    print(f"✅ Clusters recalculados: {actualizados} productos actualizados")
@@ -0,0 +1,494 @@
+"""
+Cola de trabajo de scraping para CuidaElMango
+
+Una corrida se parte en unidades (tienda, sección, página) en un SQLite que
+comparten todos los procesos (en la misma máquina o en varias con un volumen
+compartido), sin broker externo:
+
+- Los trabajadores toman unidades con un lease (vence en `duracion` segundos)
+  y lo renuevan con latidos mientras scrapean; si un trabajador muere, el lease
+  vence y la unidad vuelve a la cola
+- Una unidad que falla se reintenta con espera creciente; después de
+  MAXIMO_INTENTOS queda "muerta" (dead-letter) con el último error
+- El coordinador expande cada sección: mantiene PAGINAS_ADELANTO páginas por
+  delante de la última que trajo productos y corta la sección en la primera
+  página vacía, así varias páginas de la misma sección se scrapean a la vez
+
+Estados de una unidad: pendiente → tomada → hecha | muerta (o cancelada si la
+sección terminó antes de llegar a esa página).
+
+Con varias máquinas sobre un volumen de red usar wal=False (WAL necesita
+memoria compartida entre procesos) y relojes sincronizados (los leases son
+timestamps).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from catalogo import DIR_COMPARTIDO, WAL_COMPARTIDO
+
+
+RUTA_COLA = os.path.join(DIR_COMPARTIDO, "cola_scraping.sqlite")
+
+# Segundos que dura un lease sin latidos
+DURACION_LEASE = 120
+
+# Intentos de una unidad antes de mandarla a dead-letter
+MAXIMO_INTENTOS = 4
+
+# Espera antes de reintentar una unidad fallida (se duplica por intento)
+ESPERA_REINTENTO = 10
+
+# Páginas que se encolan por delante de la última página con productos
+PAGINAS_ADELANTO = 3
+
+# Espera de un proceso cuando otro tiene la base bloqueada
+TIMEOUT_BLOQUEO = 30
+
+ESTADOS = ("pendiente", "tomada", "hecha", "muerta", "cancelada")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS corridas (
+    id INTEGER PRIMARY KEY,
+    creada REAL NOT NULL,
+    terminada REAL
+);
+
+-- Hasta dónde llegó cada sección (fin: primera página vacía, NULL si no se sabe)
+CREATE TABLE IF NOT EXISTS secciones (
+    corrida_id INTEGER NOT NULL,
+    tienda TEXT NOT NULL,
+    seccion TEXT NOT NULL,
+    max_paginas INTEGER,
+    fin INTEGER,
+    PRIMARY KEY (corrida_id, tienda, seccion)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS unidades (
+    id INTEGER PRIMARY KEY,
+    corrida_id INTEGER NOT NULL,
+    tienda TEXT NOT NULL,
+    seccion TEXT NOT NULL,
+    pagina INTEGER NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    disponible_desde REAL NOT NULL DEFAULT 0,
+    trabajador TEXT,
+    vence REAL,
+    productos INTEGER,
+    error TEXT,
+    actualizada REAL,
+    UNIQUE (corrida_id, tienda, seccion, pagina)
+);
+
+-- Tomar: la pendiente disponible más vieja
+CREATE INDEX IF NOT EXISTS idx_unidades_estado ON unidades (estado, disponible_desde, id);
+
+-- Recuperar leases vencidos
+CREATE INDEX IF NOT EXISTS idx_unidades_vence ON unidades (estado, vence);
+"""
+
+
+class ColaScraping:
+    """
+    Broker de unidades de scraping sobre SQLite
+
+    Una conexión por thread (el latido corre en otro thread que el scraping);
+    las operaciones que cambian estado usan BEGIN IMMEDIATE, así dos procesos
+    nunca toman la misma unidad.
+    """
+
+    def __init__(self, ruta=RUTA_COLA, wal=WAL_COMPARTIDO):
+        self.ruta = ruta
+        self.wal = wal
+        self._local = threading.local()
+        self._esquema_creado = False
+        self._lock = threading.Lock()
+
+    def _crear_esquema(self):
+        with self._lock:
+            if self._esquema_creado:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            with sqlite3.connect(self.ruta, timeout=TIMEOUT_BLOQUEO) as conexion:
+                conexion.executescript(ESQUEMA)
+            self._esquema_creado = True
+
+    def conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            if not self._esquema_creado:
+                self._crear_esquema()
+            # Transacciones manuales (BEGIN IMMEDIATE) en vez de las implícitas de sqlite3
+            conexion = sqlite3.connect(
+                self.ruta, timeout=TIMEOUT_BLOQUEO, isolation_level=None, check_same_thread=False
+            )
+            conexion.row_factory = sqlite3.Row
+            conexion.execute(f"PRAGMA journal_mode={'WAL' if self.wal else 'DELETE'}")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def _escribir(self, operacion):
+        """Corre operacion(conexion) en una transacción con el lock de escritura tomado"""
+        conexion = self.conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = operacion(conexion)
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        conexion.execute("COMMIT")
+        return resultado
+
+    # ============================================
+    # CORRIDAS
+    # ============================================
+
+    def crear_corrida(self, secciones, max_paginas=None):
+        """
+        Encola una corrida nueva (la primera página de cada sección)
+
+        Args:
+            secciones (dict): tienda -> lista de secciones
+            max_paginas (int): Tope de páginas por sección (None = hasta la primera vacía)
+
+        Returns:
+            int: id de la corrida
+        """
+        def crear(conexion):
+            corrida_id = conexion.execute(
+                "INSERT INTO corridas (creada) VALUES (?)", (time.time(),)
+            ).lastrowid
+            pares = [(tienda, seccion) for tienda, lista in secciones.items() for seccion in lista]
+            conexion.executemany(
+                "INSERT INTO secciones (corrida_id, tienda, seccion, max_paginas) VALUES (?, ?, ?, ?)",
+                [(corrida_id, tienda, seccion, max_paginas) for tienda, seccion in pares]
+            )
+            conexion.executemany(
+                "INSERT INTO unidades (corrida_id, tienda, seccion, pagina, actualizada) VALUES (?, ?, ?, 1, ?)",
+                [(corrida_id, tienda, seccion, time.time()) for tienda, seccion in pares]
+            )
+            return corrida_id
+
+        return self._escribir(crear)
+
+    def crear_corrida_plan(self, paginas):
+        """
+        Encola una corrida con páginas puntuales (un plan del planificador)
+
+        Las secciones no se expanden: se scrapean exactamente estas páginas, y
+        los trabajadores las toman en el orden recibido (el de prioridad).
+
+        Args:
+            paginas (list): Dicts o tuplas (tienda, seccion, pagina)
+
+        Returns:
+            int: id de la corrida
+        """
+        unidades = [
+            (p["tienda"], p["seccion"], p["pagina"]) if isinstance(p, dict) else tuple(p)
+            for p in paginas
+        ]
+
+        def crear(conexion):
+            corrida_id = conexion.execute(
+                "INSERT INTO corridas (creada) VALUES (?)", (time.time(),)
+            ).lastrowid
+            conexion.executemany(
+                "INSERT OR IGNORE INTO unidades (corrida_id, tienda, seccion, pagina, actualizada) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(corrida_id, tienda, seccion, pagina, time.time()) for tienda, seccion, pagina in unidades]
+            )
+            return corrida_id
+
+        return self._escribir(crear)
+
+    def corrida_activa(self):
+        """id de la última corrida sin terminar (None si no hay)"""
+        fila = self.conexion().execute(
+            "SELECT id FROM corridas WHERE terminada IS NULL ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        return fila["id"] if fila else None
+
+    def terminar_corrida(self, corrida_id):
+        self._escribir(lambda conexion: conexion.execute(
+            "UPDATE corridas SET terminada = ? WHERE id = ?", (time.time(), corrida_id)
+        ))
+
+    # ============================================
+    # TRABAJADORES
+    # ============================================
+
+    def tomar(self, trabajador, tiendas=None, duracion=DURACION_LEASE):
+        """
+        Toma la unidad pendiente disponible más vieja (de corridas sin terminar)
+
+        Antes recupera los leases vencidos, así un trabajador caído no deja
+        unidades colgadas aunque el coordinador no esté corriendo.
+
+        Args:
+            trabajador (str): Identificador del trabajador (host:pid)
+            tiendas (list): Solo unidades de estas tiendas (None = todas)
+            duracion (float): Segundos del lease
+
+        Returns:
+            dict: La unidad tomada (id, corrida_id, tienda, seccion, pagina, intentos) o None
+        """
+        def tomar_unidad(conexion):
+            ahora = time.time()
+            self._recuperar_vencidos(conexion, ahora)
+
+            filtro = ""
+            parametros = [ahora]
+            if tiendas:
+                filtro = f" AND u.tienda IN ({', '.join('?' for _ in tiendas)})"
+                parametros.extend(tiendas)
+
+            fila = conexion.execute(
+                "SELECT u.id FROM unidades u JOIN corridas c ON c.id = u.corrida_id "
+                "WHERE u.estado = 'pendiente' AND u.disponible_desde <= ? AND c.terminada IS NULL"
+                f"{filtro} ORDER BY u.disponible_desde, u.id LIMIT 1",
+                parametros
+            ).fetchone()
+            if fila is None:
+                return None
+
+            conexion.execute(
+                "UPDATE unidades SET estado = 'tomada', trabajador = ?, vence = ?, "
+                "intentos = intentos + 1, actualizada = ? WHERE id = ?",
+                (trabajador, ahora + duracion, ahora, fila["id"])
+            )
+            return dict(conexion.execute(
+                "SELECT id, corrida_id, tienda, seccion, pagina, intentos FROM unidades WHERE id = ?",
+                (fila["id"],)
+            ).fetchone())
+
+        return self._escribir(tomar_unidad)
+
+    def latido(self, unidad_id, trabajador, duracion=DURACION_LEASE):
+        """
+        Extiende el lease de una unidad
+
+        Returns:
+            bool: False si el lease se perdió (venció y la tomó otro): el
+                  trabajador debería abandonar la unidad
+        """
+        def renovar(conexion):
+            return conexion.execute(
+                "UPDATE unidades SET vence = ?, actualizada = ? "
+                "WHERE id = ? AND estado = 'tomada' AND trabajador = ?",
+                (time.time() + duracion, time.time(), unidad_id, trabajador)
+            ).rowcount > 0
+
+        return self._escribir(renovar)
+
+    def completar(self, unidad_id, trabajador, productos):
+        """
+        Marca una unidad como hecha (productos = 0 indica que la sección terminó)
+
+        Returns:
+            bool: False si el lease ya no era de este trabajador
+        """
+        def completar_unidad(conexion):
+            return conexion.execute(
+                "UPDATE unidades SET estado = 'hecha', productos = ?, vence = NULL, error = NULL, "
+                "actualizada = ? WHERE id = ? AND estado = 'tomada' AND trabajador = ?",
+                (productos, time.time(), unidad_id, trabajador)
+            ).rowcount > 0
+
+        return self._escribir(completar_unidad)
+
+    def fallar(self, unidad_id, trabajador, error):
+        """
+        Devuelve una unidad fallida a la cola con espera, o a dead-letter si
+        agotó los intentos
+
+        Returns:
+            str: Estado nuevo ("pendiente" o "muerta"), None si el lease ya no era suyo
+        """
+        def fallar_unidad(conexion):
+            fila = conexion.execute(
+                "SELECT intentos FROM unidades WHERE id = ? AND estado = 'tomada' AND trabajador = ?",
+                (unidad_id, trabajador)
+            ).fetchone()
+            if fila is None:
+                return None
+            return self._liberar(conexion, unidad_id, fila["intentos"], str(error)[:500], time.time())
+
+        return self._escribir(fallar_unidad)
+
+    def _liberar(self, conexion, unidad_id, intentos, error, ahora):
+        if intentos >= MAXIMO_INTENTOS:
+            conexion.execute(
+                "UPDATE unidades SET estado = 'muerta', error = ?, trabajador = NULL, vence = NULL, "
+                "actualizada = ? WHERE id = ?",
+                (error, ahora, unidad_id)
+            )
+            return "muerta"
+
+        conexion.execute(
+            "UPDATE unidades SET estado = 'pendiente', error = ?, trabajador = NULL, vence = NULL, "
+            "disponible_desde = ?, actualizada = ? WHERE id = ?",
+            (error, ahora + ESPERA_REINTENTO * 2 ** (intentos - 1), ahora, unidad_id)
+        )
+        return "pendiente"
+
+    def _recuperar_vencidos(self, conexion, ahora):
+        vencidas = conexion.execute(
+            "SELECT id, intentos, trabajador FROM unidades WHERE estado = 'tomada' AND vence < ?",
+            (ahora,)
+        ).fetchall()
+        for fila in vencidas:
+            self._liberar(
+                conexion, fila["id"], fila["intentos"], f"Lease vencido ({fila['trabajador']})", ahora
+            )
+        return len(vencidas)
+
+    # ============================================
+    # COORDINADOR
+    # ============================================
+
+    def expandir(self, corrida_id, adelanto=PAGINAS_ADELANTO):
+        """
+        Encola las páginas siguientes de cada sección y corta las terminadas
+
+        - fin de una sección: la primera página hecha con 0 productos, o una
+          muerta después de la última con productos (como en el scraper
+          secuencial, donde un error también corta la sección)
+        - se encolan páginas hasta `adelanto` por delante de la última con
+          productos (sin pasar max_paginas ni el fin)
+        - las pendientes más allá del fin se cancelan
+
+        Returns:
+            int: Unidades nuevas encoladas
+        """
+        def expandir_secciones(conexion):
+            ahora = time.time()
+            self._recuperar_vencidos(conexion, ahora)
+
+            progreso = conexion.execute(
+                "SELECT s.tienda, s.seccion, s.max_paginas, s.fin, "
+                "MAX(CASE WHEN u.estado = 'hecha' AND u.productos > 0 THEN u.pagina END) AS ultima, "
+                "MIN(CASE WHEN u.estado = 'hecha' AND u.productos = 0 THEN u.pagina END) AS vacia, "
+                "MAX(CASE WHEN u.estado = 'muerta' THEN u.pagina END) AS muerta, "
+                "MAX(CASE WHEN u.estado != 'cancelada' THEN u.pagina END) AS encolada "
+                "FROM secciones s LEFT JOIN unidades u ON u.corrida_id = s.corrida_id "
+                "AND u.tienda = s.tienda AND u.seccion = s.seccion "
+                "WHERE s.corrida_id = ? GROUP BY s.tienda, s.seccion",
+                (corrida_id,)
+            ).fetchall()
+
+            nuevas = []
+            for fila in progreso:
+                fin = fila["fin"]
+                candidatos = [fila["vacia"]]
+                if fila["muerta"] is not None and fila["muerta"] > (fila["ultima"] or 0):
+                    # Una página muerta después de la última con productos corta la sección
+                    candidatos.append(fila["muerta"])
+                candidatos = [c for c in candidatos if c is not None]
+                if candidatos and (fin is None or min(candidatos) < fin):
+                    fin = min(candidatos)
+                    conexion.execute(
+                        "UPDATE secciones SET fin = ? WHERE corrida_id = ? AND tienda = ? AND seccion = ?",
+                        (fin, corrida_id, fila["tienda"], fila["seccion"])
+                    )
+                    conexion.execute(
+                        "UPDATE unidades SET estado = 'cancelada', actualizada = ? "
+                        "WHERE corrida_id = ? AND tienda = ? AND seccion = ? AND pagina > ? "
+                        "AND estado = 'pendiente'",
+                        (ahora, corrida_id, fila["tienda"], fila["seccion"], fin)
+                    )
+
+                hasta = (fila["ultima"] or 0) + adelanto
+                if fila["max_paginas"]:
+                    hasta = min(hasta, fila["max_paginas"])
+                if fin is not None:
+                    hasta = min(hasta, fin - 1)
+
+                for pagina in range((fila["encolada"] or 0) + 1, hasta + 1):
+                    nuevas.append((corrida_id, fila["tienda"], fila["seccion"], pagina, ahora))
+
+            # Una página cancelada vuelve a la cola si la sección resultó seguir
+            # (p. ej. después de reintentar_muertas)
+            conexion.executemany(
+                "INSERT INTO unidades (corrida_id, tienda, seccion, pagina, actualizada) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (corrida_id, tienda, seccion, pagina) "
+                "DO UPDATE SET estado = 'pendiente', intentos = 0, disponible_desde = 0, "
+                "actualizada = excluded.actualizada WHERE estado = 'cancelada'",
+                nuevas
+            )
+            return len(nuevas)
+
+        return self._escribir(expandir_secciones)
+
+    def resumen(self, corrida_id):
+        """
+        Returns:
+            dict: Unidades por estado, productos scrapeados y secciones terminadas
+        """
+        conexion = self.conexion()
+        estados = dict.fromkeys(ESTADOS, 0)
+        for fila in conexion.execute(
+            "SELECT estado, COUNT(*) AS cantidad FROM unidades WHERE corrida_id = ? GROUP BY estado",
+            (corrida_id,)
+        ):
+            estados[fila["estado"]] = fila["cantidad"]
+
+        productos = conexion.execute(
+            "SELECT COALESCE(SUM(productos), 0) FROM unidades WHERE corrida_id = ? AND estado = 'hecha'",
+            (corrida_id,)
+        ).fetchone()[0]
+        secciones = conexion.execute(
+            "SELECT COUNT(*), COUNT(fin) FROM secciones WHERE corrida_id = ?", (corrida_id,)
+        ).fetchone()
+
+        return {
+            "corrida_id": corrida_id,
+            "unidades": estados,
+            "productos": productos,
+            "secciones": secciones[0],
+            "secciones_terminadas": secciones[1],
+            "terminada": estados["pendiente"] == 0 and estados["tomada"] == 0,
+        }
+
+    # ============================================
+    # DEAD-LETTER
+    # ============================================
+
+    def muertas(self, corrida_id):
+        return [
+            dict(fila) for fila in self.conexion().execute(
+                "SELECT id, tienda, seccion, pagina, intentos, error, actualizada FROM unidades "
+                "WHERE corrida_id = ? AND estado = 'muerta' ORDER BY tienda, seccion, pagina",
+                (corrida_id,)
+            )
+        ]
+
+    def reintentar_muertas(self, corrida_id):
+        """
+        Devuelve las unidades muertas a la cola con los intentos en cero
+        (y reabre la corrida si ya estaba terminada)
+
+        Returns:
+            int: Unidades reencoladas
+        """
+        def reintentar(conexion):
+            cantidad = conexion.execute(
+                "UPDATE unidades SET estado = 'pendiente', intentos = 0, disponible_desde = 0, "
+                "actualizada = ? WHERE corrida_id = ? AND estado = 'muerta'",
+                (time.time(), corrida_id)
+            ).rowcount
+            if cantidad:
+                conexion.execute("UPDATE corridas SET terminada = NULL WHERE id = ?", (corrida_id,))
+                conexion.execute(
+                    "UPDATE secciones SET fin = NULL WHERE corrida_id = ? AND fin IN ("
+                    "SELECT pagina FROM unidades WHERE corrida_id = ? AND tienda = secciones.tienda "
+                    "AND seccion = secciones.seccion AND estado = 'pendiente')",
+                    (corrida_id, corrida_id)
+                )
+            return cantidad
+
+        return self._escribir(reintentar)
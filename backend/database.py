@@ -1,42 +1,100 @@
+"""
+Conexión y almacenamiento para CuidaElMango
+
+Nada se conecta al importar: los clientes se crean al primer uso y se reutilizan
+(cada cliente mantiene su pool de conexiones HTTP).
+
+Almacenamiento según CUIDAELMANGO_STORAGE:
+- supabase (default): lecturas y escrituras a Supabase
+- replica: lecturas desde SQLite local sincronizado, escrituras a Supabase
+- sqlite: solo la base SQLite local (sin Supabase, para pruebas offline)
+- memoria: todo en memoria (tests y benchmarks)
+"""
+
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
-import sys
+from functools import lru_cache
+
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+STORAGES = ("supabase", "replica", "sqlite", "memoria")
 
-# Cargar .env
-env_path = os.path.join(os.path.dirname(__file__), '.env')
-load_dotenv(env_path)
 
-print(f"📁 Cargando .env desde: {env_path}")
+@lru_cache(maxsize=None)
+def cargar_env():
+    """Carga el .env una sola vez (si python-dotenv está instalado)"""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return False
+    return load_dotenv(ENV_PATH)
+
 
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_KEY")
-SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY")
+def get_variable(nombre, default=None):
+    cargar_env()
+    return os.environ.get(nombre, default)
 
-print(f"✅ SUPABASE_URL: {SUPABASE_URL[:30]}...")
-print(f"✅ SERVICE_KEY cargada: {SUPABASE_SERVICE_KEY is not None}")
-print(f"✅ ANON_KEY cargada: {SUPABASE_ANON_KEY is not None}")
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY or not SUPABASE_ANON_KEY:
-    print("❌ ERROR: Faltan variables de entorno")
-    sys.exit(1)
+def _requerida(nombre):
+    valor = get_variable(nombre)
+    if not valor:
+        raise RuntimeError(f"Falta la variable de entorno {nombre} (ver {ENV_PATH})")
+    return valor
 
-# Cliente admin (service_role)
-try:
-    supabase_admin: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    print("✅ Cliente admin creado correctamente")
-except Exception as e:
-    print(f"❌ Error creando cliente admin: {e}")
-    sys.exit(1)
 
+@lru_cache(maxsize=None)
 def get_supabase_admin():
     """Cliente admin para scrapers (bypasea RLS)"""
-    return supabase_admin
+    from supabase import create_client
+    return create_client(_requerida("SUPABASE_URL"), _requerida("SUPABASE_SERVICE_KEY"))
+
 
+@lru_cache(maxsize=None)
 def get_supabase_anon():
     """Cliente público (respeta RLS)"""
-    try:
-        return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-    except Exception as e:
-        print(f"❌ Error creando cliente anon: {e}")
-        raise
\ No newline at end of file
+    from supabase import create_client
+    return create_client(_requerida("SUPABASE_URL"), _requerida("SUPABASE_ANON_KEY"))
+
+
+def get_ruta_replica():
+    from catalogo import DATA_DIR
+    return get_variable("CUIDAELMANGO_REPLICA") or os.path.join(DATA_DIR, "replica.sqlite")
+
+
+def get_storage():
+    """
+    Almacenamiento configurado
+
+    Por compatibilidad, si solo está CUIDAELMANGO_REPLICA se usa "replica".
+    """
+    storage = get_variable("CUIDAELMANGO_STORAGE")
+    if not storage:
+        storage = "replica" if get_variable("CUIDAELMANGO_REPLICA") else "supabase"
+
+    if storage not in STORAGES:
+        raise RuntimeError(f"CUIDAELMANGO_STORAGE inválido: {storage} (opciones: {', '.join(STORAGES)})")
+    return storage
+
+
+@lru_cache(maxsize=None)
+def get_repositorio():
+    """
+    Repositorio del catálogo según la configuración (uno por proceso)
+    """
+    from repositorio import RepositorioSupabase, RepositorioReplica, RepositorioMemoria
+
+    storage = get_storage()
+
+    if storage == "memoria":
+        return RepositorioMemoria()
+
+    if storage == "supabase":
+        return RepositorioSupabase(get_supabase_admin)
+
+    from replica import ReplicaCatalogo
+    replica = ReplicaCatalogo(get_ruta_replica())
+
+    if storage == "sqlite":
+        return RepositorioReplica(replica, escritor=None)
+
+    return RepositorioReplica(replica, RepositorioSupabase(get_supabase_admin))
@@ -0,0 +1,444 @@
+"""
+Matching incremental para CuidaElMango
+
+Después de un scrape re-puntúa solo los productos nuevos o cuyos atributos de
+matching cambiaron, contra su vecindario de bloqueo en las otras tiendas (las
+mismas estrategias que usa la API para buscar candidatos), y actualiza las
+equivalencias automáticas. El costo depende de cuántos productos cambiaron,
+no del tamaño del catálogo.
+
+- Firma de matching: hash de las columnas que usa calcular_match_score (marca,
+  categoría, peso, variante, nombre). Un cambio de precio o promo no cambia la
+  firma, así que no re-puntúa nada. La firma se guarda recién después de
+  emparejar: si algo falla, el producto se vuelve a procesar en la corrida
+  siguiente
+- Correcciones del usuario: nunca se pisan. Si el producto ya tiene una
+  corrección hacia una tienda, esa tienda no se re-puntúa; un candidato que el
+  usuario ya emparejó con otro producto de la tienda de origen se saltea
+- Pares automáticos: el mejor candidato por tienda se guarda si llega a
+  UMBRAL_CONFIRMADA; los pares automáticos que ya tenía el producto se
+  re-puntúan también, así uno que dejó de coincidir baja de confianza en vez
+  de quedar viejo
+- Clusters: los enlaces fuertes nuevos se unen en el momento; separar un
+  cluster por un enlace que se debilitó queda para el job completo
+  (python clusters.py)
+
+Uso (CLI):
+    python emparejamiento.py --desde 2026-10-01T00:00:00   # productos actualizados desde
+    python emparejamiento.py --ids 12,15,99                 # productos puntuales (aunque no cambie la firma)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from catalogo import DIR_COMPARTIDO, WAL_COMPARTIDO
+from clusters import es_enlace_fuerte
+from equivalencias import UMBRAL_CONFIRMADA
+from matching import encontrar_mejores_matches, calcular_match_score
+from utils import normalizar_texto
+
+
+RUTA_FIRMAS = os.path.join(DIR_COMPARTIDO, "firmas_matching.sqlite")
+
+# Tiendas que se comparan y entre las que se empareja (agregar acá cuando haya un scraper nuevo)
+TIENDAS = ["Carrefour", "Disco"]
+
+# Columnas que usan el bloqueo y el scoring
+COLUMNAS_EMPAREJAMIENTO = (
+    "id,nombre,tienda,marca,peso,peso_unidad,categoria,variante,cluster_id,"
+    "nombre_limpio,peso_base,unidad_familia,marca_id,variante_id,firma_nombre"
+)
+
+# Columnas que entran en la firma (si no cambian, el score contra cualquier candidato tampoco)
+COLUMNAS_FIRMA = ("tienda", "categoria", "marca", "peso", "marca_id", "peso_base",
+                  "unidad_familia", "variante_id", "firma_nombre")
+
+# Candidatos por tienda (como buscar_candidatos en la API)
+CANDIDATOS_POR_TIENDA = 10
+
+# Productos por tanda al leer y guardar
+TANDA = 500
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS firmas (
+    producto_id INTEGER PRIMARY KEY,
+    firma TEXT NOT NULL,
+    emparejado TEXT NOT NULL
+);
+"""
+
+
+def firma_matching(producto):
+    """
+    Hash de los atributos que deciden el matching de un producto
+
+    Args:
+        producto (dict): Fila de productos (o los datos que guarda el scraper)
+
+    Returns:
+        str: Firma hexadecimal
+    """
+    valores = "\x1f".join(_valor_firma(producto.get(columna)) for columna in COLUMNAS_FIRMA)
+    return hashlib.blake2b(valores.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _valor_firma(valor):
+    # 1500 y 1500.0 son el mismo peso según de dónde venga la fila
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return repr(float(valor))
+    return str(valor)
+
+
+def buscar_vecindario(repositorio, producto, tienda, columnas, limit=CANDIDATOS_POR_TIENDA):
+    """
+    Vecindario de bloqueo de un producto en una tienda
+
+    Estrategia (la primera que devuelve algo):
+    1. Marca + categoría + peso similar (±30%)
+    2. Marca + categoría
+    3. Solo marca
+    4. Categoría + palabra clave del nombre
+
+    Args:
+        producto (dict): Con nombre, marca, categoria y peso
+
+    Returns:
+        list: Candidatos de la tienda
+    """
+    marca = producto.get("marca")
+    categoria = producto.get("categoria")
+    peso = producto.get("peso")
+
+    def filtrar(**filtros):
+        return repositorio.filtrar_productos(columnas, tienda=tienda, limit=limit, **filtros)
+
+    candidatos = []
+    if marca and categoria and peso:
+        candidatos = filtrar(marca=marca, categoria=categoria, peso_min=peso * 0.7, peso_max=peso * 1.3)
+
+    if not candidatos and marca and categoria:
+        candidatos = filtrar(marca=marca, categoria=categoria)
+
+    if not candidatos and marca:
+        candidatos = filtrar(marca=marca)
+
+    if not candidatos and categoria:
+        palabras = normalizar_texto(producto.get("nombre")).split()
+        palabra_clave = next((p for p in palabras if len(p) > 4), palabras[0] if palabras else "")
+        if palabra_clave:
+            candidatos = filtrar(categoria=categoria, nombre_contiene=palabra_clave)
+
+    return candidatos
+
+
+class EmparejadorIncremental:
+    """
+    Mantiene las equivalencias automáticas a partir de los productos que cambiaron
+
+    Las firmas viven en un SQLite en DIR_COMPARTIDO; una conexión por thread.
+    """
+
+    def __init__(self, ruta=RUTA_FIRMAS, tiendas=None, wal=WAL_COMPARTIDO):
+        self.ruta = ruta
+        self.wal = wal
+        self.tiendas = list(tiendas or TIENDAS)
+        self._local = threading.local()
+        self._esquema_creado = False
+        self._lock = threading.Lock()
+
+    def _crear_esquema(self):
+        with self._lock:
+            if self._esquema_creado:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            with sqlite3.connect(self.ruta) as conexion:
+                conexion.executescript(ESQUEMA)
+            self._esquema_creado = True
+
+    def conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            if not self._esquema_creado:
+                self._crear_esquema()
+            conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+            conexion.execute(f"PRAGMA journal_mode={'WAL' if self.wal else 'DELETE'}")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    # ============================================
+    # FIRMAS
+    # ============================================
+
+    def _firmas_guardadas(self, ids):
+        firmas = {}
+        ids = list(ids)
+        for desde in range(0, len(ids), TANDA):
+            tanda = ids[desde:desde + TANDA]
+            firmas.update(self.conexion().execute(
+                f"SELECT producto_id, firma FROM firmas WHERE producto_id IN ({','.join('?' * len(tanda))})",
+                tanda
+            ).fetchall())
+        return firmas
+
+    def cambio(self, producto_id, producto):
+        """
+        Si el producto es nuevo o cambió algo que afecta el matching
+
+        Args:
+            producto (dict): Datos del producto (con las features de matching)
+        """
+        return self._firmas_guardadas([producto_id]).get(producto_id) != firma_matching(producto)
+
+    def pendientes(self, productos):
+        """
+        Returns:
+            list: Ids de los productos (filas con id) cuya firma cambió
+        """
+        guardadas = self._firmas_guardadas(producto["id"] for producto in productos)
+        return [
+            producto["id"] for producto in productos
+            if guardadas.get(producto["id"]) != firma_matching(producto)
+        ]
+
+    def _guardar_firmas(self, productos):
+        ahora = datetime.now().isoformat(timespec="seconds")
+        conexion = self.conexion()
+        with conexion:
+            conexion.executemany(
+                "INSERT INTO firmas VALUES (?, ?, ?) ON CONFLICT (producto_id) DO UPDATE SET "
+                "firma = excluded.firma, emparejado = excluded.emparejado",
+                [(producto["id"], firma_matching(producto), ahora) for producto in productos]
+            )
+
+    # ============================================
+    # EMPAREJAMIENTO
+    # ============================================
+
+    def emparejar(self, repositorio, ids):
+        """
+        Re-puntúa los productos dados contra su vecindario en las otras tiendas
+
+        Args:
+            repositorio (RepositorioCatalogo): Catálogo (lecturas y escritura de equivalencias)
+            ids (iterable): Productos nuevos o cambiados
+
+        Returns:
+            dict: productos, comparaciones, nuevas, actualizadas, sin_cambios,
+                  correcciones_respetadas, clusters
+        """
+        resumen = {
+            "productos": 0, "comparaciones": 0, "nuevas": 0, "actualizadas": 0,
+            "sin_cambios": 0, "correcciones_respetadas": 0, "clusters": 0,
+        }
+        ids = sorted(set(ids))
+        for desde in range(0, len(ids), TANDA):
+            self._emparejar_tanda(repositorio, ids[desde:desde + TANDA], resumen)
+        return resumen
+
+    def _emparejar_tanda(self, repositorio, ids, resumen):
+        productos = {fila["id"]: fila for fila in repositorio.obtener_productos(ids, COLUMNAS_EMPAREJAMIENTO)}
+        if not productos:
+            return
+
+        # Pares que ya tienen los productos (en cualquier dirección)
+        filas_pares = repositorio.equivalencias_de(list(productos))
+        existentes = _indexar_pares(filas_pares)
+        vecinos_ids = {otro for producto_id in productos for otro in existentes.get(producto_id, {})}
+
+        # Vecindarios de bloqueo por tienda
+        vecindarios = {}
+        for producto_id, producto in productos.items():
+            for tienda in self.tiendas:
+                if tienda == producto["tienda"]:
+                    continue
+                candidatos = buscar_vecindario(repositorio, producto, tienda, COLUMNAS_EMPAREJAMIENTO)
+                vecindarios[(producto_id, tienda)] = candidatos
+                vecinos_ids.update(candidato["id"] for candidato in candidatos)
+
+        # Filas y pares de todos los vecinos (para saber su tienda y sus correcciones)
+        faltantes = [i for i in vecinos_ids if i not in productos]
+        filas = dict(productos)
+        filas.update({fila["id"]: fila for fila in repositorio.obtener_productos(faltantes, COLUMNAS_EMPAREJAMIENTO)})
+        filas_vecinos = repositorio.equivalencias_de(faltantes)
+        existentes.update({
+            producto_id: pares
+            for producto_id, pares in _indexar_pares(filas_vecinos).items()
+            if producto_id not in productos
+        })
+
+        # Un par ya guardado se actualiza en la dirección en que está (no se duplica invertido)
+        orientacion = {
+            _clave(fila["producto_a_id"], fila["producto_b_id"]): (fila["producto_a_id"], fila["producto_b_id"])
+            for fila in filas_pares + filas_vecinos
+        }
+
+        guardar = {}
+        for producto_id, producto in productos.items():
+            pares = existentes.get(producto_id, {})
+            corregidas = {
+                filas[otro]["tienda"] for otro, (_, corregido) in pares.items()
+                if corregido and otro in filas
+            }
+
+            for tienda in self.tiendas:
+                if tienda == producto["tienda"]:
+                    continue
+                if tienda in corregidas:
+                    resumen["correcciones_respetadas"] += 1
+                    continue
+
+                # El usuario ya eligió el equivalente de este candidato en la tienda de origen
+                candidatos = [
+                    candidato for candidato in vecindarios[(producto_id, tienda)]
+                    if not any(
+                        corregido and filas.get(otro, {}).get("tienda") == producto["tienda"]
+                        for otro, (_, corregido) in existentes.get(candidato["id"], {}).items()
+                    )
+                ]
+                resumen["comparaciones"] += len(candidatos)
+                matches = encontrar_mejores_matches(producto, candidatos, top_n=1)
+                mejor = matches[0] if matches else None
+                if mejor and mejor["match_score"] >= UMBRAL_CONFIRMADA:
+                    guardar[_clave(producto_id, mejor["id"])] = mejor["match_score"]
+
+                # Los automáticos que ya tenía hacia esta tienda se re-puntúan
+                for otro, (_, corregido) in pares.items():
+                    fila = filas.get(otro)
+                    if corregido or fila is None or fila["tienda"] != tienda:
+                        continue
+                    clave = _clave(producto_id, otro)
+                    if clave not in guardar:
+                        resumen["comparaciones"] += 1
+                        guardar[clave] = calcular_match_score(producto, fila)["score"]
+
+        cambios = []
+        for clave, confianza in guardar.items():
+            a, b = orientacion.get(clave, clave)
+            anterior = existentes.get(a, {}).get(b)
+            if anterior is None:
+                resumen["nuevas"] += 1
+            elif anterior[0] == confianza:
+                resumen["sin_cambios"] += 1
+                continue
+            else:
+                resumen["actualizadas"] += 1
+            cambios.append({
+                "producto_a_id": a,
+                "producto_b_id": b,
+                "confianza": confianza,
+                "corregido_por_usuario": False,
+            })
+
+        if cambios:
+            repositorio.guardar_equivalencias(cambios)
+            resumen["clusters"] += self._unir_clusters(repositorio, cambios, filas, existentes)
+
+        self._guardar_firmas(productos.values())
+        resumen["productos"] += len(productos)
+
+    def _unir_clusters(self, repositorio, cambios, filas, existentes):
+        """
+        Une los clusters de los enlaces que pasaron a ser fuertes
+
+        El cluster_id es el menor id del grupo (ver clusters.py); un producto sin
+        cluster es un grupo de uno con su propio id.
+
+        Returns:
+            int: Productos que cambiaron de cluster
+        """
+        asignados = {}
+
+        def cluster_de(producto_id):
+            if producto_id in asignados:
+                return asignados[producto_id]
+            return filas.get(producto_id, {}).get("cluster_id") or producto_id
+
+        def miembros(cluster_id):
+            grupo = {fila["id"] for fila in repositorio.productos_del_cluster(cluster_id, "id")}
+            grupo.add(cluster_id)
+            # Sin los que esta misma tanda ya movió a otro cluster, con los que movió a este
+            grupo = {i for i in grupo if asignados.get(i, cluster_id) == cluster_id}
+            return grupo | {i for i, cluster in asignados.items() if cluster == cluster_id}
+
+        for fila in cambios:
+            a, b = fila["producto_a_id"], fila["producto_b_id"]
+            anterior = existentes.get(a, {}).get(b)
+            if not es_enlace_fuerte(fila["confianza"], False) or (anterior and es_enlace_fuerte(*anterior)):
+                continue
+
+            cluster_a, cluster_b = cluster_de(a), cluster_de(b)
+            if cluster_a == cluster_b:
+                continue
+            raiz, absorbido = min(cluster_a, cluster_b), max(cluster_a, cluster_b)
+            for producto_id in miembros(absorbido) | {raiz}:
+                asignados[producto_id] = raiz
+
+        cambios_cluster = {
+            producto_id: cluster for producto_id, cluster in asignados.items()
+            if filas.get(producto_id, {}).get("cluster_id") != cluster
+        }
+        if cambios_cluster:
+            repositorio.asignar_clusters(cambios_cluster)
+        return len(cambios_cluster)
+
+
+def _clave(producto_a_id, producto_b_id):
+    return (min(producto_a_id, producto_b_id), max(producto_a_id, producto_b_id))
+
+
+def _indexar_pares(filas):
+    """
+    Returns:
+        dict: producto_id -> {otro_id: (confianza, corregido)}; cada par en las dos direcciones
+    """
+    pares = {}
+    for fila in filas:
+        valor = (fila.get("confianza") or 0, bool(fila.get("corregido_por_usuario")))
+        a, b = fila["producto_a_id"], fila["producto_b_id"]
+        # Una corrección del usuario le gana a un par automático en la otra dirección
+        for origen, destino in ((a, b), (b, a)):
+            actual = pares.setdefault(origen, {}).get(destino)
+            if actual is None or (valor[1] and not actual[1]):
+                pares[origen][destino] = valor
+    return pares
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from database import get_repositorio
+    from repositorio import PAGINA_CATALOGO
+
+    parser = argparse.ArgumentParser(description="Re-puntuar las equivalencias de los productos que cambiaron")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--desde", help="Productos actualizados desde (ISO 8601); solo los que cambiaron de firma")
+    grupo.add_argument("--ids", help="Ids separados por coma (se re-puntúan aunque la firma no cambie)")
+    args = parser.parse_args()
+
+    repositorio = get_repositorio()
+    emparejador = EmparejadorIncremental()
+    inicio = time.perf_counter()
+
+    if args.ids:
+        ids = [int(i) for i in args.ids.split(",") if i.strip()]
+    else:
+        ids, despues_de = [], 0
+        columnas = "id," + ",".join(COLUMNAS_FIRMA)
+        while True:
+            pagina = repositorio.pagina_productos(columnas, despues_de, actualizados_desde=args.desde)
+            ids.extend(emparejador.pendientes(pagina))
+            if len(pagina) < PAGINA_CATALOGO:
+                break
+            despues_de = pagina[-1]["id"]
+
+    print(f"🔗 {len(ids)} productos para re-emparejar")
+    resumen = emparejador.emparejar(repositorio, ids)
+    print(f"✅ {resumen['nuevas']} equivalencias nuevas, {resumen['actualizadas']} actualizadas, "
+          f"{resumen['correcciones_respetadas']} tiendas con corrección del usuario, "
+          f"{resumen['clusters']} productos cambiaron de cluster "
+          f"({resumen['comparaciones']} comparaciones en {time.perf_counter() - inicio:.1f}s)")
@@ -0,0 +1,112 @@
+"""
+Mapa de equivalencias en memoria para CuidaElMango
+Índice bidireccional de los pares guardados en la tabla equivalencias
+"""
+
+
+# Confianza mínima para usar un par automático sin volver a calcular el matching
+UMBRAL_CONFIRMADA = 80
+
+
+class MapaEquivalencias:
+    """
+    producto_id -> {otro_producto_id: (confianza, corregido_por_usuario)}
+
+    Cada par se guarda en las dos direcciones, así una sola lectura de
+    diccionario reemplaza las dos consultas por producto_a_id / producto_b_id.
+    """
+
+    def __init__(self):
+        self._vecinos = {}
+        self.version = None
+
+    def __len__(self):
+        return len(self._vecinos)
+
+    def cargar(self, filas, version=None):
+        """
+        Reemplaza el mapa con las filas de la tabla equivalencias
+
+        Args:
+            filas (list): Dicts con producto_a_id, producto_b_id, confianza, corregido_por_usuario
+            version (str): Versión del catálogo con la que se cargó
+        """
+        self._vecinos = {}
+        for fila in filas:
+            self.agregar(
+                fila['producto_a_id'],
+                fila['producto_b_id'],
+                fila.get('confianza') or 0,
+                bool(fila.get('corregido_por_usuario'))
+            )
+        self.version = version
+
+    def agregar(self, producto_a_id, producto_b_id, confianza=100, corregido=False):
+        """
+        Agrega (o actualiza) un par en ambas direcciones
+
+        Una corrección del usuario siempre le gana a un par automático.
+        """
+        for origen, destino in ((producto_a_id, producto_b_id), (producto_b_id, producto_a_id)):
+            vecinos = self._vecinos.setdefault(origen, {})
+            anterior = vecinos.get(destino)
+            if anterior and anterior[1] and not corregido:
+                continue
+            vecinos[destino] = (confianza, corregido)
+
+    def quitar(self, producto_a_id, producto_b_id):
+        """Saca un par (en ambas direcciones)"""
+        for origen, destino in ((producto_a_id, producto_b_id), (producto_b_id, producto_a_id)):
+            vecinos = self._vecinos.get(origen)
+            if vecinos is not None:
+                vecinos.pop(destino, None)
+                if not vecinos:
+                    del self._vecinos[origen]
+
+    def correcciones_reemplazadas(self, producto_a_id, producto_b_id, tienda_de):
+        """
+        Correcciones anteriores que deja sin efecto corregir a <-> b
+
+        Un producto tiene a lo sumo una corrección por tienda: la nueva de a
+        hacia la tienda de b reemplaza a las anteriores de a hacia esa tienda
+        (y lo mismo para b). Si quedaran las dos, confirmados() no tiene cómo
+        saber cuál es la última.
+
+        Args:
+            tienda_de (dict): producto_id -> tienda de a, b y sus vecinos
+
+        Returns:
+            list: Pares (origen, otro) a borrar
+        """
+        reemplazadas = []
+        for origen, destino in ((producto_a_id, producto_b_id), (producto_b_id, producto_a_id)):
+            tienda = tienda_de.get(destino)
+            if tienda is None:
+                continue
+            for otro_id, (_, corregido) in self.vecinos(origen).items():
+                if corregido and otro_id != destino and tienda_de.get(otro_id) == tienda:
+                    reemplazadas.append((origen, otro_id))
+        return reemplazadas
+
+    def vecinos(self, producto_id):
+        """
+        Returns:
+            dict: {otro_producto_id: (confianza, corregido_por_usuario)}
+        """
+        return self._vecinos.get(producto_id, {})
+
+    def confirmados(self, producto_id):
+        """
+        Equivalentes que se pueden usar sin recalcular el matching
+
+        Returns:
+            list: Tuplas (otro_id, confianza, corregido), primero las correcciones
+                  del usuario y después por confianza descendente
+        """
+        confirmados = [
+            (otro_id, confianza, corregido)
+            for otro_id, (confianza, corregido) in self.vecinos(producto_id).items()
+            if corregido or confianza >= UMBRAL_CONFIRMADA
+        ]
+        confirmados.sort(key=lambda x: (x[2], x[1]), reverse=True)
+        return confirmados
@@ -0,0 +1,341 @@
+"""
+Exportación masiva del catálogo para CuidaElMango
+
+Recorre el catálogo por keyset (id > último id, de a PAGINA_EXPORTACION filas)
+y lo emite como NDJSON o CSV, opcionalmente en gzip, sin juntar nunca más de
+una página en memoria.
+
+- Cursor: token opaco con los filtros y el último id entregado. Con el cursor
+  solo se retoma exactamente la misma exportación desde donde quedó
+- Bloques: con `limite` primero se busca el id en el que termina el bloque
+  (fin_bloque, solo ids) y después se emiten exactamente las filas hasta ese
+  id, que es también el del cursor siguiente (header X-Export-Siguiente en la
+  API): aunque el catálogo cambie entre las dos lecturas, lo que no entra en
+  un bloque entra en el siguiente
+- En gzip cada bloque es un miembro gzip completo: concatenarlos da un
+  archivo .gz válido, así una descarga cortada se retoma agregando al final
+
+Uso (CLI):
+    python exportacion.py catalogo.ndjson.gz                         # desde el repositorio local
+    python exportacion.py catalogo.csv.gz --url http://localhost:8000 --tienda Disco
+    python exportacion.py cambios.ndjson.gz --desde 2026-10-01T00:00:00   # solo actualizados
+Si se corta, el mismo comando retoma desde el último bloque completo
+(archivo.cursor al lado de la salida).
+"""
+
+import base64
+import csv
+import io
+import json
+import os
+import zlib
+
+from replica import COLUMNAS_REPLICA
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa json de la librería estándar
+    orjson = None
+
+
+# Columnas exportadas si no se piden otras (sin las features internas de matching)
+COLUMNAS_EXPORTACION = (
+    "id,nombre,tienda,categoria,marca,peso,peso_unidad,cantidad_unidades,variante,"
+    "precio,promo,promo_tipo,precio_efectivo,url,imagen_url,ultima_actualizacion"
+)
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Filas por consulta al repositorio
+PAGINA_EXPORTACION = 2000
+
+# Bytes que se juntan antes de emitir un chunk
+TAMANO_CHUNK = 64 * 1024
+
+# Compresión rápida: en exportaciones grandes el cuello es el gzip, no la red
+NIVEL_GZIP = 3
+
+# Filas por bloque en la CLI (cada bloque completo es un punto de reanudación)
+BLOQUE_CLI = 50000
+
+VERSION_CURSOR = 1
+
+
+# ============================================
+# CURSORES
+# ============================================
+
+def filtros_exportacion(tienda=None, categoria=None, desde=None, columnas=None):
+    """
+    Filtros normalizados de una exportación
+
+    Raises:
+        ValueError: Si se piden columnas que no existen (o no se incluye id)
+    """
+    columnas = ",".join(c.strip() for c in (columnas or COLUMNAS_EXPORTACION).split(","))
+    lista = columnas.split(",")
+    desconocidas = [c for c in lista if c not in COLUMNAS_REPLICA]
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas: {desconocidas}")
+    if "id" not in lista:
+        raise ValueError("Las columnas tienen que incluir id (es la clave del cursor)")
+
+    return {"tienda": tienda, "categoria": categoria, "desde": desde, "columnas": columnas}
+
+
+def crear_cursor(filtros, despues_de):
+    """Token para seguir la exportación después del producto `despues_de`"""
+    contenido = json.dumps(
+        {"v": VERSION_CURSOR, "id": despues_de, **filtros}, separators=(",", ":")
+    ).encode("utf-8")
+    return base64.urlsafe_b64encode(contenido).decode("ascii").rstrip("=")
+
+
+def leer_cursor(token):
+    """
+    Returns:
+        tuple: (filtros, despues_de)
+
+    Raises:
+        ValueError: Si el token no es un cursor válido
+    """
+    try:
+        contenido = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if contenido.pop("v") != VERSION_CURSOR:
+            raise ValueError
+        despues_de = int(contenido.pop("id"))
+        filtros = filtros_exportacion(**contenido)
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Cursor inválido: {e}" if str(e) else "Cursor inválido")
+    return filtros, despues_de
+
+
+# ============================================
+# RECORRIDO Y FORMATOS
+# ============================================
+
+def recorrer_productos(repositorio, filtros, despues_de=0, limite=None, columnas=None, hasta_id=None):
+    """
+    Productos de la exportación en orden de id, de a una página por consulta
+
+    Args:
+        columnas (str): Columnas a leer (default: las de los filtros)
+        limite (int): Máximo de filas (None = hasta el final)
+        hasta_id (int): Último id a entregar, inclusive (None = hasta el final)
+    """
+    entregadas = 0
+    while limite is None or entregadas < limite:
+        pagina = PAGINA_EXPORTACION if limite is None else min(PAGINA_EXPORTACION, limite - entregadas)
+        filas = repositorio.pagina_productos(
+            columnas or filtros["columnas"], despues_de, pagina,
+            tienda=filtros["tienda"], categoria=filtros["categoria"],
+            actualizados_desde=filtros["desde"]
+        )
+        for fila in filas:
+            if hasta_id is not None and fila["id"] > hasta_id:
+                return
+            yield fila
+
+        entregadas += len(filas)
+        if len(filas) < pagina:
+            return
+        despues_de = filas[-1]["id"]
+
+
+def fin_bloque(repositorio, filtros, despues_de, limite):
+    """
+    Id en el que termina un bloque de `limite` filas (None si el bloque llega al final)
+
+    Recorre solo los ids del bloque, sin leer el resto de las columnas. El
+    bloque se emite con hasta_id=este id y el cursor siguiente arranca
+    después de él, así las dos lecturas no pueden quedar desfasadas.
+    """
+    ultimo = None
+    cantidad = 0
+    for fila in recorrer_productos(repositorio, filtros, despues_de, limite, columnas="id"):
+        ultimo = fila["id"]
+        cantidad += 1
+    if cantidad < limite:
+        return None
+    return ultimo
+
+
+def _linea_ndjson(fila):
+    if orjson is not None:
+        return orjson.dumps(fila) + b"\n"
+    return json.dumps(fila, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+
+
+def generar_exportacion(repositorio, filtros, despues_de=0, formato="ndjson", comprimir=True, hasta_id=None):
+    """
+    Bytes de la exportación, en chunks de ~TAMANO_CHUNK
+
+    Emite los productos con despues_de < id <= hasta_id (sin hasta_id, hasta el
+    final). El CSV lleva encabezado solo en el primer bloque (sin cursor), así
+    los bloques de una exportación se pueden concatenar.
+    """
+    compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31) if comprimir else None
+    columnas = filtros["columnas"].split(",")
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    lineas = []
+    tamano = 0
+
+    def vaciar():
+        if formato == "csv":
+            datos = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            datos = b"".join(lineas)
+            lineas.clear()
+        return compresor.compress(datos) if compresor else datos
+
+    if formato == "csv" and despues_de == 0:
+        escritor.writerow(columnas)
+
+    for fila in recorrer_productos(repositorio, filtros, despues_de, hasta_id=hasta_id):
+        if formato == "csv":
+            escritor.writerow([fila.get(columna) for columna in columnas])
+            tamano = buffer.tell()
+        else:
+            linea = _linea_ndjson(fila)
+            lineas.append(linea)
+            tamano += len(linea)
+
+        if tamano >= TAMANO_CHUNK:
+            tamano = 0
+            datos = vaciar()
+            if datos:
+                yield datos
+
+    datos = vaciar()
+    if compresor:
+        datos += compresor.flush()
+    if datos:
+        yield datos
+
+
+def nombre_archivo(formato, comprimir):
+    return f"catalogo.{formato}" + (".gz" if comprimir else "")
+
+
+# ============================================
+# CLI
+# ============================================
+
+def _bloque_local(repositorio, formato, comprimir, limite):
+    def descargar(cursor, filtros):
+        filtros, despues_de = leer_cursor(cursor) if cursor else (filtros, 0)
+        hasta_id = fin_bloque(repositorio, filtros, despues_de, limite)
+        siguiente = crear_cursor(filtros, hasta_id) if hasta_id is not None else None
+        return generar_exportacion(repositorio, filtros, despues_de, formato, comprimir, hasta_id), siguiente
+    return descargar
+
+
+def _bloque_remoto(cliente, url, formato, comprimir, limite):
+    def descargar(cursor, filtros):
+        parametros = {"formato": formato, "comprimir": str(comprimir).lower(), "limite": limite}
+        if cursor:
+            parametros["cursor"] = cursor
+        else:
+            parametros.update({clave: valor for clave, valor in filtros.items() if valor})
+
+        respuesta = cliente.send(
+            cliente.build_request("GET", f"{url.rstrip('/')}/productos/export", params=parametros),
+            stream=True
+        )
+        if respuesta.is_error:
+            respuesta.read()
+            respuesta.close()
+            respuesta.raise_for_status()
+
+        def chunks():
+            try:
+                yield from respuesta.iter_raw()
+            finally:
+                respuesta.close()
+
+        return chunks(), respuesta.headers.get("X-Export-Siguiente")
+    return descargar
+
+
+def exportar_a_archivo(descargar, ruta, filtros):
+    """
+    Descarga bloque por bloque a `ruta`, guardando el cursor después de cada uno
+
+    Si existe ruta.cursor se retoma: el archivo se recorta al último bloque
+    completo y se sigue desde su cursor.
+
+    Returns:
+        int: Bytes escritos en total
+    """
+    ruta_cursor = ruta + ".cursor"
+    cursor, escritos = None, 0
+
+    if os.path.exists(ruta_cursor):
+        with open(ruta_cursor, encoding="utf-8") as archivo:
+            estado = json.load(archivo)
+        cursor, escritos = estado["cursor"], estado["bytes"]
+        print(f"⏯️  Retomando {ruta} desde el byte {escritos}")
+
+    with open(ruta, "r+b" if escritos else "wb") as salida:
+        salida.truncate(escritos)
+        salida.seek(escritos)
+
+        while True:
+            chunks, siguiente = descargar(cursor, filtros)
+            for chunk in chunks:
+                salida.write(chunk)
+                escritos += len(chunk)
+            salida.flush()
+
+            if siguiente is None:
+                break
+            cursor = siguiente
+            with open(ruta_cursor, "w", encoding="utf-8") as archivo:
+                json.dump({"cursor": cursor, "bytes": escritos}, archivo)
+            print(f"   {escritos / 1e6:.1f} MB")
+
+    if os.path.exists(ruta_cursor):
+        os.remove(ruta_cursor)
+    return escritos
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Exportar el catálogo completo (NDJSON/CSV, gzip, reanudable)")
+    parser.add_argument("salida", help="Archivo de salida (.ndjson, .csv, con .gz para comprimir)")
+    parser.add_argument("--url", help="API de donde exportar (default: el repositorio configurado)")
+    parser.add_argument("--tienda")
+    parser.add_argument("--categoria")
+    parser.add_argument("--desde", help="Solo productos actualizados desde (ISO 8601)")
+    parser.add_argument("--columnas", help=f"Default: {COLUMNAS_EXPORTACION}")
+    parser.add_argument("--bloque", type=int, default=BLOQUE_CLI, help="Filas por bloque (punto de reanudación)")
+    args = parser.parse_args()
+
+    comprimir = args.salida.endswith(".gz")
+    formato = "csv" if args.salida.removesuffix(".gz").endswith(".csv") else "ndjson"
+    filtros = filtros_exportacion(args.tienda, args.categoria, args.desde, args.columnas)
+
+    inicio = time.perf_counter()
+    if args.url:
+        import httpx
+
+        with httpx.Client(timeout=None) as cliente:
+            escritos = exportar_a_archivo(
+                _bloque_remoto(cliente, args.url, formato, comprimir, args.bloque), args.salida, filtros
+            )
+    else:
+        from database import get_repositorio
+
+        escritos = exportar_a_archivo(
+            _bloque_local(get_repositorio(), formato, comprimir, args.bloque), args.salida, filtros
+        )
+
+    print(f"✅ {args.salida}: {escritos / 1e6:.1f} MB en {time.perf_counter() - inicio:.1f}s")
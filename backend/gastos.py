@@ -0,0 +1,291 @@
+"""
+Gastos de los usuarios para CuidaElMango
+
+Ingesta por lotes de registros Gasto (models.py) con rollups incrementales:
+las consultas leen solo filas de rollup (una por período pedido), nunca el
+JSON crudo, así el costo no crece con el historial del usuario.
+
+Formato esperado de Gasto.productos:
+    {"items": [{"producto_id", "tienda", "categoria", "precio", "cantidad"}, ...]}
+(sin "items" igual se cuenta el total de la compra)
+
+Rollups:
+- rollup_gasto: monto/items/compras por usuario, granularidad (dia, mes, total),
+  período y dimensión (total, categoria, tienda)
+- rollup_otra_tienda: lo que habría costado la misma compra en cada otra tienda
+  (con los precios de los equivalentes al momento de cargarla)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import date
+
+from catalogo import DATA_DIR
+
+
+RUTA_GASTOS = os.path.join(DATA_DIR, "gastos.sqlite")
+
+DIMENSIONES = ("total", "categoria", "tienda")
+
+# Períodos por defecto de una tendencia
+PERIODOS_DEFAULT = {"dia": 30, "mes": 12}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS gastos (
+    id INTEGER PRIMARY KEY,
+    usuario_id TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    total REAL NOT NULL,
+    productos TEXT
+);
+
+-- periodo: 'AAAA-MM-DD', 'AAAA-MM' o '' (total); valor: '' para la dimensión total
+CREATE TABLE IF NOT EXISTS rollup_gasto (
+    usuario_id TEXT NOT NULL,
+    granularidad TEXT NOT NULL,
+    periodo TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    monto REAL NOT NULL,
+    items INTEGER NOT NULL,
+    compras INTEGER NOT NULL,
+    PRIMARY KEY (usuario_id, granularidad, dimension, periodo, valor)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_otra_tienda (
+    usuario_id TEXT NOT NULL,
+    periodo TEXT NOT NULL,
+    tienda TEXT NOT NULL,
+    monto_real REAL NOT NULL,
+    monto_alternativo REAL NOT NULL,
+    items_comparados INTEGER NOT NULL,
+    PRIMARY KEY (usuario_id, periodo, tienda)
+) WITHOUT ROWID;
+"""
+
+
+def items_gasto(productos):
+    """Items de Gasto.productos (lista vacía si no tiene detalle)"""
+    if not isinstance(productos, dict):
+        return []
+    return [item for item in productos.get("items") or [] if isinstance(item, dict)]
+
+
+def _periodos(fecha):
+    return {"dia": fecha.date().isoformat(), "mes": fecha.strftime("%Y-%m"), "total": ""}
+
+
+def _monto_item(item):
+    return float(item.get("precio") or 0) * float(item.get("cantidad") or 1)
+
+
+class RegistroGastos:
+    """
+    Gastos crudos + rollups
+
+    Una conexión por thread, igual que la réplica y el histórico.
+    """
+
+    def __init__(self, ruta=RUTA_GASTOS):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._esquema_creado = False
+        self._lock = threading.Lock()
+
+    def _crear_esquema(self):
+        with self._lock:
+            if self._esquema_creado:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            with sqlite3.connect(self.ruta) as conexion:
+                conexion.executescript(ESQUEMA)
+            self._esquema_creado = True
+
+    def conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            if not self._esquema_creado:
+                self._crear_esquema()
+            conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+            conexion.row_factory = sqlite3.Row
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    # ============================================
+    # INGESTA
+    # ============================================
+
+    def ingerir(self, gastos, precios_alternativos=None):
+        """
+        Guarda un lote de gastos y actualiza los rollups en una sola transacción
+
+        Los incrementos del lote se acumulan en memoria y se escriben con un
+        upsert por fila de rollup (no uno por item).
+
+        Args:
+            gastos (list): Gasto (o dicts con usuario_id, fecha, total, productos)
+            precios_alternativos (dict): producto_id -> {tienda: precio} del equivalente
+                                         más barato en cada otra tienda
+
+        Returns:
+            int: Gastos guardados
+        """
+        precios_alternativos = precios_alternativos or {}
+        crudos = []
+        rollup = {}
+        otra_tienda = {}
+
+        def sumar(clave, monto, items, compras):
+            actual = rollup.get(clave, (0, 0, 0))
+            rollup[clave] = (actual[0] + monto, actual[1] + items, actual[2] + compras)
+
+        for gasto in gastos:
+            if not isinstance(gasto, dict):
+                gasto = gasto.dict()
+
+            usuario_id = gasto["usuario_id"]
+            fecha = gasto["fecha"]
+            items = items_gasto(gasto.get("productos"))
+            periodos = _periodos(fecha)
+
+            crudos.append((
+                usuario_id, fecha.isoformat(), float(gasto["total"]),
+                json.dumps(gasto.get("productos"), ensure_ascii=False, default=str)
+            ))
+
+            por_dimension = {}
+            alternativo = {}
+            for item in items:
+                monto = _monto_item(item)
+                for dimension, valor in (
+                    ("categoria", item.get("categoria") or "sin_categoria"),
+                    ("tienda", item.get("tienda") or "desconocida"),
+                ):
+                    actual = por_dimension.get((dimension, valor), (0, 0))
+                    por_dimension[(dimension, valor)] = (actual[0] + monto, actual[1] + 1)
+
+                cantidad = float(item.get("cantidad") or 1)
+                for tienda, precio in precios_alternativos.get(item.get("producto_id"), {}).items():
+                    if tienda == item.get("tienda"):
+                        continue
+                    actual = alternativo.get(tienda, (0, 0, 0))
+                    alternativo[tienda] = (actual[0] + monto, actual[1] + precio * cantidad, actual[2] + 1)
+
+            for granularidad, periodo in periodos.items():
+                sumar((usuario_id, granularidad, "total", periodo, ""), float(gasto["total"]), len(items), 1)
+                for (dimension, valor), (monto, cantidad_items) in por_dimension.items():
+                    sumar((usuario_id, granularidad, dimension, periodo, valor), monto, cantidad_items, 1)
+
+            for periodo in (periodos["mes"], ""):
+                for tienda, (real, alternativo_monto, comparados) in alternativo.items():
+                    clave = (usuario_id, periodo, tienda)
+                    actual = otra_tienda.get(clave, (0, 0, 0))
+                    otra_tienda[clave] = (
+                        actual[0] + real, actual[1] + alternativo_monto, actual[2] + comparados
+                    )
+
+        conexion = self.conexion()
+        with conexion:
+            conexion.executemany(
+                "INSERT INTO gastos (usuario_id, fecha, total, productos) VALUES (?, ?, ?, ?)", crudos
+            )
+            conexion.executemany(
+                "INSERT INTO rollup_gasto VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (usuario_id, granularidad, dimension, periodo, valor) DO UPDATE SET "
+                "monto = monto + excluded.monto, items = items + excluded.items, "
+                "compras = compras + excluded.compras",
+                [
+                    (usuario_id, granularidad, periodo, dimension, valor, monto, items, compras)
+                    for (usuario_id, granularidad, dimension, periodo, valor), (monto, items, compras)
+                    in rollup.items()
+                ]
+            )
+            conexion.executemany(
+                "INSERT INTO rollup_otra_tienda VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (usuario_id, periodo, tienda) DO UPDATE SET "
+                "monto_real = monto_real + excluded.monto_real, "
+                "monto_alternativo = monto_alternativo + excluded.monto_alternativo, "
+                "items_comparados = items_comparados + excluded.items_comparados",
+                [clave + valores for clave, valores in otra_tienda.items()]
+            )
+
+        return len(crudos)
+
+    # ============================================
+    # LECTURAS (solo rollups)
+    # ============================================
+
+    def tendencia(self, usuario_id, granularidad="mes", dimension="total", desde=None, hasta=None):
+        """
+        Gasto por período, desde los rollups
+
+        Args:
+            usuario_id (str): Usuario
+            granularidad (str): "dia" o "mes"
+            dimension (str): "total", "categoria" o "tienda"
+            desde, hasta (date): Rango (default: los últimos PERIODOS_DEFAULT períodos)
+
+        Returns:
+            list: Dicts {"periodo", "valor", "monto", "items", "compras"} ordenados por período
+        """
+        if granularidad not in PERIODOS_DEFAULT:
+            raise ValueError(f"Granularidad inválida: {granularidad} (opciones: {', '.join(PERIODOS_DEFAULT)})")
+        if dimension not in DIMENSIONES:
+            raise ValueError(f"Dimensión inválida: {dimension} (opciones: {', '.join(DIMENSIONES)})")
+
+        hasta = hasta or date.today()
+        if desde is None:
+            if granularidad == "dia":
+                desde = date.fromordinal(hasta.toordinal() - PERIODOS_DEFAULT["dia"] + 1)
+            else:
+                indice = hasta.year * 12 + hasta.month - PERIODOS_DEFAULT["mes"]
+                desde = date(indice // 12, indice % 12 + 1, 1)
+
+        formato = "%Y-%m-%d" if granularidad == "dia" else "%Y-%m"
+        return [
+            dict(fila) for fila in self.conexion().execute(
+                "SELECT periodo, valor, monto, items, compras FROM rollup_gasto "
+                "WHERE usuario_id = ? AND granularidad = ? AND dimension = ? AND periodo BETWEEN ? AND ? "
+                "ORDER BY periodo, monto DESC",
+                (usuario_id, granularidad, dimension, desde.strftime(formato), hasta.strftime(formato))
+            )
+        ]
+
+    def totales(self, usuario_id, dimension="total"):
+        """Acumulado histórico (una fila por valor de la dimensión)"""
+        return [
+            dict(fila) for fila in self.conexion().execute(
+                "SELECT valor, monto, items, compras FROM rollup_gasto "
+                "WHERE usuario_id = ? AND granularidad = 'total' AND dimension = ? AND periodo = '' "
+                "ORDER BY monto DESC",
+                (usuario_id, dimension)
+            )
+        ]
+
+    def costo_otra_tienda(self, usuario_id, mes=None):
+        """
+        Cuánto habrían costado los items comparables en cada otra tienda
+
+        Args:
+            usuario_id (str): Usuario
+            mes (str): 'AAAA-MM', o None para el acumulado histórico
+
+        Returns:
+            list: Dicts {"tienda", "monto_real", "monto_alternativo", "diferencia", "items_comparados"}
+        """
+        filas = self.conexion().execute(
+            "SELECT tienda, monto_real, monto_alternativo, items_comparados FROM rollup_otra_tienda "
+            "WHERE usuario_id = ? AND periodo = ? ORDER BY monto_alternativo - monto_real",
+            (usuario_id, mes or "")
+        )
+        return [
+            {
+                **dict(fila),
+                "diferencia": round(fila["monto_alternativo"] - fila["monto_real"], 2)
+            }
+            for fila in filas
+        ]
@@ -0,0 +1,475 @@
+"""
+Histórico de precios para CuidaElMango
+
+Append-only: solo se registra un evento cuando cambia el precio o la promo.
+Vive en un SQLite junto al snapshot (DIR_COMPARTIDO, ver catalogo.py).
+
+- Eventos crudos particionados por mes (tabla cambios_AAAAMM): una fila por
+  producto con los eventos del mes codificados en delta (varints de
+  Δsegundos, Δcentavos y id de promo), así un cambio ocupa pocos bytes
+- Rollups por día y por semana (min, max, promedio, cierre) actualizados al
+  registrar, para que las consultas nunca lean los eventos crudos
+- compactar(): los meses viejos se reducen a un evento por día y los rollups
+  diarios muy viejos se borran (queda el semanal)
+
+Compactación manual: python historial.py
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+from catalogo import DIR_COMPARTIDO, WAL_COMPARTIDO
+
+
+RUTA_HISTORIAL = os.path.join(DIR_COMPARTIDO, "historial.sqlite")
+
+# Meses que se guardan con todos los eventos (los anteriores quedan a uno por día)
+MESES_DETALLE = 3
+
+# Días de rollup diario que se conservan (más atrás solo queda el semanal)
+DIAS_ROLLUP_DIARIO = 400
+
+# Puntos por defecto de la serie según granularidad
+PERIODOS_DEFAULT = {"dia": 90, "semana": 52}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ultimo_precio (
+    producto_id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    centavos INTEGER NOT NULL,
+    promo_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS promos (
+    id INTEGER PRIMARY KEY,
+    texto TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS particiones (
+    mes TEXT PRIMARY KEY,
+    compactada INTEGER NOT NULL DEFAULT 0
+);
+
+-- periodo: 'AAAA-MM-DD' (día, o lunes de la semana); montos en centavos
+CREATE TABLE IF NOT EXISTS rollup_dia (
+    producto_id INTEGER NOT NULL,
+    periodo TEXT NOT NULL,
+    minimo INTEGER NOT NULL,
+    maximo INTEGER NOT NULL,
+    suma INTEGER NOT NULL,
+    muestras INTEGER NOT NULL,
+    cierre INTEGER NOT NULL,
+    PRIMARY KEY (producto_id, periodo)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_semana (
+    producto_id INTEGER NOT NULL,
+    periodo TEXT NOT NULL,
+    minimo INTEGER NOT NULL,
+    maximo INTEGER NOT NULL,
+    suma INTEGER NOT NULL,
+    muestras INTEGER NOT NULL,
+    cierre INTEGER NOT NULL,
+    PRIMARY KEY (producto_id, periodo)
+) WITHOUT ROWID;
+"""
+
+ESQUEMA_PARTICION = """
+CREATE TABLE IF NOT EXISTS {tabla} (
+    producto_id INTEGER PRIMARY KEY,
+    base_ts INTEGER NOT NULL,
+    base_centavos INTEGER NOT NULL,
+    ultimo_ts INTEGER NOT NULL,
+    ultimo_centavos INTEGER NOT NULL,
+    cantidad INTEGER NOT NULL,
+    datos BLOB NOT NULL
+)
+"""
+
+ROLLUPS = {"dia": "rollup_dia", "semana": "rollup_semana"}
+
+
+# ============================================
+# CODIFICACIÓN DELTA
+# ============================================
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _deszigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _escribir_varint(buffer, n):
+    while n >= 0x80:
+        buffer.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buffer.append(n)
+
+
+def _leer_varints(datos):
+    n = 0
+    corrimiento = 0
+    for byte in datos:
+        n |= (byte & 0x7F) << corrimiento
+        if byte & 0x80:
+            corrimiento += 7
+        else:
+            yield n
+            n = 0
+            corrimiento = 0
+
+
+def codificar_eventos(eventos, base_ts, base_centavos):
+    """
+    Args:
+        eventos (list): Tuplas (ts, centavos, promo_id) en orden
+        base_ts, base_centavos: Valores contra los que se calcula el primer delta
+
+    Returns:
+        bytearray: (Δts, zigzag(Δcentavos), promo_id) por evento, en varints
+    """
+    buffer = bytearray()
+    anterior_ts, anterior_centavos = base_ts, base_centavos
+    for ts, centavos, promo_id in eventos:
+        _escribir_varint(buffer, ts - anterior_ts)
+        _escribir_varint(buffer, _zigzag(centavos - anterior_centavos))
+        _escribir_varint(buffer, promo_id)
+        anterior_ts, anterior_centavos = ts, centavos
+    return buffer
+
+
+def decodificar_eventos(datos, base_ts, base_centavos):
+    """Inversa de codificar_eventos: lista de (ts, centavos, promo_id)"""
+    eventos = []
+    valores = _leer_varints(datos)
+    ts, centavos = base_ts, base_centavos
+    for delta_ts in valores:
+        ts += delta_ts
+        centavos += _deszigzag(next(valores))
+        eventos.append((ts, centavos, next(valores)))
+    return eventos
+
+
+def _mes(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y%m")
+
+
+def _periodo(ts, granularidad):
+    dia = datetime.fromtimestamp(ts).date()
+    if granularidad == "semana":
+        dia -= timedelta(days=dia.weekday())
+    return dia.isoformat()
+
+
+# ============================================
+# HISTORIAL
+# ============================================
+
+class HistorialPrecios:
+    """
+    Histórico de precios append-only
+
+    Una conexión por thread, igual que la réplica (la API consulta desde el threadpool).
+    """
+
+    def __init__(self, ruta=RUTA_HISTORIAL, wal=WAL_COMPARTIDO):
+        self.ruta = ruta
+        self.wal = wal
+        self._local = threading.local()
+        self._esquema_creado = False
+        self._particiones = set()
+        self._lock = threading.Lock()
+
+    def _crear_esquema(self):
+        with self._lock:
+            if self._esquema_creado:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            with sqlite3.connect(self.ruta) as conexion:
+                conexion.executescript(ESQUEMA)
+            self._esquema_creado = True
+
+    def conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            if not self._esquema_creado:
+                self._crear_esquema()
+            conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+            conexion.row_factory = sqlite3.Row
+            conexion.execute(f"PRAGMA journal_mode={'WAL' if self.wal else 'DELETE'}")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def _tabla_particion(self, conexion, mes):
+        tabla = f"cambios_{mes}"
+        if mes not in self._particiones:
+            conexion.execute(ESQUEMA_PARTICION.format(tabla=tabla))
+            conexion.execute("INSERT OR IGNORE INTO particiones (mes) VALUES (?)", (mes,))
+            self._particiones.add(mes)
+        return tabla
+
+    def _id_promo(self, conexion, promo):
+        if not promo:
+            return 0
+        conexion.execute("INSERT OR IGNORE INTO promos (texto) VALUES (?)", (promo,))
+        return conexion.execute("SELECT id FROM promos WHERE texto = ?", (promo,)).fetchone()[0]
+
+    # ============================================
+    # ESCRITURA
+    # ============================================
+
+    def registrar(self, producto_id, precio, promo=None, fecha=None):
+        """
+        Registra el precio observado de un producto si cambió precio o promo
+
+        Args:
+            producto_id (int): Producto
+            precio (float): Precio en pesos
+            promo (str): Texto de la promo (o None)
+            fecha (datetime): Momento de la observación (default: ahora)
+
+        Returns:
+            dict: {"producto_id", "precio_anterior", "precio", "promo_anterior", "promo", "ts"}
+                  si hubo cambio, o None si el precio y la promo son los mismos
+        """
+        ts = int((fecha or datetime.now()).timestamp())
+        centavos = int(round(precio * 100))
+
+        conexion = self.conexion()
+        with conexion:
+            promo_id = self._id_promo(conexion, promo)
+            ultimo = conexion.execute(
+                "SELECT ts, centavos, promo_id FROM ultimo_precio WHERE producto_id = ?",
+                (producto_id,)
+            ).fetchone()
+
+            if ultimo and ultimo["centavos"] == centavos and ultimo["promo_id"] == promo_id:
+                return None
+
+            self._agregar_evento(conexion, producto_id, ts, centavos, promo_id)
+
+            apertura = ultimo["centavos"] if ultimo else centavos
+            for granularidad in ROLLUPS:
+                self._actualizar_rollup(conexion, granularidad, producto_id, ts, apertura, centavos)
+
+            conexion.execute(
+                "INSERT INTO ultimo_precio VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (producto_id) DO UPDATE SET "
+                "ts = excluded.ts, centavos = excluded.centavos, promo_id = excluded.promo_id",
+                (producto_id, ts, centavos, promo_id)
+            )
+
+            promo_anterior = None
+            if ultimo and ultimo["promo_id"]:
+                promo_anterior = conexion.execute(
+                    "SELECT texto FROM promos WHERE id = ?", (ultimo["promo_id"],)
+                ).fetchone()[0]
+
+        return {
+            "producto_id": producto_id,
+            "precio_anterior": ultimo["centavos"] / 100 if ultimo else None,
+            "precio": centavos / 100,
+            "promo_anterior": promo_anterior,
+            "promo": promo or None,
+            "ts": ts
+        }
+
+    def _agregar_evento(self, conexion, producto_id, ts, centavos, promo_id):
+        tabla = self._tabla_particion(conexion, _mes(ts))
+        fila = conexion.execute(
+            f"SELECT ultimo_ts, ultimo_centavos, datos FROM {tabla} WHERE producto_id = ?",
+            (producto_id,)
+        ).fetchone()
+
+        if fila is None:
+            conexion.execute(
+                f"INSERT INTO {tabla} VALUES (?, ?, ?, ?, ?, 1, ?)",
+                (producto_id, ts, centavos, ts, centavos,
+                 bytes(codificar_eventos([(ts, centavos, promo_id)], ts, centavos)))
+            )
+            return
+
+        # Los eventos llegan en orden; un reloj atrasado no rompe los deltas
+        ts = max(ts, fila["ultimo_ts"])
+        datos = fila["datos"] + codificar_eventos(
+            [(ts, centavos, promo_id)], fila["ultimo_ts"], fila["ultimo_centavos"]
+        )
+        conexion.execute(
+            f"UPDATE {tabla} SET ultimo_ts = ?, ultimo_centavos = ?, "
+            f"cantidad = cantidad + 1, datos = ? WHERE producto_id = ?",
+            (ts, centavos, bytes(datos), producto_id)
+        )
+
+    def _actualizar_rollup(self, conexion, granularidad, producto_id, ts, apertura, centavos):
+        # Si el período es nuevo, el precio con el que abrió también cuenta
+        conexion.execute(
+            f"INSERT INTO {ROLLUPS[granularidad]} VALUES (?, ?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT (producto_id, periodo) DO UPDATE SET "
+            f"minimo = min(minimo, excluded.cierre), maximo = max(maximo, excluded.cierre), "
+            f"suma = suma + excluded.cierre, muestras = muestras + 1, cierre = excluded.cierre",
+            (
+                producto_id, _periodo(ts, granularidad),
+                min(apertura, centavos), max(apertura, centavos),
+                apertura + centavos if apertura != centavos else centavos,
+                2 if apertura != centavos else 1,
+                centavos
+            )
+        )
+
+    # ============================================
+    # LECTURAS
+    # ============================================
+
+    def serie(self, producto_id, granularidad="dia", desde=None, hasta=None):
+        """
+        Serie de precios desde los rollups (sin leer eventos crudos)
+
+        Los períodos sin cambios repiten el cierre anterior.
+
+        Args:
+            producto_id (int): Producto
+            granularidad (str): "dia" o "semana"
+            desde, hasta (date): Rango (default: los últimos PERIODOS_DEFAULT períodos)
+
+        Returns:
+            list: Dicts {"periodo", "min", "max", "promedio", "cierre"} en pesos
+        """
+        if granularidad not in ROLLUPS:
+            raise ValueError(f"Granularidad inválida: {granularidad} (opciones: {', '.join(ROLLUPS)})")
+
+        paso = timedelta(days=7 if granularidad == "semana" else 1)
+        hasta = hasta or date.today()
+        desde = desde or hasta - paso * (PERIODOS_DEFAULT[granularidad] - 1)
+        if granularidad == "semana":
+            desde -= timedelta(days=desde.weekday())
+            hasta -= timedelta(days=hasta.weekday())
+
+        tabla = ROLLUPS[granularidad]
+        conexion = self.conexion()
+
+        filas = {
+            fila["periodo"]: fila
+            for fila in conexion.execute(
+                f"SELECT * FROM {tabla} WHERE producto_id = ? AND periodo BETWEEN ? AND ? ORDER BY periodo",
+                (producto_id, desde.isoformat(), hasta.isoformat())
+            )
+        }
+        anterior = conexion.execute(
+            f"SELECT cierre FROM {tabla} WHERE producto_id = ? AND periodo < ? "
+            f"ORDER BY periodo DESC LIMIT 1",
+            (producto_id, desde.isoformat())
+        ).fetchone()
+        cierre = anterior["cierre"] if anterior else None
+
+        serie = []
+        periodo = desde
+        while periodo <= hasta:
+            fila = filas.get(periodo.isoformat())
+            if fila is not None:
+                cierre = fila["cierre"]
+                serie.append({
+                    "periodo": fila["periodo"],
+                    "min": fila["minimo"] / 100,
+                    "max": fila["maximo"] / 100,
+                    "promedio": round(fila["suma"] / fila["muestras"] / 100, 2),
+                    "cierre": cierre / 100
+                })
+            elif cierre is not None:
+                serie.append({
+                    "periodo": periodo.isoformat(),
+                    "min": cierre / 100,
+                    "max": cierre / 100,
+                    "promedio": cierre / 100,
+                    "cierre": cierre / 100
+                })
+            periodo += paso
+
+        return serie
+
+    def eventos(self, producto_id, mes):
+        """
+        Eventos crudos de un mes (auditoría; la API usa serie())
+
+        Returns:
+            list: Tuplas (ts, precio, promo)
+        """
+        conexion = self.conexion()
+        if not conexion.execute("SELECT 1 FROM particiones WHERE mes = ?", (mes,)).fetchone():
+            return []
+
+        fila = conexion.execute(
+            f"SELECT base_ts, base_centavos, datos FROM cambios_{mes} WHERE producto_id = ?",
+            (producto_id,)
+        ).fetchone()
+        if fila is None:
+            return []
+
+        promos = {p["id"]: p["texto"] for p in conexion.execute("SELECT id, texto FROM promos")}
+        return [
+            (ts, centavos / 100, promos.get(promo_id))
+            for ts, centavos, promo_id in decodificar_eventos(
+                fila["datos"], fila["base_ts"], fila["base_centavos"]
+            )
+        ]
+
+    # ============================================
+    # MANTENIMIENTO
+    # ============================================
+
+    def compactar(self, meses_detalle=MESES_DETALLE, dias_rollup_diario=DIAS_ROLLUP_DIARIO, hoy=None):
+        """
+        Reduce los meses viejos a un evento por día (el último) y borra rollups diarios viejos
+
+        Returns:
+            list: Meses compactados
+        """
+        hoy = hoy or date.today()
+        indice_limite = hoy.year * 12 + hoy.month - 1 - meses_detalle
+        limite = f"{indice_limite // 12:04d}{indice_limite % 12 + 1:02d}"
+
+        conexion = self.conexion()
+        meses = [
+            fila["mes"] for fila in conexion.execute(
+                "SELECT mes FROM particiones WHERE compactada = 0 AND mes < ? ORDER BY mes", (limite,)
+            )
+        ]
+
+        for mes in meses:
+            tabla = f"cambios_{mes}"
+            with conexion:
+                for fila in conexion.execute(f"SELECT * FROM {tabla}").fetchall():
+                    eventos = decodificar_eventos(fila["datos"], fila["base_ts"], fila["base_centavos"])
+
+                    por_dia = {}
+                    for evento in eventos:
+                        por_dia[_periodo(evento[0], "dia")] = evento
+                    reducidos = list(por_dia.values())
+
+                    if len(reducidos) == len(eventos):
+                        continue
+                    conexion.execute(
+                        f"UPDATE {tabla} SET base_ts = ?, base_centavos = ?, cantidad = ?, datos = ? "
+                        f"WHERE producto_id = ?",
+                        (reducidos[0][0], reducidos[0][1], len(reducidos),
+                         bytes(codificar_eventos(reducidos, reducidos[0][0], reducidos[0][1])),
+                         fila["producto_id"])
+                    )
+                conexion.execute("UPDATE particiones SET compactada = 1 WHERE mes = ?", (mes,))
+
+        with conexion:
+            conexion.execute(
+                "DELETE FROM rollup_dia WHERE periodo < ?",
+                ((hoy - timedelta(days=dias_rollup_diario)).isoformat(),)
+            )
+
+        return meses
+
+
+if __name__ == "__main__":
+    compactados = HistorialPrecios().compactar()
+    print(f"✅ Histórico compactado: {len(compactados)} meses ({', '.join(compactados) or 'ninguno'})")
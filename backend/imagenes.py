@@ -0,0 +1,441 @@
+"""
+Proxy de imágenes para CuidaElMango
+
+El frontend pide /imagenes?url=...&ancho=240 en vez de ir directo al CDN de
+cada tienda:
+
+- Cache en disco direccionada por contenido: el original se guarda con el
+  sha256 de sus bytes, así la misma foto usada por las dos tiendas (o con
+  otra URL) se guarda una sola vez; un índice SQLite mapea URL -> hash
+- Miniaturas a unos pocos anchos fijos (ANCHOS), generadas una vez con
+  Pillow si está instalado (sin Pillow se sirve el original)
+- Tamaño acotado: al pasar el máximo se borran los archivos usados hace más
+  tiempo (LRU por último acceso)
+- Descargas deduplicadas: pedidos simultáneos de la misma URL esperan la
+  misma descarga
+- Solo se descargan imágenes de los hosts permitidos (no es un proxy abierto)
+
+Las respuestas llevan el hash como ETag y Cache-Control inmutable de un año:
+el contenido de una (url, ancho) no cambia mientras la tienda no cambie la URL.
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from catalogo import DATA_DIR
+
+try:
+    from PIL import Image
+except ImportError:  # opcional: sin Pillow no se generan miniaturas
+    Image = None
+
+
+DIRECTORIO_IMAGENES = os.path.join(DATA_DIR, "imagenes")
+
+# Anchos de miniatura permitidos (px); cualquier otro pedido es un 400
+ANCHOS = (96, 240, 480)
+
+# Tamaño máximo de la cache en disco; al desalojar se baja hasta el 90%
+MAXIMO_BYTES = 512 * 1024 * 1024
+FRACCION_DESALOJO = 0.9
+
+# Límites de una descarga
+MAXIMO_DESCARGA = 5 * 1024 * 1024
+TIMEOUT_DESCARGA = 10
+MAXIMO_REDIRECCIONES = 3
+
+# Hosts (o sufijos de dominio) de donde se aceptan imágenes
+HOSTS_PERMITIDOS = ("vtexassets.com", "vteximg.com.br", "carrefour.com.ar", "disco.com.ar")
+
+# Una URL que falló no se vuelve a pedir a la tienda por este tiempo (segundos)
+ESPERA_ERROR = 300
+MAXIMO_ERRORES = 10000
+
+# El último acceso se actualiza como mucho una vez por este intervalo (segundos)
+INTERVALO_ACCESO = 60
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_urls_hash ON urls (hash);
+
+-- Originales (nombre = hash) y miniaturas (nombre = hash-ancho)
+CREATE TABLE IF NOT EXISTS archivos (
+    nombre TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    ultimo_acceso REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_archivos_acceso ON archivos (ultimo_acceso);
+"""
+
+
+class ErrorImagen(Exception):
+    """La imagen no se pudo obtener de la tienda (status: el que se devuelve)"""
+
+    def __init__(self, mensaje, status=502):
+        super().__init__(mensaje)
+        self.status = status
+
+
+class CacheImagenes:
+    """
+    Cache de imágenes en disco con índice SQLite
+
+    Una conexión por thread; los archivos se escriben a un temporal y se
+    renombran, así otro worker nunca lee una imagen a medias.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_IMAGENES, maximo_bytes=MAXIMO_BYTES,
+                 hosts=HOSTS_PERMITIDOS, cliente=None):
+        self.directorio = directorio
+        self.maximo_bytes = maximo_bytes
+        self.hosts = tuple(h.strip().lower() for h in hosts if h.strip())
+        self._cliente = cliente
+        self._local = threading.local()
+        self._esquema_creado = False
+        self._lock = threading.Lock()
+        self._en_curso = {}
+        self._errores = {}
+        self._bytes_estimados = None
+
+    def _crear_esquema(self):
+        with self._lock:
+            if self._esquema_creado:
+                return
+            os.makedirs(self.directorio, exist_ok=True)
+            with sqlite3.connect(os.path.join(self.directorio, "indice.sqlite")) as conexion:
+                conexion.executescript(ESQUEMA)
+            self._esquema_creado = True
+
+    def conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            if not self._esquema_creado:
+                self._crear_esquema()
+            conexion = sqlite3.connect(
+                os.path.join(self.directorio, "indice.sqlite"), timeout=30, check_same_thread=False
+            )
+            conexion.row_factory = sqlite3.Row
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    @property
+    def cliente(self):
+        if self._cliente is None:
+            self._cliente = httpx.AsyncClient(timeout=TIMEOUT_DESCARGA, follow_redirects=False)
+        return self._cliente
+
+    def _ruta(self, nombre):
+        # Dos niveles de directorio para no juntar cientos de miles de archivos en uno
+        return os.path.join(self.directorio, nombre[:2], nombre)
+
+    # ============================================
+    # VALIDACIÓN
+    # ============================================
+
+    def validar(self, url, ancho):
+        """
+        Raises:
+            ValueError: Si la URL no es de un host permitido o el ancho no es uno de ANCHOS
+        """
+        if ancho is not None and ancho not in ANCHOS:
+            raise ValueError(f"ancho debe ser uno de {list(ANCHOS)}")
+
+        partes = urlsplit(url)
+        host = (partes.hostname or "").lower()
+        if partes.scheme not in ("http", "https") or not host:
+            raise ValueError("url debe ser http(s)")
+
+        puerto = f"{host}:{partes.port}" if partes.port else host
+        if not any(
+            candidato == permitido or candidato.endswith("." + permitido)
+            for permitido in self.hosts
+            for candidato in (host, puerto)
+        ):
+            raise ValueError(f"Host no permitido: {host}")
+
+    # ============================================
+    # ÍNDICE Y ARCHIVOS (sincrónico, corre en el threadpool)
+    # ============================================
+
+    def _archivo(self, nombre):
+        """Fila del archivo si existe en el índice y en disco (y marca el acceso)"""
+        conexion = self.conexion()
+        fila = conexion.execute(
+            "SELECT nombre, hash, tipo, ultimo_acceso FROM archivos WHERE nombre = ?", (nombre,)
+        ).fetchone()
+        if fila is None:
+            return None
+        if not os.path.exists(self._ruta(nombre)):
+            with conexion:
+                conexion.execute("DELETE FROM archivos WHERE nombre = ?", (nombre,))
+            return None
+
+        ahora = time.time()
+        if ahora - fila["ultimo_acceso"] > INTERVALO_ACCESO:
+            with conexion:
+                conexion.execute("UPDATE archivos SET ultimo_acceso = ? WHERE nombre = ?", (ahora, nombre))
+        return dict(fila)
+
+    def buscar(self, url, ancho=None):
+        """
+        Archivo en cache para (url, ancho), sin descargar nada
+
+        Returns:
+            dict: {"nombre", "hash", "tipo"} o None si falta el original
+                  (si falta solo la miniatura devuelve el original con "falta_variante")
+        """
+        fila = self.conexion().execute("SELECT hash FROM urls WHERE url = ?", (url,)).fetchone()
+        if fila is None:
+            return None
+
+        if ancho is not None and Image is not None:
+            variante = self._archivo(f"{fila['hash']}-{ancho}")
+            if variante is not None:
+                return variante
+
+        original = self._archivo(fila["hash"])
+        if original is not None and ancho is not None and Image is not None:
+            original["falta_variante"] = True
+        return original
+
+    def _escribir(self, nombre, contenido, hash_, tipo):
+        ruta = self._ruta(nombre)
+        if not os.path.exists(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporal, "wb") as archivo:
+                archivo.write(contenido)
+            os.replace(temporal, ruta)
+
+        conexion = self.conexion()
+        with conexion:
+            conexion.execute(
+                "INSERT OR REPLACE INTO archivos (nombre, hash, tipo, bytes, ultimo_acceso) VALUES (?, ?, ?, ?, ?)",
+                (nombre, hash_, tipo, len(contenido), time.time())
+            )
+        self._sumar_bytes(len(contenido))
+        return {"nombre": nombre, "hash": hash_, "tipo": tipo}
+
+    def guardar_original(self, url, contenido, tipo):
+        """
+        Guarda una descarga; si el contenido ya estaba (otra URL, otra tienda) se reutiliza
+
+        Returns:
+            dict: {"nombre", "hash", "tipo"} del original
+        """
+        hash_ = hashlib.sha256(contenido).hexdigest()
+        original = self._archivo(hash_) or self._escribir(hash_, contenido, hash_, tipo)
+
+        conexion = self.conexion()
+        with conexion:
+            conexion.execute("INSERT OR REPLACE INTO urls (url, hash) VALUES (?, ?)", (url, hash_))
+        return original
+
+    def crear_variante(self, original, ancho):
+        """
+        Miniatura de `ancho` px (sin agrandar): JPEG, o PNG si tiene transparencia
+
+        Returns:
+            dict: {"nombre", "hash", "tipo"} de la miniatura (o el original si no se puede decodificar)
+        """
+        with open(self._ruta(original["nombre"]), "rb") as archivo:
+            contenido = archivo.read()
+
+        try:
+            imagen = Image.open(io.BytesIO(contenido))
+            imagen.draft("RGB", (ancho, ancho))  # JPEG: decodifica directo a menor escala
+            imagen.thumbnail((ancho, ancho * 4))
+            salida = io.BytesIO()
+            transparente = imagen.mode in ("RGBA", "LA") or "transparency" in imagen.info
+            if transparente:
+                imagen.save(salida, "PNG", optimize=True)
+                tipo = "image/png"
+            else:
+                imagen.convert("RGB").save(salida, "JPEG", quality=82, optimize=True, progressive=True)
+                tipo = "image/jpeg"
+        except Exception as e:
+            print(f"⚠️  No se pudo redimensionar {original['hash'][:12]}: {e}")
+            return original
+
+        return self._escribir(f"{original['hash']}-{ancho}", salida.getvalue(), original["hash"], tipo)
+
+    def _sumar_bytes(self, cantidad):
+        with self._lock:
+            if self._bytes_estimados is None:
+                self._bytes_estimados = self.conexion().execute(
+                    "SELECT COALESCE(SUM(bytes), 0) FROM archivos"
+                ).fetchone()[0]
+            else:
+                self._bytes_estimados += cantidad
+            exceso = self._bytes_estimados > self.maximo_bytes
+        if exceso:
+            self.desalojar()
+
+    def desalojar(self):
+        """
+        Borra los archivos usados hace más tiempo hasta quedar en FRACCION_DESALOJO del máximo
+
+        Al borrar un original se olvidan también las URLs que apuntaban a él.
+
+        Returns:
+            int: Archivos borrados
+        """
+        conexion = self.conexion()
+        total = conexion.execute("SELECT COALESCE(SUM(bytes), 0) FROM archivos").fetchone()[0]
+        objetivo = self.maximo_bytes * FRACCION_DESALOJO
+        borrados = 0
+
+        for fila in conexion.execute(
+            "SELECT nombre, hash, bytes FROM archivos ORDER BY ultimo_acceso"
+        ).fetchall():
+            if total <= objetivo:
+                break
+            try:
+                os.remove(self._ruta(fila["nombre"]))
+            except FileNotFoundError:
+                pass
+            with conexion:
+                conexion.execute("DELETE FROM archivos WHERE nombre = ?", (fila["nombre"],))
+                if fila["nombre"] == fila["hash"]:
+                    conexion.execute("DELETE FROM urls WHERE hash = ?", (fila["hash"],))
+            total -= fila["bytes"]
+            borrados += 1
+
+        with self._lock:
+            self._bytes_estimados = total
+        return borrados
+
+    def estadisticas(self):
+        fila = self.conexion().execute(
+            "SELECT COUNT(*) AS archivos, COALESCE(SUM(bytes), 0) AS bytes, "
+            "SUM(nombre = hash) AS originales, (SELECT COUNT(*) FROM urls) AS urls FROM archivos"
+        ).fetchone()
+        return {**dict(fila), "maximo_bytes": self.maximo_bytes, "miniaturas": Image is not None}
+
+    # ============================================
+    # PEDIDOS
+    # ============================================
+
+    async def _descargar(self, url):
+        """
+        Las redirecciones se siguen a mano (hasta MAXIMO_REDIRECCIONES) y cada
+        destino pasa por validar(): un host permitido no puede mandar el proxy
+        a cualquier otro lado.
+
+        Returns:
+            tuple: (bytes, content-type)
+
+        Raises:
+            ErrorImagen: Si la tienda responde error, redirige a un host no
+                         permitido, no es una imagen o es demasiado grande
+        """
+        try:
+            for _ in range(MAXIMO_REDIRECCIONES + 1):
+                async with self.cliente.stream("GET", url) as respuesta:
+                    if respuesta.is_redirect:
+                        destino = urljoin(url, respuesta.headers.get("location", ""))
+                        try:
+                            self.validar(destino, None)
+                        except ValueError as e:
+                            raise ErrorImagen(f"Redirección rechazada: {e}")
+                        url = destino
+                        continue
+
+                    if respuesta.status_code >= 400:
+                        raise ErrorImagen(
+                            f"La tienda respondió {respuesta.status_code}",
+                            404 if respuesta.status_code == 404 else 502
+                        )
+                    tipo = respuesta.headers.get("content-type", "").split(";")[0].strip().lower()
+                    if not tipo.startswith("image/"):
+                        raise ErrorImagen(f"No es una imagen ({tipo or 'sin content-type'})")
+
+                    partes = []
+                    recibidos = 0
+                    async for parte in respuesta.aiter_bytes():
+                        recibidos += len(parte)
+                        if recibidos > MAXIMO_DESCARGA:
+                            raise ErrorImagen("Imagen demasiado grande")
+                        partes.append(parte)
+                    return b"".join(partes), tipo
+        except httpx.HTTPError as e:
+            raise ErrorImagen(f"Error descargando: {e}")
+
+        raise ErrorImagen("Demasiadas redirecciones")
+
+    async def _una_vez(self, clave, funcion):
+        """Corre `funcion` una sola vez por clave aunque lleguen varios pedidos a la vez"""
+        tarea = self._en_curso.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(funcion())
+            self._en_curso[clave] = tarea
+            tarea.add_done_callback(lambda _: self._en_curso.pop(clave, None))
+        return await asyncio.shield(tarea)
+
+    async def obtener(self, url, ancho=None):
+        """
+        Imagen para (url, ancho): de la cache, o descargándola/redimensionándola
+
+        Returns:
+            dict: {"ruta", "tipo", "etag"}
+
+        Raises:
+            ValueError: URL o ancho inválidos
+            ErrorImagen: La tienda no devolvió una imagen
+        """
+        self.validar(url, ancho)
+
+        archivo = await run_in_threadpool(self.buscar, url, ancho)
+
+        if archivo is None:
+            error = self._errores.get(url)
+            if error and error[0] > time.monotonic():
+                raise error[1]
+
+            async def descargar():
+                try:
+                    contenido, tipo = await self._descargar(url)
+                except ErrorImagen as e:
+                    if len(self._errores) > MAXIMO_ERRORES:
+                        self._errores.clear()
+                    self._errores[url] = (time.monotonic() + ESPERA_ERROR, e)
+                    raise
+                self._errores.pop(url, None)
+                return await run_in_threadpool(self.guardar_original, url, contenido, tipo)
+
+            archivo = await self._una_vez(("url", url), descargar)
+            if ancho is not None and Image is not None:
+                archivo = dict(archivo, falta_variante=True)
+
+        if archivo.pop("falta_variante", False):
+            original = dict(archivo)
+            archivo = await self._una_vez(
+                ("variante", archivo["hash"], ancho),
+                lambda: run_in_threadpool(self.crear_variante, original, ancho)
+            )
+
+        return {
+            "ruta": self._ruta(archivo["nombre"]),
+            "tipo": archivo["tipo"],
+            "etag": f'"{archivo["nombre"]}"',
+        }
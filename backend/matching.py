@@ -5,6 +5,33 @@ Calcula similitud entre productos de diferentes supermercados
 
 from difflib import SequenceMatcher
 
+from cantidades import UNIDADES
+from utils import calcular_features_match
+
+
+# Columnas precalculadas al ingestar (ver utils.calcular_features_match)
+COLUMNAS_FEATURES = ("peso_base", "unidad_familia", "marca_id", "variante_id", "firma_nombre")
+
+
+def preparar_para_matching(producto):
+    """
+    Devuelve el producto con las features de matching
+
+    Las filas del catálogo ya las traen; se calculan (una vez por producto, no
+    por comparación) si falta alguna o viene en NULL: p.ej. filas viejas sin
+    backfill (la columna existe pero está vacía) o el producto que manda el
+    frontend.
+
+    Args:
+        producto (dict): Producto
+
+    Returns:
+        dict: El mismo dict si ya tenía las features, o una copia con ellas
+    """
+    if all(producto.get(columna) is not None for columna in COLUMNAS_FEATURES):
+        return producto
+    return {**producto, **calcular_features_match(producto)}
+
 
 def calcular_match_score(producto_a, producto_b):
     """
@@ -25,6 +52,9 @@ def calcular_match_score(producto_a, producto_b):
         int: Score de 0 a 100
     """
     
+    producto_a = preparar_para_matching(producto_a)
+    producto_b = preparar_para_matching(producto_b)
+    
     score = 0
     detalles = []
     
@@ -33,19 +63,21 @@ def calcular_match_score(producto_a, producto_b):
     # ============================================
     marca_a = producto_a.get('marca')
     marca_b = producto_b.get('marca')
+    marca_id_a = producto_a.get('marca_id')
+    marca_id_b = producto_b.get('marca_id')
     
-    if marca_a and marca_b:
-        if marca_a == marca_b:
+    if marca_id_a and marca_id_b:
+        if marca_id_a == marca_id_b:
             score += 35
             detalles.append(f"✓ Marca idéntica: {marca_a}")
         else:
-            similitud_marca = similar_strings(marca_a, marca_b)
+            similitud_marca = similitud_normalizada(marca_id_a, marca_id_b)
             if similitud_marca > 0.8:
                 score += 25
                 detalles.append(f"~ Marca similar: {marca_a} vs {marca_b} ({similitud_marca:.2f})")
             else:
                 detalles.append(f"✗ Marca diferente: {marca_a} vs {marca_b}")
-    elif not marca_a and not marca_b:
+    elif not marca_id_a and not marca_id_b:
         # Ambos sin marca detectada
         score += 10
         detalles.append("? Sin marca detectada en ambos")
@@ -72,13 +104,13 @@ def calcular_match_score(producto_a, producto_b):
     peso_b = producto_b.get('peso')
     unidad_a = producto_a.get('peso_unidad')
     unidad_b = producto_b.get('peso_unidad')
+    peso_a_norm = producto_a.get('peso_base')
+    peso_b_norm = producto_b.get('peso_base')
     
-    if peso_a and peso_b and unidad_a and unidad_b:
-        # Normalizar a misma unidad
-        peso_a_norm = normalizar_peso(peso_a, unidad_a)
-        peso_b_norm = normalizar_peso(peso_b, unidad_b)
-        
-        if peso_a_norm > 0 and peso_b_norm > 0:
+    if peso_a_norm and peso_b_norm:
+        if producto_a.get('unidad_familia') != producto_b.get('unidad_familia'):
+            detalles.append(f"✗ Unidad diferente: {peso_a}{unidad_a} vs {peso_b}{unidad_b}")
+        else:
             diferencia_pct = abs(peso_a_norm - peso_b_norm) / max(peso_a_norm, peso_b_norm)
             
             if diferencia_pct == 0:
@@ -109,15 +141,17 @@ def calcular_match_score(producto_a, producto_b):
     # ============================================
     variante_a = producto_a.get('variante')
     variante_b = producto_b.get('variante')
+    variante_id_a = producto_a.get('variante_id')
+    variante_id_b = producto_b.get('variante_id')
     
-    if variante_a and variante_b:
-        if variante_a == variante_b:
+    if variante_id_a and variante_id_b:
+        if variante_id_a == variante_id_b:
             score += 10
             detalles.append(f"✓ Misma variante: {variante_a}")
         else:
             score -= 20  # PENALIZACIÓN FUERTE
             detalles.append(f"✗✗ Variante diferente: {variante_a} vs {variante_b}")
-    elif not variante_a and not variante_b:
+    elif not variante_id_a and not variante_id_b:
         score += 10
         detalles.append("✓ Sin variante en ambos")
     else:
@@ -127,11 +161,11 @@ def calcular_match_score(producto_a, producto_b):
     # ============================================
     # 5. NOMBRE LIMPIO (Peso: 10 puntos)
     # ============================================
-    nombre_limpio_a = producto_a.get('nombre_limpio', '')
-    nombre_limpio_b = producto_b.get('nombre_limpio', '')
+    firma_a = producto_a.get('firma_nombre')
+    firma_b = producto_b.get('firma_nombre')
     
-    if nombre_limpio_a and nombre_limpio_b:
-        similitud = similar_strings(nombre_limpio_a, nombre_limpio_b)
+    if firma_a and firma_b:
+        similitud = similitud_tokens(firma_a, firma_b)
         puntos_nombre = int(similitud * 10)
         score += puntos_nombre
         
@@ -168,19 +202,11 @@ def normalizar_peso(peso, unidad):
     if not peso or not unidad:
         return 0
     
-    unidad = unidad.lower()
-    
-    # Peso
-    if unidad in ['kg']:
-        return peso * 1000
-    elif unidad in ['g', 'gr', 'grs']:
-        return peso
+    unidad = UNIDADES.get(unidad.lower(), unidad.lower())
     
-    # Volumen
-    elif unidad in ['l', 'lt', 'lts']:
+    # kg → g, l → ml
+    if unidad in ['kg', 'l']:
         return peso * 1000
-    elif unidad in ['ml', 'cc']:
-        return peso
     
     return peso
 
@@ -202,6 +228,44 @@ def similar_strings(s1, s2):
     return SequenceMatcher(None, s1.lower(), s2.lower()).ratio()
 
 
+def similitud_normalizada(s1, s2):
+    """
+    Como similar_strings pero para strings ya normalizados al ingestar
+    (sin pasar a minúsculas en cada comparación)
+    """
+    if not s1 or not s2:
+        return 0
+    if s1 == s2:
+        return 1.0
+    
+    return SequenceMatcher(None, s1, s2).ratio()
+
+
+def similitud_tokens(firma_a, firma_b):
+    """
+    Similitud entre dos firmas de nombre (utils.firma_nombre) por conjuntos de tokens
+
+    Coeficiente de Dice: 2 * |A ∩ B| / (|A| + |B|). Ordena igual que Jaccard y
+    queda en la misma escala que SequenceMatcher.ratio(), así los umbrales del
+    score no cambian.
+
+    Args:
+        firma_a (str): Tokens separados por espacio
+        firma_b (str): Tokens separados por espacio
+
+    Returns:
+        float: Similitud de 0 a 1
+    """
+    if not firma_a or not firma_b:
+        return 0
+    if firma_a == firma_b:
+        return 1.0
+
+    tokens_a = set(firma_a.split())
+    tokens_b = set(firma_b.split())
+    return 2 * len(tokens_a & tokens_b) / (len(tokens_a) + len(tokens_b))
+
+
 def get_nivel_confianza(score):
     """
     Convierte score numérico en nivel de confianza
@@ -239,9 +303,10 @@ def encontrar_mejores_matches(producto_origen, candidatos, top_n=5):
         list: Lista de candidatos con scores, ordenada de mayor a menor
     """
     matches_con_score = []
+    producto_origen = preparar_para_matching(producto_origen)
     
     for candidato in candidatos:
-        match_result = calcular_match_score(producto_origen, candidato)
+        match_result = calcular_match_score(producto_origen, preparar_para_matching(candidato))
         
         matches_con_score.append({
             **candidato,
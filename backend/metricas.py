@@ -0,0 +1,412 @@
+"""
+Métricas por request para CuidaElMango
+
+- Medicion: desglose de un request por etapa (db, scoring, optimizacion, encode...)
+  y contadores (candidatos, ...). Vive en un ContextVar, así cualquier función
+  llamada durante el request (también en el threadpool) suma a la misma medición
+  sin pasarla como argumento.
+- MiddlewareMetricas: abre la medición, agrega el header Server-Timing y al
+  terminar vuelca todo en histogramas por ruta.
+- /metrics: los histogramas en formato de texto de Prometheus (por proceso: con
+  varios workers cada uno expone los suyos).
+- MuestreadorPerfil (opcional): muestrea los stacks de todos los threads mientras
+  hay requests en vuelo y guarda los de los requests lentos en formato "folded"
+  (flamegraph.pl / speedscope).
+
+Configuración:
+- CUIDAELMANGO_METRICAS=0 desactiva el middleware
+- CUIDAELMANGO_PERFIL_LENTO_MS=500 activa el perfilador para requests de 500 ms o más
+- CUIDAELMANGO_PERFIL_INTERVALO_MS=5 cada cuánto se muestrea
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from catalogo import DATA_DIR
+from database import get_variable
+
+
+# Límites de los histogramas
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CANTIDAD = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+DIRECTORIO_PERFILES = os.path.join(DATA_DIR, "perfiles")
+
+# Perfiles que se conservan (se borran los más viejos)
+MAXIMO_PERFILES = 50
+
+# Profundidad máxima de stack que se guarda por muestra
+PROFUNDIDAD_PERFIL = 64
+
+# Hoja del stack de un worker del threadpool sin trabajo (no se cuenta)
+IDLE_THREADPOOL = ["threading.py:wait", "queue.py:get"]
+
+# Ruta para requests que no matchearon ningún endpoint (evita una serie por URL)
+RUTA_DESCONOCIDA = "desconocida"
+
+_medicion_actual = ContextVar("medicion_actual", default=None)
+
+
+# ============================================
+# MEDICIÓN DE UN REQUEST
+# ============================================
+
+class Medicion:
+    """
+    Etapas y contadores de un request
+
+    etapas: nombre -> [segundos acumulados, llamadas]
+    contadores: nombre -> valor acumulado
+    """
+
+    __slots__ = ("inicio", "etapas", "contadores", "_lock")
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas = {}
+        self.contadores = {}
+        # Las etapas pueden cerrarse desde threads del threadpool
+        self._lock = threading.Lock()
+
+    def sumar_etapa(self, nombre, segundos):
+        with self._lock:
+            actual = self.etapas.get(nombre)
+            if actual is None:
+                self.etapas[nombre] = [segundos, 1]
+            else:
+                actual[0] += segundos
+                actual[1] += 1
+
+    def contar(self, nombre, cantidad=1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    def server_timing(self, total=None):
+        """
+        Valor del header Server-Timing
+
+        Ej: db;dur=12.4;desc="4 llamadas", scoring;dur=3.1, candidatos;desc="37", total;dur=18.0
+        """
+        partes = []
+        with self._lock:
+            for nombre, (segundos, llamadas) in self.etapas.items():
+                parte = f"{nombre};dur={segundos * 1000:.1f}"
+                if llamadas > 1:
+                    parte += f';desc="{llamadas} llamadas"'
+                partes.append(parte)
+            for nombre, valor in self.contadores.items():
+                partes.append(f'{nombre};desc="{valor:g}"')
+
+        if total is None:
+            total = time.perf_counter() - self.inicio
+        partes.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(partes)
+
+
+def medicion_actual():
+    """Medición del request en curso (None fuera de un request o con métricas apagadas)"""
+    return _medicion_actual.get()
+
+
+@contextmanager
+def etapa(nombre):
+    """
+    Mide un bloque como etapa del request en curso (no hace nada fuera de un request)
+
+    Uso:
+        with etapa("db"):
+            filas = repositorio.filtrar_productos(...)
+    """
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        yield
+        return
+
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.sumar_etapa(nombre, time.perf_counter() - inicio)
+
+
+def contar(nombre, cantidad=1):
+    """Suma a un contador del request en curso (candidatos, filas, ...)"""
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        medicion.contar(nombre, cantidad)
+
+
+# ============================================
+# HISTOGRAMAS (PROMETHEUS)
+# ============================================
+
+class Histograma:
+    """Histograma acumulativo con los buckets de Prometheus"""
+
+    __slots__ = ("buckets", "conteos", "suma", "cantidad")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * len(buckets)
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.conteos[i] += 1
+                break
+        self.suma += valor
+        self.cantidad += 1
+
+    def lineas(self, nombre, etiquetas):
+        acumulado = 0
+        for limite, conteo in zip(self.buckets, self.conteos):
+            acumulado += conteo
+            yield f'{nombre}_bucket{{{etiquetas},le="{limite:g}"}} {acumulado}'
+        yield f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {self.cantidad}'
+        yield f"{nombre}_sum{{{etiquetas}}} {self.suma:.6f}"
+        yield f"{nombre}_count{{{etiquetas}}} {self.cantidad}"
+
+
+def _etiqueta(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RegistroMetricas:
+    """
+    Histogramas agregados de todos los requests del proceso
+
+    - cuidaelmango_request_segundos{metodo, ruta, estado}
+    - cuidaelmango_etapa_segundos{ruta, etapa}: tiempo por etapa en cada request
+    - cuidaelmango_etapa_llamadas{ruta, etapa}: veces que se entró a la etapa por request
+    - cuidaelmango_contador{ruta, nombre}: contadores por request (ej. candidatos)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._etapas = {}
+        self._llamadas = {}
+        self._contadores = {}
+        self.inicio = time.time()
+
+    def _histograma(self, tabla, clave, buckets):
+        histograma = tabla.get(clave)
+        if histograma is None:
+            histograma = tabla[clave] = Histograma(buckets)
+        return histograma
+
+    def registrar(self, metodo, ruta, estado, segundos, medicion):
+        with self._lock:
+            self._histograma(self._requests, (metodo, ruta, estado), BUCKETS_SEGUNDOS).observar(segundos)
+            for nombre, (duracion, llamadas) in medicion.etapas.items():
+                self._histograma(self._etapas, (ruta, nombre), BUCKETS_SEGUNDOS).observar(duracion)
+                self._histograma(self._llamadas, (ruta, nombre), BUCKETS_CANTIDAD).observar(llamadas)
+            for nombre, valor in medicion.contadores.items():
+                self._histograma(self._contadores, (ruta, nombre), BUCKETS_CANTIDAD).observar(valor)
+
+    def exportar(self):
+        """
+        Returns:
+            str: Formato de texto de Prometheus (0.0.4)
+        """
+        lineas = [
+            "# HELP cuidaelmango_inicio_segundos Momento en que arrancó el proceso (epoch)",
+            "# TYPE cuidaelmango_inicio_segundos gauge",
+            f"cuidaelmango_inicio_segundos {self.inicio:.3f}",
+        ]
+        familias = (
+            ("cuidaelmango_request_segundos", "Duración de los requests", self._requests,
+             ("metodo", "ruta", "estado")),
+            ("cuidaelmango_etapa_segundos", "Tiempo por etapa dentro de un request", self._etapas,
+             ("ruta", "etapa")),
+            ("cuidaelmango_etapa_llamadas", "Veces que se entró a una etapa en un request", self._llamadas,
+             ("ruta", "etapa")),
+            ("cuidaelmango_contador", "Contadores por request (candidatos, filas, ...)", self._contadores,
+             ("ruta", "nombre")),
+        )
+
+        with self._lock:
+            for nombre, ayuda, tabla, claves in familias:
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} histogram")
+                for valores, histograma in sorted(tabla.items()):
+                    etiquetas = ",".join(f'{c}="{_etiqueta(v)}"' for c, v in zip(claves, valores))
+                    lineas.extend(histograma.lineas(nombre, etiquetas))
+
+        return "\n".join(lineas) + "\n"
+
+
+# ============================================
+# PERFILADOR POR MUESTREO (OPCIONAL)
+# ============================================
+
+class MuestreadorPerfil:
+    """
+    Perfilador por muestreo para requests lentos
+
+    Un thread toma los stacks de todos los threads cada `intervalo` mientras haya
+    requests en vuelo, y cada muestra se cuenta en todos ellos. Con requests
+    concurrentes un perfil incluye trabajo de los otros: sirve para ver dónde se
+    va el tiempo del proceso mientras un request fue lento, no como perfil exacto.
+    """
+
+    def __init__(self, umbral_segundos, intervalo=0.005, directorio=DIRECTORIO_PERFILES,
+                 maximo_archivos=MAXIMO_PERFILES):
+        self.umbral = umbral_segundos
+        self.intervalo = intervalo
+        self.directorio = directorio
+        self.maximo_archivos = maximo_archivos
+        self._activos = {}
+        self._siguiente = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _arrancar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._muestrear, name="muestreador-perfil", daemon=True)
+            self._thread.start()
+
+    def comenzar(self):
+        """
+        Returns:
+            int: Token para terminar()
+        """
+        with self._lock:
+            self._arrancar()
+            self._siguiente += 1
+            self._activos[self._siguiente] = {}
+            return self._siguiente
+
+    def terminar(self, token, segundos, descripcion):
+        """
+        Cierra el perfil de un request y lo guarda si fue lento
+
+        Returns:
+            str: Ruta del archivo guardado, o None
+        """
+        with self._lock:
+            muestras = self._activos.pop(token, None)
+        if not muestras or segundos < self.umbral:
+            return None
+        return self._guardar(muestras, segundos, descripcion)
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        while True:
+            time.sleep(self.intervalo)
+            if not self._activos:
+                continue
+
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                funciones = []
+                while frame is not None and len(funciones) < PROFUNDIDAD_PERFIL:
+                    codigo = frame.f_code
+                    funciones.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                    frame = frame.f_back
+                if funciones[:2] == IDLE_THREADPOOL:
+                    # Worker del threadpool esperando trabajo
+                    continue
+                stacks.append(";".join(reversed(funciones)))
+
+            with self._lock:
+                for muestras in self._activos.values():
+                    for stack in stacks:
+                        muestras[stack] = muestras.get(stack, 0) + 1
+
+    def _guardar(self, muestras, segundos, descripcion):
+        os.makedirs(self.directorio, exist_ok=True)
+        nombre = "".join(c if c.isalnum() else "_" for c in descripcion).strip("_")
+        ruta = os.path.join(
+            self.directorio, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{int(segundos * 1000)}ms-{nombre}.folded"
+        )
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            for stack, cantidad in sorted(muestras.items(), key=lambda item: -item[1]):
+                archivo.write(f"{stack} {cantidad}\n")
+
+        archivos = sorted(f for f in os.listdir(self.directorio) if f.endswith(".folded"))
+        for viejo in archivos[:-self.maximo_archivos]:
+            try:
+                os.remove(os.path.join(self.directorio, viejo))
+            except OSError:
+                pass
+        return ruta
+
+
+def muestreador_configurado():
+    """MuestreadorPerfil según CUIDAELMANGO_PERFIL_LENTO_MS (None si no está activado)"""
+    umbral_ms = get_variable("CUIDAELMANGO_PERFIL_LENTO_MS")
+    if not umbral_ms:
+        return None
+    intervalo_ms = float(get_variable("CUIDAELMANGO_PERFIL_INTERVALO_MS", "5"))
+    return MuestreadorPerfil(float(umbral_ms) / 1000, intervalo=intervalo_ms / 1000)
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI: una Medicion por request, Server-Timing e histogramas
+
+    El header lleva las etapas cerradas antes de mandar los headers (en las
+    respuestas normales, todo el request: el cuerpo ya se serializó). En los
+    streams las etapas posteriores solo llegan a los histogramas.
+    """
+
+    def __init__(self, app, registro, muestreador=None):
+        self.app = app
+        self.registro = registro
+        self.muestreador = muestreador
+        self._rutas = None
+
+    def _ruta(self, scope):
+        """Plantilla de la ruta (/productos/{producto_id}/cluster), no la URL concreta"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return RUTA_DESCONOCIDA
+        if self._rutas is None or endpoint not in self._rutas:
+            self._rutas = {
+                getattr(ruta, "endpoint", None): ruta.path
+                for ruta in getattr(scope.get("app"), "routes", [])
+            }
+        return self._rutas.get(endpoint, RUTA_DESCONOCIDA)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        medicion = Medicion()
+        token_contexto = _medicion_actual.set(medicion)
+        token_perfil = self.muestreador.comenzar() if self.muestreador else None
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                headers = list(mensaje.get("headers", []))
+                headers.append((b"server-timing", medicion.server_timing().encode("latin-1")))
+                mensaje = {**mensaje, "headers": headers}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _medicion_actual.reset(token_contexto)
+            segundos = time.perf_counter() - medicion.inicio
+            ruta = self._ruta(scope)
+            self.registro.registrar(scope["method"], ruta, estado, segundos, medicion)
+            if token_perfil is not None:
+                self.muestreador.terminar(token_perfil, segundos, f"{scope['method']} {ruta}")
@@ -0,0 +1,11 @@
+-- Features de matching precalculadas al ingestar (ver utils.calcular_features_match)
+ALTER TABLE productos
+    ADD COLUMN IF NOT EXISTS peso_base double precision,
+    ADD COLUMN IF NOT EXISTS unidad_familia text,
+    ADD COLUMN IF NOT EXISTS marca_id text,
+    ADD COLUMN IF NOT EXISTS variante_id text,
+    ADD COLUMN IF NOT EXISTS firma_nombre text;
+
+-- Filtro de candidatos por marca canónica dentro de cada tienda
+CREATE INDEX IF NOT EXISTS idx_productos_tienda_marca_id
+    ON productos (tienda, marca_id, unidad_familia, peso_base);
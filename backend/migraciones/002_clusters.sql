@@ -0,0 +1,7 @@
+-- Cluster de productos equivalentes entre tiendas (ver clusters.py)
+ALTER TABLE productos
+    ADD COLUMN IF NOT EXISTS cluster_id bigint;
+
+CREATE INDEX IF NOT EXISTS idx_productos_cluster
+    ON productos (cluster_id)
+    WHERE cluster_id IS NOT NULL;
@@ -0,0 +1,9 @@
+-- Promo estructurada y precio efectivo por unidad (ver promociones.py)
+ALTER TABLE productos
+    ADD COLUMN IF NOT EXISTS promo_tipo text,
+    ADD COLUMN IF NOT EXISTS promo_cantidad integer,
+    ADD COLUMN IF NOT EXISTS promo_factor double precision,
+    ADD COLUMN IF NOT EXISTS precio_efectivo double precision;
+
+CREATE INDEX IF NOT EXISTS idx_productos_precio_efectivo
+    ON productos (tienda, precio_efectivo);
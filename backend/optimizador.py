@@ -0,0 +1,166 @@
+"""
+Optimizador de compra para CuidaElMango
+Elige en qué tiendas comprar cada producto para gastar lo menos posible
+"""
+
+from math import comb, inf
+
+
+# Hasta esta cantidad de subconjuntos de tiendas se busca el óptimo exacto
+MAX_SUBCONJUNTOS_EXACTO = 5000
+
+
+def optimizar_compra(precios, tiendas, max_tiendas=2, costo_fijo_tienda=0):
+    """
+    Calcula el plan de compra más barato
+
+    Un plan es un conjunto de hasta max_tiendas tiendas; cada producto se compra
+    en la más barata del conjunto y cada tienda usada suma costo_fijo_tienda
+    (envío, viaje). Primero se minimizan los productos faltantes y después el total.
+
+    - Pocas tiendas: búsqueda exacta en profundidad sobre los subconjuntos,
+      arrastrando el vector de mínimos (cada nodo cuesta O(productos))
+    - Muchas tiendas: greedy agregando la tienda que más baja el costo
+      y después mejora local intercambiando tiendas
+
+    Args:
+        precios (list): Por producto, lista de precios alineada con tiendas (None = no disponible)
+        tiendas (list): Nombres de las tiendas
+        max_tiendas (int): Máximo de tiendas en las que se divide la compra
+        costo_fijo_tienda (float): Costo fijo por cada tienda usada
+
+    Returns:
+        dict: Mejor plan y mejor plan de una sola tienda (para calcular el ahorro)
+    """
+    max_tiendas = max(1, min(max_tiendas, len(tiendas)))
+
+    # Columnas por tienda, con inf donde no hay precio
+    columnas = [
+        [p[t] if p[t] is not None else inf for p in precios]
+        for t in range(len(tiendas))
+    ]
+
+    subconjuntos = sum(comb(len(tiendas), k) for k in range(1, max_tiendas + 1))
+    if subconjuntos <= MAX_SUBCONJUNTOS_EXACTO:
+        metodo = "exacto"
+        mejor, mejor_una = _buscar_exacto(columnas, max_tiendas, costo_fijo_tienda)
+    else:
+        metodo = "heuristico"
+        mejor, mejor_una = _buscar_heuristico(columnas, max_tiendas, costo_fijo_tienda)
+
+    return {
+        "metodo": metodo,
+        "plan": _armar_plan(mejor, columnas, tiendas, costo_fijo_tienda),
+        "mejor_tienda_unica": _armar_plan(mejor_una, columnas, tiendas, costo_fijo_tienda),
+    }
+
+
+def _evaluar(minimos, cantidad_tiendas, costo_fijo_tienda):
+    faltantes = 0
+    total = 0
+    for precio in minimos:
+        if precio == inf:
+            faltantes += 1
+        else:
+            total += precio
+    return (faltantes, total + cantidad_tiendas * costo_fijo_tienda)
+
+
+def _buscar_exacto(columnas, max_tiendas, costo_fijo_tienda):
+    mejor = (None, (inf, inf))
+    mejor_una = (None, (inf, inf))
+    cantidad_productos = len(columnas[0]) if columnas else 0
+
+    def recorrer(desde, elegidas, minimos):
+        nonlocal mejor, mejor_una
+        for t in range(desde, len(columnas)):
+            nuevos = [min(a, b) for a, b in zip(minimos, columnas[t])]
+            conjunto = elegidas + (t,)
+            costo = _evaluar(nuevos, len(conjunto), costo_fijo_tienda)
+
+            if costo < mejor[1]:
+                mejor = (conjunto, costo)
+            if len(conjunto) == 1 and costo < mejor_una[1]:
+                mejor_una = (conjunto, costo)
+
+            if len(conjunto) < max_tiendas:
+                recorrer(t + 1, conjunto, nuevos)
+
+    recorrer(0, (), [inf] * cantidad_productos)
+    return mejor[0], mejor_una[0]
+
+
+def _costo_conjunto(columnas, conjunto, costo_fijo_tienda):
+    minimos = [min(precios) for precios in zip(*(columnas[t] for t in conjunto))]
+    return _evaluar(minimos, len(conjunto), costo_fijo_tienda)
+
+
+def _buscar_heuristico(columnas, max_tiendas, costo_fijo_tienda):
+    costos_una = [
+        (_costo_conjunto(columnas, (t,), costo_fijo_tienda), t)
+        for t in range(len(columnas))
+    ]
+    mejor_una = min(costos_una)[1]
+
+    # Greedy: agregar la tienda que más mejora mientras mejore
+    elegidas = (mejor_una,)
+    costo_actual = _costo_conjunto(columnas, elegidas, costo_fijo_tienda)
+    while len(elegidas) < max_tiendas:
+        opciones = [
+            (_costo_conjunto(columnas, elegidas + (t,), costo_fijo_tienda), t)
+            for t in range(len(columnas)) if t not in elegidas
+        ]
+        costo, t = min(opciones)
+        if costo >= costo_actual:
+            break
+        elegidas, costo_actual = elegidas + (t,), costo
+
+    # Mejora local: cambiar una tienda elegida por otra mientras mejore
+    mejoro = True
+    while mejoro:
+        mejoro = False
+        intercambios = [
+            (sale, entra)
+            for sale in elegidas
+            for entra in range(len(columnas)) if entra not in elegidas
+        ]
+        for sale, entra in intercambios:
+            candidato = tuple(sorted(set(elegidas) - {sale} | {entra}))
+            costo = _costo_conjunto(columnas, candidato, costo_fijo_tienda)
+            if costo < costo_actual:
+                elegidas, costo_actual, mejoro = candidato, costo, True
+                break
+
+    return elegidas, (mejor_una,)
+
+
+def _armar_plan(conjunto, columnas, tiendas, costo_fijo_tienda):
+    if not conjunto:
+        return None
+
+    cantidad_productos = len(columnas[0]) if columnas else 0
+    asignacion = []
+    totales = {tiendas[t]: 0 for t in conjunto}
+    faltantes = 0
+
+    for i in range(cantidad_productos):
+        precio, t = min((columnas[t][i], t) for t in conjunto)
+        if precio == inf:
+            asignacion.append(None)
+            faltantes += 1
+        else:
+            asignacion.append(tiendas[t])
+            totales[tiendas[t]] += precio
+
+    # Una tienda del conjunto sin productos asignados no se visita
+    totales = {tienda: round(total, 2) for tienda, total in totales.items() if tienda in asignacion}
+    costo_fijo = len(totales) * costo_fijo_tienda
+
+    return {
+        "tiendas": list(totales),
+        "asignacion": asignacion,
+        "totales_por_tienda": totales,
+        "costo_fijo": costo_fijo,
+        "total": round(sum(totales.values()) + costo_fijo, 2),
+        "productos_faltantes": faltantes,
+    }
@@ -0,0 +1,427 @@
+"""
+Planificador de scraping para CuidaElMango
+
+Aprende cada cuánto cambian los precios de cada página (tienda, sección,
+página) y arma planes que dan la misma frescura con menos páginas scrapeadas.
+
+- Modelo: los productos de una página cambian como un proceso de Poisson con
+  tasa λ (cambios por producto por hora). Cada visita observa n productos de
+  los que k cambiaron (o son nuevos) en las I horas desde la anterior; se
+  estima λ̂ = -ln((n - k + 0.5) / (n + 0.5)) / I (estimador con corrección de
+  sesgo para cambios detectados por visita) y se suaviza con un promedio móvil
+- Frescura de una página visitada cada 1/f horas: F = (f/λ)(1 - e^(-λ/f)).
+  Con un presupuesto de páginas por día se eligen las frecuencias que
+  maximizan la frescura promedio por producto (multiplicador de Lagrange +
+  bisección). Las páginas que cambian más rápido de lo que se puede seguir
+  reciben menos visitas, no más: es lo que maximiza la frescura total
+- Plan: las páginas vencidas (pasó su intervalo), ordenadas por cambios
+  esperados desde la última visita. Las páginas nunca vistas van primero
+
+Uso:
+    python planificador.py --presupuesto 2000        # plan actual y frescura estimada
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+from catalogo import DIR_COMPARTIDO, WAL_COMPARTIDO
+
+
+RUTA_PLANIFICADOR = os.path.join(DIR_COMPARTIDO, "planificador.sqlite")
+
+# Peso de la última estimación de tasa en el promedio móvil
+ALFA_TASA = 0.3
+
+# Tasa supuesta (cambios por producto por hora) para páginas sin historia
+TASA_INICIAL = 0.01
+
+# Intervalos permitidos entre visitas de una página (horas): aunque no cambie
+# nunca se vuelve a mirar cada tanto, y nunca más seguido que el mínimo
+INTERVALO_MINIMO = 1
+INTERVALO_MAXIMO = 24 * 14
+
+ESQUEMA = """
+-- tasa: cambios por producto por hora (NULL hasta la segunda visita)
+-- vacia: la última visita no trajo productos (fin de la sección)
+CREATE TABLE IF NOT EXISTS paginas (
+    tienda TEXT NOT NULL,
+    seccion TEXT NOT NULL,
+    pagina INTEGER NOT NULL,
+    tasa REAL,
+    productos REAL NOT NULL DEFAULT 0,
+    ultima_visita REAL NOT NULL,
+    visitas INTEGER NOT NULL DEFAULT 0,
+    vacia INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tienda, seccion, pagina)
+) WITHOUT ROWID;
+"""
+
+
+def estimar_tasa(productos, cambios, horas):
+    """
+    Tasa de cambio por producto por hora a partir de una visita
+
+    Args:
+        productos (int): Productos vistos en la página
+        cambios (int): Cuántos cambiaron de precio/promo o son nuevos
+        horas (float): Horas desde la visita anterior
+
+    Returns:
+        float: λ estimada (None si la visita no alcanza para estimar)
+    """
+    if productos <= 0 or horas <= 0:
+        return None
+    cambios = min(cambios, productos)
+    return -math.log((productos - cambios + 0.5) / (productos + 0.5)) / horas
+
+
+def frescura(tasa, frecuencia):
+    """Fracción esperada de productos al día visitando `frecuencia` veces por hora"""
+    if tasa <= 0:
+        return 1.0
+    if frecuencia <= 0:
+        return 0.0
+    r = tasa / frecuencia
+    return (1 - math.exp(-r)) / r
+
+
+# g(r) = 1 - e^(-r)(1 + r): la derivada de la frescura respecto de f es g(λ/f)/λ.
+# Tabla para invertir g sin resolver una ecuación por página y por iteración.
+_TABLA_R = [10 ** (i / 200) for i in range(-1000, 401)]  # 1e-5 .. 1e2
+_TABLA_G = [1 - math.exp(-r) * (1 + r) for r in _TABLA_R]
+
+
+def _invertir_g(valor):
+    """r tal que g(r) = valor (None si valor >= 1: no conviene visitar)"""
+    if valor >= _TABLA_G[-1]:
+        return None
+    i = bisect_left(_TABLA_G, valor)
+    if i == 0:
+        return _TABLA_R[0]
+    g0, g1 = _TABLA_G[i - 1], _TABLA_G[i]
+    r0, r1 = _TABLA_R[i - 1], _TABLA_R[i]
+    return r0 + (r1 - r0) * (valor - g0) / (g1 - g0)
+
+
+def optimizar_frecuencias(paginas, presupuesto_hora):
+    """
+    Frecuencias de visita que maximizan la frescura ponderada con un presupuesto
+
+    Maximiza Σ wᵢ F(λᵢ, fᵢ) sujeto a Σ fᵢ = presupuesto (cada visita cuesta una
+    página). Para un multiplicador μ la frecuencia óptima cumple
+    wᵢ g(λᵢ/fᵢ)/λᵢ = μ; se busca μ por bisección hasta gastar el presupuesto.
+
+    Args:
+        paginas (list): Dicts con "tasa" (λ por hora) y "peso" (productos)
+        presupuesto_hora (float): Páginas por hora
+
+    Returns:
+        list: Frecuencia (visitas por hora) de cada página, en el mismo orden
+    """
+    f_min = 1 / INTERVALO_MAXIMO
+    f_max = 1 / INTERVALO_MINIMO
+
+    def frecuencias(mu):
+        resultado = []
+        for pagina in paginas:
+            tasa, peso = pagina["tasa"], pagina["peso"]
+            if tasa <= 0 or peso <= 0:
+                resultado.append(f_min)
+                continue
+            r = _invertir_g(mu * tasa / peso)
+            f = f_min if r is None else tasa / r
+            resultado.append(min(max(f, f_min), f_max))
+        return resultado
+
+    # Aun visitando todo lo más seguido posible sobra presupuesto
+    if len(paginas) * f_max <= presupuesto_hora:
+        return [f_max] * len(paginas)
+    # Ni siquiera alcanza para el mínimo
+    if len(paginas) * f_min >= presupuesto_hora:
+        return [f_min] * len(paginas)
+
+    # μ chico → frecuencias altas; se busca en escala logarítmica
+    bajo, alto = -30.0, 30.0
+    for _ in range(60):
+        medio = (bajo + alto) / 2
+        if sum(frecuencias(math.exp(medio))) > presupuesto_hora:
+            bajo = medio
+        else:
+            alto = medio
+    return frecuencias(math.exp(alto))
+
+
+class PlanificadorScraping:
+    """
+    Tasas de cambio por página + planes de refresco
+
+    Una conexión por thread, igual que la réplica y el histórico.
+    """
+
+    def __init__(self, ruta=RUTA_PLANIFICADOR, wal=WAL_COMPARTIDO):
+        self.ruta = ruta
+        self.wal = wal
+        self._local = threading.local()
+        self._esquema_creado = False
+        self._lock = threading.Lock()
+
+    def _crear_esquema(self):
+        with self._lock:
+            if self._esquema_creado:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            with sqlite3.connect(self.ruta) as conexion:
+                conexion.executescript(ESQUEMA)
+            self._esquema_creado = True
+
+    def conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            if not self._esquema_creado:
+                self._crear_esquema()
+            conexion = sqlite3.connect(self.ruta, timeout=30, check_same_thread=False)
+            conexion.row_factory = sqlite3.Row
+            conexion.execute(f"PRAGMA journal_mode={'WAL' if self.wal else 'DELETE'}")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    # ============================================
+    # APRENDIZAJE
+    # ============================================
+
+    def registrar_visita(self, tienda, seccion, pagina, productos, cambios, momento=None):
+        """
+        Registra lo que vio un scrape de una página
+
+        La primera visita solo fija la base (todos los productos serían "nuevos").
+
+        Args:
+            tienda, seccion, pagina: Página scrapeada
+            productos (int): Productos guardados (0 = la sección termina acá)
+            cambios (int): Productos con precio/promo distinto o nuevos
+            momento (float): Epoch de la visita (default: ahora)
+        """
+        momento = momento or time.time()
+        conexion = self.conexion()
+        with conexion:
+            anterior = conexion.execute(
+                "SELECT tasa, productos, ultima_visita, vacia FROM paginas "
+                "WHERE tienda = ? AND seccion = ? AND pagina = ?",
+                (tienda, seccion, pagina)
+            ).fetchone()
+
+            tasa = anterior["tasa"] if anterior else None
+            promedio = productos
+            if anterior and productos > 0 and not anterior["vacia"]:
+                estimada = estimar_tasa(productos, cambios, (momento - anterior["ultima_visita"]) / 3600)
+                if estimada is not None:
+                    tasa = estimada if tasa is None else (1 - ALFA_TASA) * tasa + ALFA_TASA * estimada
+                promedio = (1 - ALFA_TASA) * anterior["productos"] + ALFA_TASA * productos
+
+            conexion.execute(
+                "INSERT INTO paginas (tienda, seccion, pagina, tasa, productos, ultima_visita, visitas, vacia) "
+                "VALUES (?, ?, ?, ?, ?, ?, 1, ?) ON CONFLICT (tienda, seccion, pagina) DO UPDATE SET "
+                "tasa = excluded.tasa, productos = excluded.productos, "
+                "ultima_visita = excluded.ultima_visita, visitas = visitas + 1, vacia = excluded.vacia",
+                (tienda, seccion, pagina, tasa, promedio, momento, int(productos <= 0))
+            )
+
+    def tasas_secciones(self):
+        """
+        Tasa promedio por sección (ponderada por productos)
+
+        Returns:
+            dict: (tienda, seccion) -> {"tasa", "paginas", "productos"}
+        """
+        secciones = {}
+        for fila in self.conexion().execute(
+            "SELECT tienda, seccion, "
+            "SUM(tasa * productos) / NULLIF(SUM(CASE WHEN tasa IS NOT NULL THEN productos END), 0) AS tasa, "
+            "SUM(vacia = 0) AS paginas, SUM(productos) AS productos "
+            "FROM paginas GROUP BY tienda, seccion"
+        ):
+            secciones[(fila["tienda"], fila["seccion"])] = {
+                "tasa": fila["tasa"],
+                "paginas": fila["paginas"],
+                "productos": fila["productos"],
+            }
+        return secciones
+
+    # ============================================
+    # PLANES
+    # ============================================
+
+    def _paginas_activas(self):
+        """
+        Páginas a planificar con tasa y peso
+
+        De cada sección entran las páginas hasta la primera vacía inclusive
+        (esa se sigue visitando para ver si la sección creció, con el peso
+        promedio de una página de la sección).
+
+        Returns:
+            tuple: (páginas, siguientes) - siguientes: (tienda, seccion, pagina)
+                   sin visitar de las secciones que todavía no tienen fin conocido
+        """
+        secciones = self.tasas_secciones()
+        paginas = []
+        cortadas = set()
+        ultimas = {}
+        for fila in self.conexion().execute(
+            "SELECT tienda, seccion, pagina, tasa, productos, ultima_visita, vacia FROM paginas "
+            "ORDER BY tienda, seccion, pagina"
+        ):
+            clave = (fila["tienda"], fila["seccion"])
+            if clave in cortadas:
+                continue
+            ultimas[clave] = fila["pagina"]
+
+            seccion = secciones[clave]
+            tasa = fila["tasa"]
+            if tasa is None:
+                tasa = seccion["tasa"] if seccion["tasa"] is not None else TASA_INICIAL
+
+            peso = fila["productos"]
+            if fila["vacia"]:
+                cortadas.add(clave)
+                peso = (seccion["productos"] or 0) / max(seccion["paginas"] or 0, 1)
+
+            paginas.append({
+                "tienda": fila["tienda"],
+                "seccion": fila["seccion"],
+                "pagina": fila["pagina"],
+                "tasa": tasa,
+                "peso": peso,
+                "ultima_visita": fila["ultima_visita"],
+            })
+
+        siguientes = [
+            (tienda, seccion, pagina + 1)
+            for (tienda, seccion), pagina in ultimas.items()
+            if (tienda, seccion) not in cortadas
+        ]
+        return paginas, siguientes
+
+    def intervalos(self, presupuesto_dia, paginas=None):
+        """
+        Intervalo óptimo de cada página con un presupuesto de páginas por día
+
+        Args:
+            presupuesto_dia (float): Páginas por día que se pueden scrapear
+            paginas (list): Páginas de _paginas_activas (default: se leen)
+
+        Returns:
+            list: Dicts de página con "intervalo_horas" y "frescura" esperada
+        """
+        if paginas is None:
+            paginas, _ = self._paginas_activas()
+        frecuencias = optimizar_frecuencias(paginas, presupuesto_dia / 24)
+        for pagina, frecuencia in zip(paginas, frecuencias):
+            pagina["intervalo_horas"] = round(1 / frecuencia, 2)
+            pagina["frescura"] = round(frescura(pagina["tasa"], frecuencia), 4)
+        return paginas
+
+    def plan(self, presupuesto_dia, secciones=None, momento=None, limite=None):
+        """
+        Páginas a scrapear ahora, de más a menos urgente
+
+        Args:
+            presupuesto_dia (float): Páginas por día que se pueden scrapear
+            secciones (dict): tienda -> secciones a planificar (default: todas las
+                              conocidas); las que nunca se visitaron entran primero
+                              (página 1), junto con la página siguiente de las
+                              secciones sin fin conocido
+            momento (float): Epoch de referencia (default: ahora)
+            limite (int): Máximo de páginas del plan
+
+        Returns:
+            list: Dicts {tienda, seccion, pagina, prioridad, intervalo_horas, tasa}
+                  (prioridad: cambios esperados desde la última visita; None si nunca se visitó)
+        """
+        momento = momento or time.time()
+        paginas, siguientes = self._paginas_activas()
+        if secciones is not None:
+            elegidas = {(tienda, seccion) for tienda, lista in secciones.items() for seccion in lista}
+            paginas = [p for p in paginas if (p["tienda"], p["seccion"]) in elegidas]
+            siguientes = [s for s in siguientes if s[:2] in elegidas]
+
+        conocidas = set()
+        vencidas = []
+
+        for pagina in self.intervalos(presupuesto_dia, paginas):
+            conocidas.add((pagina["tienda"], pagina["seccion"]))
+            horas = (momento - pagina["ultima_visita"]) / 3600
+            if horas < pagina["intervalo_horas"]:
+                continue
+            vencidas.append({
+                "tienda": pagina["tienda"],
+                "seccion": pagina["seccion"],
+                "pagina": pagina["pagina"],
+                "prioridad": round(pagina["peso"] * (1 - math.exp(-pagina["tasa"] * horas)), 3),
+                "intervalo_horas": pagina["intervalo_horas"],
+                "tasa": pagina["tasa"],
+            })
+
+        sin_visitar = siguientes + [
+            (tienda, seccion, 1)
+            for tienda, lista in (secciones or {}).items()
+            for seccion in lista
+            if (tienda, seccion) not in conocidas
+        ]
+        nuevas = [
+            {"tienda": tienda, "seccion": seccion, "pagina": pagina, "prioridad": None,
+             "intervalo_horas": None, "tasa": None}
+            for tienda, seccion, pagina in sin_visitar
+        ]
+
+        vencidas.sort(key=lambda p: -p["prioridad"])
+        plan = nuevas + vencidas
+        return plan[:limite] if limite else plan
+
+    def comparar_con_uniforme(self, presupuesto_dia):
+        """
+        Frescura promedio (por producto) del plan óptimo vs visitar todo con el mismo intervalo
+
+        Returns:
+            dict: {"optima", "uniforme", "paginas", "presupuesto_dia"}
+        """
+        paginas = self.intervalos(presupuesto_dia)
+        peso_total = sum(p["peso"] for p in paginas) or 1
+        uniforme = presupuesto_dia / 24 / max(len(paginas), 1)
+        return {
+            "optima": round(sum(p["peso"] * p["frescura"] for p in paginas) / peso_total, 4),
+            "uniforme": round(sum(p["peso"] * frescura(p["tasa"], uniforme) for p in paginas) / peso_total, 4),
+            "paginas": len(paginas),
+            "presupuesto_dia": presupuesto_dia,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Plan de scraping según la volatilidad de cada página")
+    parser.add_argument("--presupuesto", type=float, default=2000, help="Páginas por día")
+    parser.add_argument("--limite", type=int, default=30, help="Páginas del plan a mostrar")
+    args = parser.parse_args()
+
+    planificador = PlanificadorScraping()
+
+    print("Tasas por sección (cambios por producto por día):")
+    for (tienda, seccion), datos in sorted(
+        planificador.tasas_secciones().items(), key=lambda item: -(item[1]["tasa"] or 0)
+    ):
+        tasa = f"{datos['tasa'] * 24:.3f}" if datos["tasa"] is not None else "   ?"
+        print(f"  {tienda:10} {seccion:15} {tasa}  ({datos['paginas']} páginas, {datos['productos']:.0f} productos)")
+
+    print(f"\nFrescura con {args.presupuesto:g} páginas/día: {planificador.comparar_con_uniforme(args.presupuesto)}")
+
+    print("\nPlan:")
+    for pagina in planificador.plan(args.presupuesto, limite=args.limite):
+        detalle = "nueva" if pagina["prioridad"] is None else \
+            f"prioridad {pagina['prioridad']}  cada {pagina['intervalo_horas']}h"
+        print(f"  {pagina['tienda']:10} {pagina['seccion']:15} p{pagina['pagina']:<4} {detalle}")
@@ -0,0 +1,128 @@
+"""
+Promociones para CuidaElMango
+
+Convierte el texto de la promo ("2DO AL 70%", "25% OFF", "3x2") en una regla
+estructurada al ingestar, para comparar por lo que realmente se paga.
+
+Toda regla se reduce a la misma forma: cada grupo de `cantidad` unidades se
+paga como `factor` unidades.
+- porcentaje: 25% OFF          → cantidad 1, factor 0.75
+- n-ésima unidad: 2DO AL 70%    → cantidad 2, factor 1.3
+- lleva/paga: 3x2               → cantidad 3, factor 2
+"""
+
+import re
+
+from utils import normalizar_texto
+
+
+# La n-ésima unidad con descuento: "2do al 70%", "2da unidad al 50%", "3° al 50"
+PATRON_N_UNIDAD = re.compile(
+    r'(\d+)\s*(?:do|da|ro|ra|to|ta|er|o|a|°)?\s*(?:unidad|un\.?)?\s*al\s*(\d+(?:[.,]\d+)?)\s*%?'
+)
+
+# Lleva N paga M: "3x2", "2 x 1", "lleva 3 paga 2"
+PATRON_LLEVA_PAGA = re.compile(r'(?<![\d.,])(\d+)\s*x\s*(\d+)(?![\d.,])|lleva\s*(\d+)\s*paga\s*(\d+)')
+
+# Descuento directo: "25% off", "-25%", "25% de descuento"
+PATRON_PORCENTAJE = re.compile(r'(\d+(?:[.,]\d+)?)\s*%')
+
+# Unidades máximas de un grupo de promo (evita leer "6 x 500g" como una promo)
+MAXIMO_GRUPO = 10
+
+
+def parsear_promo(texto):
+    """
+    Regla estructurada de una promo
+
+    Args:
+        texto (str): Texto de la promo tal como lo publica la tienda
+
+    Returns:
+        dict: {"tipo", "cantidad", "factor"} o None si no es una promo reconocible
+    """
+    texto = normalizar_texto(texto)
+    if not texto:
+        return None
+
+    match = PATRON_N_UNIDAD.search(texto)
+    if match:
+        unidad = int(match.group(1))
+        descuento = float(match.group(2).replace(',', '.'))
+        if 2 <= unidad <= MAXIMO_GRUPO and 0 < descuento <= 100:
+            return {
+                "tipo": "n_unidad",
+                "cantidad": unidad,
+                "factor": round(unidad - descuento / 100, 4)
+            }
+
+    match = PATRON_LLEVA_PAGA.search(texto)
+    if match:
+        lleva = int(match.group(1) or match.group(3))
+        paga = int(match.group(2) or match.group(4))
+        if 1 <= paga < lleva <= MAXIMO_GRUPO:
+            return {"tipo": "lleva_paga", "cantidad": lleva, "factor": float(paga)}
+
+    match = PATRON_PORCENTAJE.search(texto)
+    if match:
+        descuento = float(match.group(1).replace(',', '.'))
+        if 0 < descuento < 100:
+            return {"tipo": "porcentaje", "cantidad": 1, "factor": round(1 - descuento / 100, 4)}
+
+    return None
+
+
+def campos_promo(promo, precio):
+    """
+    Columnas de promo que se guardan con el producto
+
+    precio_efectivo es el precio por unidad comprando un grupo completo de la
+    promo (el precio normal si no hay promo).
+
+    Returns:
+        dict: promo_tipo, promo_cantidad, promo_factor, precio_efectivo
+    """
+    regla = parsear_promo(promo)
+    if regla is None:
+        return {
+            "promo_tipo": None,
+            "promo_cantidad": None,
+            "promo_factor": None,
+            "precio_efectivo": precio
+        }
+
+    return {
+        "promo_tipo": regla["tipo"],
+        "promo_cantidad": regla["cantidad"],
+        "promo_factor": regla["factor"],
+        "precio_efectivo": round(precio * regla["factor"] / regla["cantidad"], 2)
+    }
+
+
+def total_con_promo(precio, cantidad=1, promo_cantidad=None, promo_factor=None):
+    """
+    Lo que se paga por `cantidad` unidades aplicando la promo
+
+    Las unidades que no completan un grupo se pagan a precio normal.
+
+    Returns:
+        float: Total
+    """
+    if precio is None:
+        return None
+    if not promo_cantidad or promo_factor is None:
+        return round(precio * cantidad, 2)
+
+    grupos, resto = divmod(cantidad, promo_cantidad)
+    return round(precio * (grupos * promo_factor + resto), 2)
+
+
+# Función de test
+if __name__ == "__main__":
+    tests = ["2DO AL 70%", "25% OFF", "3x2", "Lleva 4 paga 3", "2da unidad al 50%", "Precio Regular", "-15%"]
+
+    for test in tests:
+        regla = parsear_promo(test)
+        print(f"{test:20} → {regla}")
+        if regla:
+            print(f"{'':20}   2 unidades de $1000: ${total_con_promo(1000, 2, regla['cantidad'], regla['factor'])}")
@@ -0,0 +1,365 @@
+"""
+Réplica local (SQLite) del catálogo para CuidaElMango
+Copia productos y equivalencias de Supabase y sincroniza por ultima_actualizacion
+"""
+
+import os
+import sqlite3
+import threading
+
+from clusters import ClustersProductos
+from promociones import campos_promo
+from utils import calcular_features_match, normalizar_texto
+
+
+# Columnas de productos que se copian a la réplica
+COLUMNAS_REPLICA = [
+    "id", "nombre", "nombre_normalizado", "nombre_limpio", "tienda", "categoria",
+    "marca", "peso", "peso_unidad", "cantidad_unidades", "variante",
+    "precio", "promo", "url", "imagen_url", "ultima_actualizacion",
+    # Features de matching (calculadas al ingestar)
+    "peso_base", "unidad_familia", "marca_id", "variante_id", "firma_nombre",
+    # Cluster de equivalentes (ver clusters.py)
+    "cluster_id",
+    # Promo estructurada (ver promociones.py)
+    "promo_tipo", "promo_cantidad", "promo_factor", "precio_efectivo",
+]
+
+# Columnas agregadas después de la primera versión del esquema: nombre -> tipo
+COLUMNAS_AGREGADAS = {
+    "peso_base": "REAL",
+    "unidad_familia": "TEXT",
+    "marca_id": "TEXT",
+    "variante_id": "TEXT",
+    "firma_nombre": "TEXT",
+    "cluster_id": "INTEGER",
+    "promo_tipo": "TEXT",
+    "promo_cantidad": "INTEGER",
+    "promo_factor": "REAL",
+    "precio_efectivo": "REAL",
+}
+
+COLUMNAS_EQUIVALENCIAS = ["producto_a_id", "producto_b_id", "confianza", "corregido_por_usuario"]
+
+# Filas por pedido al sincronizar
+PAGINA_SYNC = 1000
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    nombre_normalizado TEXT,
+    nombre_limpio TEXT,
+    tienda TEXT NOT NULL,
+    categoria TEXT,
+    marca TEXT,
+    peso REAL,
+    peso_unidad TEXT,
+    cantidad_unidades INTEGER,
+    variante TEXT,
+    precio REAL,
+    promo TEXT,
+    url TEXT,
+    imagen_url TEXT,
+    ultima_actualizacion TEXT,
+    peso_base REAL,
+    unidad_familia TEXT,
+    marca_id TEXT,
+    variante_id TEXT,
+    firma_nombre TEXT,
+    cluster_id INTEGER,
+    promo_tipo TEXT,
+    promo_cantidad INTEGER,
+    promo_factor REAL,
+    precio_efectivo REAL
+);
+
+-- Mismo orden que los filtros de buscar_candidatos
+CREATE INDEX IF NOT EXISTS idx_productos_matching
+    ON productos (tienda, marca, categoria, peso);
+
+CREATE INDEX IF NOT EXISTS idx_productos_actualizacion
+    ON productos (ultima_actualizacion);
+
+-- Trigramas: soporta búsqueda por subcadena como el ilike '%...%' de Supabase
+CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5 (
+    nombre_normalizado,
+    content='productos',
+    content_rowid='id',
+    tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS productos_ai AFTER INSERT ON productos BEGIN
+    INSERT INTO productos_fts (rowid, nombre_normalizado) VALUES (new.id, new.nombre_normalizado);
+END;
+
+CREATE TRIGGER IF NOT EXISTS productos_ad AFTER DELETE ON productos BEGIN
+    INSERT INTO productos_fts (productos_fts, rowid, nombre_normalizado)
+        VALUES ('delete', old.id, old.nombre_normalizado);
+END;
+
+CREATE TRIGGER IF NOT EXISTS productos_au AFTER UPDATE ON productos BEGIN
+    INSERT INTO productos_fts (productos_fts, rowid, nombre_normalizado)
+        VALUES ('delete', old.id, old.nombre_normalizado);
+    INSERT INTO productos_fts (rowid, nombre_normalizado) VALUES (new.id, new.nombre_normalizado);
+END;
+
+CREATE TABLE IF NOT EXISTS equivalencias (
+    producto_a_id INTEGER NOT NULL,
+    producto_b_id INTEGER NOT NULL,
+    confianza REAL,
+    corregido_por_usuario INTEGER,
+    PRIMARY KEY (producto_a_id, producto_b_id)
+);
+
+CREATE TABLE IF NOT EXISTS estado (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+
+class ReplicaCatalogo:
+    """
+    Réplica de solo lectura para la API
+
+    Una conexión por thread (los endpoints consultan desde el threadpool);
+    WAL permite leer mientras corre una sincronización.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._esquema_creado = False
+        self._lock = threading.Lock()
+
+    def _crear_esquema(self):
+        # Al primer uso, no al construir (importar la app no toca el disco)
+        with self._lock:
+            if self._esquema_creado:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            with sqlite3.connect(self.ruta) as conexion:
+                conexion.executescript(ESQUEMA)
+                self._migrar(conexion)
+            self._esquema_creado = True
+
+    def _migrar(self, conexion):
+        # Réplicas creadas con un esquema anterior: agregar las columnas que falten
+        existentes = {fila[1] for fila in conexion.execute("PRAGMA table_info(productos)")}
+        for columna, tipo in COLUMNAS_AGREGADAS.items():
+            if columna not in existentes:
+                conexion.execute(f"ALTER TABLE productos ADD COLUMN {columna} {tipo}")
+
+        # Después de migrar, porque en réplicas viejas la columna recién se agregó
+        conexion.execute(
+            "CREATE INDEX IF NOT EXISTS idx_productos_cluster ON productos (cluster_id) "
+            "WHERE cluster_id IS NOT NULL"
+        )
+        conexion.execute(
+            "CREATE INDEX IF NOT EXISTS idx_productos_precio_efectivo ON productos (tienda, precio_efectivo)"
+        )
+
+    def conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            if not self._esquema_creado:
+                self._crear_esquema()
+            conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+            conexion.row_factory = sqlite3.Row
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    # ============================================
+    # SINCRONIZACIÓN
+    # ============================================
+
+    def watermark(self):
+        fila = self.conexion().execute(
+            "SELECT valor FROM estado WHERE clave = 'watermark_productos'"
+        ).fetchone()
+        return fila["valor"] if fila else None
+
+    def sincronizar(self, cliente):
+        """
+        Trae de Supabase los productos actualizados desde el último watermark
+        y recarga las equivalencias
+
+        Se pagina por keyset sobre (ultima_actualizacion, id): un offset se
+        corre si mientras tanto se actualizan filas (pasan al final) y se
+        saltearía otras. La primera página arranca en el watermark inclusive,
+        así las filas con el mismo timestamp que no habían entrado en el sync
+        anterior no se pierden (las que ya estaban se vuelven a copiar igual).
+
+        Args:
+            cliente: Cliente de Supabase
+
+        Returns:
+            int: Productos copiados
+        """
+        watermark = self.watermark()
+        ultima = None
+        copiados = 0
+
+        while True:
+            query = cliente.table("productos").select(",".join(COLUMNAS_REPLICA))
+            if ultima is not None:
+                ts, producto_id = ultima
+                query = query.or_(
+                    f'ultima_actualizacion.gt."{ts}",'
+                    f'and(ultima_actualizacion.eq."{ts}",id.gt.{producto_id})'
+                )
+            elif watermark:
+                query = query.gte("ultima_actualizacion", watermark)
+
+            result = query.order("ultima_actualizacion").order("id") \
+                .limit(PAGINA_SYNC) \
+                .execute()
+
+            filas = result.data or []
+            self.guardar_productos(filas)
+            copiados += len(filas)
+
+            if len(filas) < PAGINA_SYNC:
+                break
+            ultima = (filas[-1]["ultima_actualizacion"], filas[-1]["id"])
+
+        self.sincronizar_equivalencias(cliente)
+        return copiados
+
+    def sincronizar_equivalencias(self, cliente):
+        filas = []
+        desde = 0
+
+        while True:
+            result = cliente.table("equivalencias").select(",".join(COLUMNAS_EQUIVALENCIAS)) \
+                .range(desde, desde + PAGINA_SYNC - 1) \
+                .execute()
+
+            filas.extend(result.data or [])
+
+            if not result.data or len(result.data) < PAGINA_SYNC:
+                break
+            desde += PAGINA_SYNC
+
+        conexion = self.conexion()
+        with conexion:
+            conexion.execute("DELETE FROM equivalencias")
+            conexion.executemany(
+                "INSERT OR REPLACE INTO equivalencias VALUES (?, ?, ?, ?)",
+                [tuple(fila.get(c) for c in COLUMNAS_EQUIVALENCIAS) for fila in filas]
+            )
+
+        self.recalcular_clusters()
+
+    def recalcular_clusters(self):
+        """
+        Recalcula cluster_id desde las equivalencias locales
+        (no depende de que el job de clusters haya corrido en Supabase)
+        """
+        clusters = ClustersProductos()
+        clusters.cargar(self.consultar(
+            "SELECT producto_a_id, producto_b_id, confianza, corregido_por_usuario FROM equivalencias"
+        ))
+
+        conexion = self.conexion()
+        with conexion:
+            conexion.execute("UPDATE productos SET cluster_id = NULL WHERE cluster_id IS NOT NULL")
+            conexion.executemany(
+                "UPDATE productos SET cluster_id = ? WHERE id = ?",
+                [(cluster_id, producto_id) for producto_id, cluster_id in clusters.asignaciones().items()]
+            )
+
+    def asignar_clusters(self, asignaciones):
+        conexion = self.conexion()
+        with conexion:
+            conexion.executemany(
+                "UPDATE productos SET cluster_id = ? WHERE id = ?",
+                [(cluster_id, producto_id) for producto_id, cluster_id in asignaciones.items()]
+            )
+
+    def guardar_productos(self, filas):
+        """
+        Inserta o actualiza productos y avanza el watermark
+        """
+        if not filas:
+            return
+
+        for fila in filas:
+            if not fila.get("nombre_normalizado"):
+                fila["nombre_normalizado"] = normalizar_texto(fila.get("nombre"))
+            if fila.get("unidad_familia") is None and fila.get("firma_nombre") is None:
+                # Fila sin backfill de features
+                fila.update(calcular_features_match(fila))
+            if fila.get("precio_efectivo") is None and fila.get("precio") is not None:
+                fila.update(campos_promo(fila.get("promo"), fila["precio"]))
+
+        columnas = ", ".join(COLUMNAS_REPLICA)
+        marcadores = ", ".join("?" for _ in COLUMNAS_REPLICA)
+        actualizar = ", ".join(f"{c} = excluded.{c}" for c in COLUMNAS_REPLICA if c != "id")
+
+        conexion = self.conexion()
+        with conexion:
+            conexion.executemany(
+                f"INSERT INTO productos ({columnas}) VALUES ({marcadores}) "
+                f"ON CONFLICT (id) DO UPDATE SET {actualizar}",
+                [tuple(fila.get(c) for c in COLUMNAS_REPLICA) for fila in filas]
+            )
+
+            ultima = max(fila["ultima_actualizacion"] or "" for fila in filas)
+            conexion.execute(
+                "INSERT INTO estado VALUES ('watermark_productos', ?) "
+                "ON CONFLICT (clave) DO UPDATE SET valor = max(valor, excluded.valor)",
+                (ultima,)
+            )
+
+    def guardar_equivalencia(self, producto_a_id, producto_b_id, confianza, corregido):
+        conexion = self.conexion()
+        with conexion:
+            conexion.execute(
+                "INSERT OR REPLACE INTO equivalencias VALUES (?, ?, ?, ?)",
+                (producto_a_id, producto_b_id, confianza, int(corregido))
+            )
+
+    def guardar_equivalencias(self, filas):
+        conexion = self.conexion()
+        with conexion:
+            conexion.executemany(
+                "INSERT OR REPLACE INTO equivalencias VALUES (?, ?, ?, ?)",
+                [
+                    (fila["producto_a_id"], fila["producto_b_id"], fila["confianza"],
+                     int(fila["corregido_por_usuario"]))
+                    for fila in filas
+                ]
+            )
+
+    def borrar_equivalencias(self, pares):
+        """Borra equivalencias (pares (a, b) en cualquiera de las dos orientaciones)"""
+        conexion = self.conexion()
+        with conexion:
+            conexion.executemany(
+                "DELETE FROM equivalencias WHERE (producto_a_id = ? AND producto_b_id = ?) "
+                "OR (producto_a_id = ? AND producto_b_id = ?)",
+                [(a, b, b, a) for a, b in pares]
+            )
+
+    # ============================================
+    # LECTURAS
+    # ============================================
+
+    def consultar(self, sql, parametros=()):
+        return [dict(fila) for fila in self.conexion().execute(sql, parametros)]
+
+
+# Sincronización manual: python replica.py [ruta]
+if __name__ == "__main__":
+    import sys
+    from catalogo import DATA_DIR
+    from database import get_supabase_admin
+
+    ruta = sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, "replica.sqlite")
+    replica = ReplicaCatalogo(ruta)
+    copiados = replica.sincronizar(get_supabase_admin())
+    print(f"✅ Réplica {ruta}: {copiados} productos sincronizados (watermark {replica.watermark()})")
@@ -0,0 +1,601 @@
+"""
+Acceso al catálogo para CuidaElMango
+Interfaz común para leer productos/equivalencias desde Supabase, la réplica local o memoria
+"""
+
+from bisect import bisect_right
+import heapq
+
+from replica import COLUMNAS_EQUIVALENCIAS, COLUMNAS_REPLICA
+from promociones import campos_promo
+from utils import calcular_features_match, normalizar_texto
+
+
+# Filas por pedido al recorrer el catálogo completo
+PAGINA_CATALOGO = 1000
+
+# Ids por consulta al buscar por lista (la URL de PostgREST y los parámetros de SQLite tienen límite)
+IDS_POR_CONSULTA = 200
+
+# Columnas por las que filtrar_productos puede ordenar (ascendente, sin dato al final)
+ORDENES_PRODUCTOS = ("precio_efectivo",)
+
+
+def _validar_orden(ordenar):
+    """
+    True si hay que ordenar
+
+    Raises:
+        ValueError: Si la columna no está en ORDENES_PRODUCTOS
+    """
+    if ordenar is None:
+        return False
+    if ordenar not in ORDENES_PRODUCTOS:
+        raise ValueError(f"No se puede ordenar por {ordenar} (opciones: {', '.join(ORDENES_PRODUCTOS)})")
+    return True
+
+
+def _lista_columnas(columnas):
+    lista = [c.strip() for c in columnas.split(",")]
+    desconocidas = [c for c in lista if c not in COLUMNAS_REPLICA]
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas: {desconocidas}")
+    return lista
+
+
+class RepositorioCatalogo:
+    """
+    Interfaz del catálogo
+
+    Todas las lecturas devuelven listas de dicts con las columnas pedidas
+    ("id,nombre,..." igual que un select de Supabase).
+    """
+
+    def verificar(self):
+        """Verifica que el almacenamiento responda"""
+        raise NotImplementedError
+
+    def filtrar_productos(self, columnas, tienda=None, marca=None, categoria=None,
+                          peso_min=None, peso_max=None, nombre_contiene=None, limit=10, ordenar=None):
+        """
+        Productos que cumplen todos los filtros dados
+
+        nombre_contiene busca como subcadena en nombre_normalizado; ordenar (una
+        de ORDENES_PRODUCTOS) ordena antes de aplicar el limit, así se
+        devuelven los primeros de todo el resultado y no de una página cualquiera
+        """
+        raise NotImplementedError
+
+    def obtener_productos(self, ids, columnas):
+        """Productos por id (en cualquier orden)"""
+        raise NotImplementedError
+
+    def listar_productos(self, columnas):
+        """Todo el catálogo, ordenado por id"""
+        raise NotImplementedError
+
+    def pagina_productos(self, columnas, despues_de=0, limit=PAGINA_CATALOGO,
+                         tienda=None, categoria=None, actualizados_desde=None):
+        """
+        Siguiente página del catálogo por keyset (id > despues_de, ordenado por id)
+
+        Recorrer con el último id de cada página cuesta lo mismo en la página
+        1 que en la 1000 (un offset recorre todas las filas anteriores).
+
+        actualizados_desde compara contra ultima_actualizacion (ISO 8601).
+        """
+        raise NotImplementedError
+
+    def listar_equivalencias(self):
+        """Todas las filas de equivalencias"""
+        raise NotImplementedError
+
+    def equivalencias_de(self, ids):
+        """Filas de equivalencias en las que aparece alguno de los productos (como a o como b)"""
+        raise NotImplementedError
+
+    def guardar_equivalencia(self, producto_a_id, producto_b_id, confianza=100, corregido=True):
+        """Inserta o actualiza una equivalencia"""
+        raise NotImplementedError
+
+    def guardar_equivalencias(self, filas):
+        """Inserta o actualiza varias equivalencias (dicts como los de listar_equivalencias)"""
+        for fila in filas:
+            self.guardar_equivalencia(
+                fila["producto_a_id"], fila["producto_b_id"],
+                fila["confianza"], fila["corregido_por_usuario"]
+            )
+
+    def borrar_equivalencias(self, pares):
+        """Borra equivalencias (pares (a, b) en cualquiera de las dos orientaciones)"""
+        raise NotImplementedError
+
+    def productos_del_cluster(self, cluster_id, columnas):
+        """Todos los productos de un cluster de equivalentes (una consulta indexada)"""
+        raise NotImplementedError
+
+    def asignar_clusters(self, asignaciones):
+        """Guarda cluster_id por producto (dict producto_id -> cluster_id o None)"""
+        raise NotImplementedError
+
+    def sincronizar(self):
+        """Trae cambios de la fuente (solo para réplicas). Returns: filas copiadas"""
+        return 0
+
+
+class RepositorioSupabase(RepositorioCatalogo):
+    """
+    Lecturas y escrituras contra Supabase (PostgREST)
+
+    El cliente se pide recién en la primera consulta.
+    """
+
+    def __init__(self, obtener_cliente):
+        self._obtener_cliente = obtener_cliente
+
+    @property
+    def cliente(self):
+        return self._obtener_cliente()
+
+    def verificar(self):
+        self.cliente.table("productos").select("count").execute()
+
+    def filtrar_productos(self, columnas, tienda=None, marca=None, categoria=None,
+                          peso_min=None, peso_max=None, nombre_contiene=None, limit=10, ordenar=None):
+        query = self.cliente.table("productos").select(columnas)
+
+        if tienda:
+            query = query.eq("tienda", tienda)
+        if marca:
+            query = query.eq("marca", marca)
+        if categoria:
+            query = query.eq("categoria", categoria)
+        if peso_min is not None:
+            query = query.gte("peso", peso_min)
+        if peso_max is not None:
+            query = query.lte("peso", peso_max)
+        if nombre_contiene:
+            query = query.ilike("nombre_normalizado", f"%{nombre_contiene}%")
+        if _validar_orden(ordenar):
+            query = query.order(ordenar)
+
+        return query.limit(limit).execute().data or []
+
+    def obtener_productos(self, ids, columnas):
+        ids = list(ids)
+        filas = []
+        for desde in range(0, len(ids), IDS_POR_CONSULTA):
+            filas.extend(
+                self.cliente.table("productos").select(columnas)
+                .in_("id", ids[desde:desde + IDS_POR_CONSULTA])
+                .execute().data or []
+            )
+        return filas
+
+    def _paginar(self, tabla, columnas, ordenar=None):
+        filas = []
+        desde = 0
+
+        while True:
+            query = self.cliente.table(tabla).select(columnas)
+            if ordenar:
+                query = query.order(ordenar)
+            result = query.range(desde, desde + PAGINA_CATALOGO - 1).execute()
+
+            filas.extend(result.data or [])
+
+            if not result.data or len(result.data) < PAGINA_CATALOGO:
+                break
+            desde += PAGINA_CATALOGO
+
+        return filas
+
+    def listar_productos(self, columnas):
+        return self._paginar("productos", columnas, ordenar="id")
+
+    def pagina_productos(self, columnas, despues_de=0, limit=PAGINA_CATALOGO,
+                         tienda=None, categoria=None, actualizados_desde=None):
+        query = self.cliente.table("productos").select(columnas).gt("id", despues_de)
+
+        if tienda:
+            query = query.eq("tienda", tienda)
+        if categoria:
+            query = query.eq("categoria", categoria)
+        if actualizados_desde:
+            query = query.gte("ultima_actualizacion", actualizados_desde)
+
+        return query.order("id").limit(limit).execute().data or []
+
+    def listar_equivalencias(self):
+        return self._paginar("equivalencias", ",".join(COLUMNAS_EQUIVALENCIAS))
+
+    def equivalencias_de(self, ids):
+        ids = list(ids)
+        filas = []
+        for desde in range(0, len(ids), IDS_POR_CONSULTA):
+            lista = ",".join(str(i) for i in ids[desde:desde + IDS_POR_CONSULTA])
+            filas.extend(
+                self.cliente.table("equivalencias").select(",".join(COLUMNAS_EQUIVALENCIAS))
+                .or_(f"producto_a_id.in.({lista}),producto_b_id.in.({lista})")
+                .execute().data or []
+            )
+        return filas
+
+    def guardar_equivalencia(self, producto_a_id, producto_b_id, confianza=100, corregido=True):
+        return self.cliente.table("equivalencias").upsert({
+            "producto_a_id": producto_a_id,
+            "producto_b_id": producto_b_id,
+            "confianza": confianza,
+            "corregido_por_usuario": corregido
+        }).execute().data
+
+    def guardar_equivalencias(self, filas):
+        for desde in range(0, len(filas), PAGINA_CATALOGO):
+            self.cliente.table("equivalencias").upsert(filas[desde:desde + PAGINA_CATALOGO]).execute()
+
+    def borrar_equivalencias(self, pares):
+        for a, b in pares:
+            self.cliente.table("equivalencias").delete() \
+                .or_(f"and(producto_a_id.eq.{a},producto_b_id.eq.{b}),"
+                     f"and(producto_a_id.eq.{b},producto_b_id.eq.{a})") \
+                .execute()
+
+    def productos_del_cluster(self, cluster_id, columnas):
+        return self.cliente.table("productos").select(columnas) \
+            .eq("cluster_id", cluster_id) \
+            .execute().data or []
+
+    def asignar_clusters(self, asignaciones):
+        # Un update por cluster (y por tanda de ids) en vez de uno por producto
+        por_cluster = {}
+        for producto_id, cluster_id in asignaciones.items():
+            por_cluster.setdefault(cluster_id, []).append(producto_id)
+
+        for cluster_id, ids in por_cluster.items():
+            for desde in range(0, len(ids), PAGINA_CATALOGO):
+                self.cliente.table("productos").update({"cluster_id": cluster_id}) \
+                    .in_("id", ids[desde:desde + PAGINA_CATALOGO]) \
+                    .execute()
+
+
+class RepositorioReplica(RepositorioCatalogo):
+    """
+    Lecturas desde la réplica SQLite local; escrituras a Supabase
+    (y también a la réplica, para que se lean enseguida)
+
+    Sin escritor funciona solo con la base local (modo offline).
+    """
+
+    def __init__(self, replica, escritor):
+        self.replica = replica
+        self.escritor = escritor
+
+    def verificar(self):
+        self.replica.consultar("SELECT 1")
+
+    def filtrar_productos(self, columnas, tienda=None, marca=None, categoria=None,
+                          peso_min=None, peso_max=None, nombre_contiene=None, limit=10, ordenar=None):
+        seleccion = ", ".join(f"p.{c}" for c in _lista_columnas(columnas))
+        condiciones = []
+        parametros = []
+
+        if tienda:
+            condiciones.append("p.tienda = ?")
+            parametros.append(tienda)
+        if marca:
+            condiciones.append("p.marca = ?")
+            parametros.append(marca)
+        if categoria:
+            condiciones.append("p.categoria = ?")
+            parametros.append(categoria)
+        if peso_min is not None:
+            condiciones.append("p.peso >= ?")
+            parametros.append(peso_min)
+        if peso_max is not None:
+            condiciones.append("p.peso <= ?")
+            parametros.append(peso_max)
+
+        desde = "productos p"
+        if nombre_contiene:
+            if len(nombre_contiene) >= 3:
+                # El índice de trigramas necesita al menos 3 caracteres
+                desde = "productos_fts f JOIN productos p ON p.id = f.rowid"
+                condiciones.append("productos_fts MATCH ?")
+                parametros.append('"' + nombre_contiene.replace('"', '""') + '"')
+            else:
+                condiciones.append("p.nombre_normalizado LIKE ?")
+                parametros.append(f"%{nombre_contiene}%")
+
+        sql = f"SELECT {seleccion} FROM {desde}"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        if _validar_orden(ordenar):
+            # Con tienda usa idx_productos_precio_efectivo (tienda, precio_efectivo)
+            sql += f" ORDER BY p.{ordenar} NULLS LAST"
+        sql += " LIMIT ?"
+        parametros.append(limit)
+
+        return self.replica.consultar(sql, parametros)
+
+    def obtener_productos(self, ids, columnas):
+        ids = list(ids)
+        if not ids:
+            return []
+        seleccion = ", ".join(_lista_columnas(columnas))
+        marcadores = ", ".join("?" for _ in ids)
+        return self.replica.consultar(
+            f"SELECT {seleccion} FROM productos WHERE id IN ({marcadores})", ids
+        )
+
+    def listar_productos(self, columnas):
+        seleccion = ", ".join(_lista_columnas(columnas))
+        return self.replica.consultar(f"SELECT {seleccion} FROM productos ORDER BY id")
+
+    def pagina_productos(self, columnas, despues_de=0, limit=PAGINA_CATALOGO,
+                         tienda=None, categoria=None, actualizados_desde=None):
+        seleccion = ", ".join(_lista_columnas(columnas))
+        condiciones = ["id > ?"]
+        parametros = [despues_de]
+
+        if tienda:
+            condiciones.append("tienda = ?")
+            parametros.append(tienda)
+        if categoria:
+            condiciones.append("categoria = ?")
+            parametros.append(categoria)
+        if actualizados_desde:
+            condiciones.append("ultima_actualizacion >= ?")
+            parametros.append(actualizados_desde)
+
+        parametros.append(limit)
+        return self.replica.consultar(
+            f"SELECT {seleccion} FROM productos WHERE {' AND '.join(condiciones)} ORDER BY id LIMIT ?",
+            parametros
+        )
+
+    def listar_equivalencias(self):
+        filas = self.replica.consultar(
+            "SELECT producto_a_id, producto_b_id, confianza, corregido_por_usuario FROM equivalencias"
+        )
+        for fila in filas:
+            fila["corregido_por_usuario"] = bool(fila["corregido_por_usuario"])
+        return filas
+
+    def equivalencias_de(self, ids):
+        ids = list(ids)
+        filas = []
+        for desde in range(0, len(ids), IDS_POR_CONSULTA):
+            tanda = ids[desde:desde + IDS_POR_CONSULTA]
+            marcas = ",".join("?" * len(tanda))
+            filas.extend(self.replica.consultar(
+                "SELECT producto_a_id, producto_b_id, confianza, corregido_por_usuario FROM equivalencias "
+                f"WHERE producto_a_id IN ({marcas}) OR producto_b_id IN ({marcas})",
+                tanda + tanda
+            ))
+        for fila in filas:
+            fila["corregido_por_usuario"] = bool(fila["corregido_por_usuario"])
+        return filas
+
+    def guardar_equivalencia(self, producto_a_id, producto_b_id, confianza=100, corregido=True):
+        data = []
+        if self.escritor is not None:
+            data = self.escritor.guardar_equivalencia(producto_a_id, producto_b_id, confianza, corregido)
+        self.replica.guardar_equivalencia(producto_a_id, producto_b_id, confianza, corregido)
+        return data
+
+    def guardar_equivalencias(self, filas):
+        if self.escritor is not None:
+            self.escritor.guardar_equivalencias(filas)
+        self.replica.guardar_equivalencias(filas)
+
+    def borrar_equivalencias(self, pares):
+        if self.escritor is not None:
+            self.escritor.borrar_equivalencias(pares)
+        self.replica.borrar_equivalencias(pares)
+
+    def productos_del_cluster(self, cluster_id, columnas):
+        seleccion = ", ".join(_lista_columnas(columnas))
+        return self.replica.consultar(
+            f"SELECT {seleccion} FROM productos WHERE cluster_id = ?", (cluster_id,)
+        )
+
+    def asignar_clusters(self, asignaciones):
+        if self.escritor is not None:
+            self.escritor.asignar_clusters(asignaciones)
+        self.replica.asignar_clusters(asignaciones)
+
+    def sincronizar(self):
+        if self.escritor is None:
+            return 0
+        return self.replica.sincronizar(self.escritor.cliente)
+
+
+class RepositorioMemoria(RepositorioCatalogo):
+    """
+    Catálogo en memoria (tests, benchmarks y pruebas de carga sin red)
+
+    Índice por (tienda, marca) para que los filtros de matching no recorran todo.
+    """
+
+    def __init__(self):
+        self._productos = {}
+        self._por_tienda = {}
+        self._por_tienda_marca = {}
+        self._por_cluster = {}
+        self._equivalencias = {}
+        self._equivalencias_por_producto = {}
+        self._ids_ordenados = None
+
+    def verificar(self):
+        return True
+
+    def guardar_productos(self, filas):
+        """Carga o reemplaza productos (dicts con al menos id, nombre y tienda)"""
+        for fila in filas:
+            fila = dict(fila)
+            if not fila.get("nombre_normalizado"):
+                fila["nombre_normalizado"] = normalizar_texto(fila.get("nombre"))
+            if fila.get("unidad_familia") is None and fila.get("firma_nombre") is None:
+                fila.update(calcular_features_match(fila))
+            if fila.get("precio_efectivo") is None and fila.get("precio") is not None:
+                fila.update(campos_promo(fila.get("promo"), fila["precio"]))
+
+            anterior = self._productos.get(fila["id"])
+            if anterior is not None:
+                self._por_tienda[anterior["tienda"]].remove(anterior["id"])
+                self._por_tienda_marca[(anterior["tienda"], anterior.get("marca"))].remove(anterior["id"])
+                if anterior.get("cluster_id") is not None:
+                    self._por_cluster[anterior["cluster_id"]].discard(anterior["id"])
+
+            if anterior is None:
+                self._ids_ordenados = None
+            self._productos[fila["id"]] = fila
+            self._por_tienda.setdefault(fila["tienda"], []).append(fila["id"])
+            self._por_tienda_marca.setdefault((fila["tienda"], fila.get("marca")), []).append(fila["id"])
+            if fila.get("cluster_id") is not None:
+                self._por_cluster.setdefault(fila["cluster_id"], set()).add(fila["id"])
+
+    def _proyectar(self, fila, columnas):
+        return {c: fila.get(c) for c in columnas}
+
+    def filtrar_productos(self, columnas, tienda=None, marca=None, categoria=None,
+                          peso_min=None, peso_max=None, nombre_contiene=None, limit=10, ordenar=None):
+        lista = _lista_columnas(columnas)
+        ordenado = _validar_orden(ordenar)
+
+        if tienda and marca:
+            ids = self._por_tienda_marca.get((tienda, marca), [])
+        elif tienda:
+            ids = self._por_tienda.get(tienda, [])
+        else:
+            ids = self._productos.keys()
+
+        resultado = []
+        for producto_id in ids:
+            fila = self._productos[producto_id]
+            if marca and fila.get("marca") != marca:
+                continue
+            if categoria and fila.get("categoria") != categoria:
+                continue
+            peso = fila.get("peso")
+            if peso_min is not None and (peso is None or peso < peso_min):
+                continue
+            if peso_max is not None and (peso is None or peso > peso_max):
+                continue
+            if nombre_contiene and nombre_contiene not in (fila.get("nombre_normalizado") or ""):
+                continue
+
+            if ordenado:
+                # Se ordena todo lo que cumple los filtros antes de cortar
+                resultado.append(fila)
+                continue
+            resultado.append(self._proyectar(fila, lista))
+            if len(resultado) >= limit:
+                break
+
+        if ordenado:
+            resultado = [
+                self._proyectar(fila, lista)
+                for fila in heapq.nsmallest(
+                    limit, resultado, key=lambda f: (f.get(ordenar) is None, f.get(ordenar) or 0)
+                )
+            ]
+
+        return resultado
+
+    def obtener_productos(self, ids, columnas):
+        lista = _lista_columnas(columnas)
+        return [
+            self._proyectar(self._productos[producto_id], lista)
+            for producto_id in ids if producto_id in self._productos
+        ]
+
+    def listar_productos(self, columnas):
+        lista = _lista_columnas(columnas)
+        return [self._proyectar(self._productos[i], lista) for i in sorted(self._productos)]
+
+    def pagina_productos(self, columnas, despues_de=0, limit=PAGINA_CATALOGO,
+                         tienda=None, categoria=None, actualizados_desde=None):
+        lista = _lista_columnas(columnas)
+        if self._ids_ordenados is None:
+            self._ids_ordenados = sorted(self._productos)
+
+        ids = self._ids_ordenados
+        resultado = []
+        for posicion in range(bisect_right(ids, despues_de), len(ids)):
+            fila = self._productos[ids[posicion]]
+            if tienda and fila["tienda"] != tienda:
+                continue
+            if categoria and fila.get("categoria") != categoria:
+                continue
+            if actualizados_desde and (fila.get("ultima_actualizacion") or "") < actualizados_desde:
+                continue
+
+            resultado.append(self._proyectar(fila, lista))
+            if len(resultado) >= limit:
+                break
+
+        return resultado
+
+    def listar_equivalencias(self):
+        return [
+            {
+                "producto_a_id": a,
+                "producto_b_id": b,
+                "confianza": confianza,
+                "corregido_por_usuario": corregido
+            }
+            for (a, b), (confianza, corregido) in self._equivalencias.items()
+        ]
+
+    def equivalencias_de(self, ids):
+        pares = set()
+        for producto_id in ids:
+            pares |= self._equivalencias_por_producto.get(producto_id, set())
+        return [
+            {
+                "producto_a_id": a,
+                "producto_b_id": b,
+                "confianza": self._equivalencias[(a, b)][0],
+                "corregido_por_usuario": self._equivalencias[(a, b)][1]
+            }
+            for a, b in sorted(pares)
+        ]
+
+    def guardar_equivalencia(self, producto_a_id, producto_b_id, confianza=100, corregido=True):
+        self._equivalencias[(producto_a_id, producto_b_id)] = (confianza, corregido)
+        for producto_id in (producto_a_id, producto_b_id):
+            self._equivalencias_por_producto.setdefault(producto_id, set()).add((producto_a_id, producto_b_id))
+        return [{
+            "producto_a_id": producto_a_id,
+            "producto_b_id": producto_b_id,
+            "confianza": confianza,
+            "corregido_por_usuario": corregido
+        }]
+
+    def borrar_equivalencias(self, pares):
+        for a, b in pares:
+            for par in ((a, b), (b, a)):
+                if self._equivalencias.pop(par, None) is not None:
+                    for producto_id in par:
+                        self._equivalencias_por_producto.get(producto_id, set()).discard(par)
+
+    def productos_del_cluster(self, cluster_id, columnas):
+        lista = _lista_columnas(columnas)
+        return [
+            self._proyectar(self._productos[producto_id], lista)
+            for producto_id in sorted(self._por_cluster.get(cluster_id, ()))
+            if producto_id in self._productos
+        ]
+
+    def asignar_clusters(self, asignaciones):
+        for producto_id, cluster_id in asignaciones.items():
+            fila = self._productos.get(producto_id)
+            if fila is None:
+                continue
+            anterior = fila.get("cluster_id")
+            if anterior is not None:
+                self._por_cluster[anterior].discard(producto_id)
+            fila["cluster_id"] = cluster_id
+            if cluster_id is not None:
+                self._por_cluster.setdefault(cluster_id, set()).add(producto_id)
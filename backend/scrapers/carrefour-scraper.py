@@ -3,14 +3,32 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import get_supabase_admin
-from utils import extraer_atributos_producto
+from database import get_supabase_admin, get_repositorio
+from utils import extraer_atributos_producto, calcular_features_match
+from promociones import campos_promo
+from catalogo import publicar_version
+from snapshot import publicar_snapshot
+from historial import HistorialPrecios
+from alertas import MotorAlertas
+from planificador import PlanificadorScraping
+from emparejamiento import EmparejadorIncremental
 from datetime import datetime
 from playwright.sync_api import sync_playwright
 from bs4 import BeautifulSoup
 import re
 
-supabase = get_supabase_admin()
+# Histórico de precios local (solo registra cambios de precio/promo)
+historial_precios = HistorialPrecios()
+
+# Cambios de precio/promo de esta corrida (se evalúan contra las alertas al final)
+cambios_precio = []
+
+# Tasas de cambio por página (el planificador decide qué refrescar y cuándo)
+planificador_scraping = PlanificadorScraping()
+
+# Productos nuevos o con atributos de matching cambiados (se re-emparejan al final)
+emparejador = EmparejadorIncremental()
+cambios_matching = []
 
 # ============================================
 # SECCIONES COMPLETAS DE CARREFOUR
@@ -86,6 +104,7 @@ def guardar_producto(nombre, precio, promo, categoria, url, imagen_url):
         
         # EXTRAER ATRIBUTOS
         atributos = extraer_atributos_producto(nombre)
+        ahora = datetime.now()
         
         data = {
             "nombre": nombre,
@@ -101,10 +120,30 @@ def guardar_producto(nombre, precio, promo, categoria, url, imagen_url):
             "promo": promo,
             "url": url,
             "imagen_url": imagen_url,
-            "ultima_actualizacion": datetime.now().isoformat()
+            "ultima_actualizacion": ahora.isoformat()
         }
         
-        supabase.table("productos").upsert(data, on_conflict="nombre,tienda").execute()
+        # Features de matching (así comparar no las recalcula por cada par)
+        data.update(calcular_features_match(atributos))
+        
+        # Promo estructurada y precio efectivo por unidad
+        data.update(campos_promo(promo, precio_float))
+        
+        result = get_supabase_admin().table("productos").upsert(data, on_conflict="nombre,tienda").execute()
+        
+        if result.data:
+            fila = result.data[0]
+            cambio = historial_precios.registrar(fila["id"], precio_float, promo, ahora)
+            if cambio:
+                cambios_precio.append({
+                    **cambio,
+                    "tienda": data["tienda"],
+                    "categoria": categoria,
+                    "marca_id": data["marca_id"],
+                    "cluster_id": fila.get("cluster_id")
+                })
+            if emparejador.cambio(fila["id"], data):
+                cambios_matching.append(fila["id"])
         
         marca_str = f"[{atributos['marca']}]" if atributos['marca'] else ""
         peso_str = f"{atributos['peso']}{atributos['peso_unidad']}" if atributos['peso'] else ""
@@ -167,6 +206,38 @@ def procesar_pagina(page, categoria, num_pagina, url_base):
         print(f"🔥 Error: {e}")
         return -1
 
+def registrar_visita(categoria, num_pagina, productos, cambios):
+    """Le pasa al planificador lo que se vio en una página (nada si falló)"""
+    if productos < 0:
+        return
+    try:
+        planificador_scraping.registrar_visita("Carrefour", categoria, num_pagina, productos, cambios)
+    except Exception as e:
+        print(f"⚠️  Error registrando visita: {e}")
+
+def emparejar_cambios(sincronizar=True):
+    """
+    Re-puntúa las equivalencias de los productos nuevos o cambiados contra las otras tiendas
+
+    Args:
+        sincronizar (bool): Sincronizar antes la réplica (False si el que llama
+                            ya lo hizo para toda la tanda)
+    """
+    if not cambios_matching:
+        return
+    try:
+        repositorio = get_repositorio()
+        if sincronizar:
+            # Con réplica local, que se vean los productos recién guardados
+            repositorio.sincronizar()
+        resumen = emparejador.emparejar(repositorio, cambios_matching)
+        print(f"🔗 {resumen['productos']} productos re-emparejados: "
+              f"{resumen['nuevas']} equivalencias nuevas, {resumen['actualizadas']} actualizadas")
+    except Exception as e:
+        # Sin firma guardada: se vuelven a emparejar la próxima vez que se scrapeen
+        print(f"❌ Error emparejando: {e}")
+    cambios_matching.clear()
+
 def scrapear_seccion(browser, categoria, url_base, max_paginas=None):
     print(f"\n{'='*60}")
     print(f"🛒 {categoria.upper()}")
@@ -180,7 +251,9 @@ def scrapear_seccion(browser, categoria, url_base, max_paginas=None):
         if max_paginas and num_pagina > max_paginas:
             break
         
+        antes = len(cambios_precio)
         productos = procesar_pagina(page, categoria, num_pagina, url_base)
+        registrar_visita(categoria, num_pagina, productos, len(cambios_precio) - antes)
         if productos <= 0:
             break
         
@@ -191,13 +264,41 @@ def scrapear_seccion(browser, categoria, url_base, max_paginas=None):
     print(f"✅ Total: {total_productos}\n")
     return total_productos
 
-def run(secciones=None, max_paginas_por_seccion=None):
-    if secciones is None:
+def scrapear_plan(browser, plan):
+    """
+    Scrapea páginas puntuales en el orden del plan
+
+    Args:
+        plan (list): Tuplas (seccion, pagina) o dicts del planificador
+    """
+    page = browser.new_page()
+    total_productos = 0
+    
+    for item in plan:
+        categoria, num_pagina = (item["seccion"], item["pagina"]) if isinstance(item, dict) else item
+        if categoria not in SECCIONES:
+            print(f"⚠️  Sección '{categoria}' no existe")
+            continue
+        
+        antes = len(cambios_precio)
+        productos = procesar_pagina(page, categoria, num_pagina, SECCIONES[categoria])
+        registrar_visita(categoria, num_pagina, productos, len(cambios_precio) - antes)
+        total_productos += max(productos, 0)
+    
+    page.close()
+    print(f"✅ Total: {total_productos}\n")
+    return total_productos
+
+def run(secciones=None, max_paginas_por_seccion=None, plan=None):
+    if plan is not None:
+        # Solo las páginas que el planificador considera vencidas
+        secciones = []
+    elif secciones is None:
         secciones = list(SECCIONES.keys())
     
     print(f"\n{'='*60}")
     print(f"🛒 CARREFOUR - Scraping")
-    print(f"Secciones: {len(secciones)}")
+    print(f"Secciones: {len(secciones)}" if plan is None else f"Páginas del plan: {len(plan)}")
     print(f"{'='*60}\n")
     
     with sync_playwright() as p:
@@ -207,6 +308,9 @@ def run(secciones=None, max_paginas_por_seccion=None):
         page.close()
         
         total = 0
+        if plan is not None:
+            total += scrapear_plan(browser, plan)
+        
         for seccion in secciones:
             if seccion in SECCIONES:
                 total += scrapear_seccion(browser, seccion, SECCIONES[seccion], max_paginas_por_seccion)
@@ -215,6 +319,26 @@ def run(secciones=None, max_paginas_por_seccion=None):
         
         browser.close()
     
+    # Equivalencias de lo que cambió (antes de publicar la versión, así la API las recarga)
+    emparejar_cambios()
+    
+    # Snapshot compartido para los workers de la API
+    try:
+        publicar_snapshot(get_repositorio())
+    except Exception as e:
+        print(f"❌ Error publicando snapshot: {e}")
+    
+    # Avisar a la API que el catálogo cambió (invalida caches)
+    publicar_version()
+    
+    # Alertas de precio con el lote de cambios de la corrida
+    try:
+        notificaciones = MotorAlertas().evaluar(cambios_precio)
+        print(f"🔔 {len(cambios_precio)} cambios de precio, {notificaciones} notificaciones")
+    except Exception as e:
+        print(f"❌ Error evaluando alertas: {e}")
+    cambios_precio.clear()
+    
     print(f"\n{'='*60}")
     print(f"🎉 CARREFOUR - Total: {total} productos")
     print(f"{'='*60}\n")
@@ -0,0 +1,373 @@
+"""
+Scraping distribuido con la cola de trabajo (cola_scraping.py)
+
+Roles:
+- coordinador: crea la corrida, expande las secciones página a página y al
+  terminar publica el snapshot y la versión del catálogo
+- trabajador: toma unidades (tienda, sección, página) y las scrapea con el
+  procesar_pagina del scraper de esa tienda; se pueden levantar tantos como se
+  quiera, en esta máquina o en otras que vean la misma base de la cola
+- planificador: proceso de larga duración que, cuando no hay corrida activa,
+  encola solo las páginas vencidas según la volatilidad aprendida
+  (planificador.py) y coordina esa corrida
+
+Uso:
+    python scrapers/cola.py coordinar                   # corrida nueva con todas las tiendas
+    python scrapers/cola.py coordinar --tiendas Disco --secciones almacen,bebidas --max-paginas 5
+    python scrapers/cola.py trabajar                    # en cada máquina/proceso trabajador
+    python scrapers/cola.py planificar --presupuesto 2000 --cada 15   # refrescos por volatilidad
+    python scrapers/cola.py estado                      # progreso y dead-letter de la corrida activa
+    python scrapers/cola.py reintentar --corrida 12     # reencolar las unidades muertas
+
+Con varias máquinas todas (trabajadores, coordinador y API) tienen que ver
+los mismos archivos: la cola, el histórico de precios, el outbox de alertas,
+las visitas del planificador, las firmas de matching, el snapshot y la versión
+del catálogo. En todas:
+
+    CUIDAELMANGO_COMPARTIDO_DIR=/volumen/compartido
+    CUIDAELMANGO_COMPARTIDO_WAL=0
+
+Sin eso cada máquina escribe en su propio DATA_DIR: las alertas quedan donde
+la API no las lee, el planificador no aprende de los trabajadores remotos y
+la API nunca se entera de la versión nueva. CUIDAELMANGO_COLA y
+CUIDAELMANGO_COLA_WAL siguen pudiendo mover solo la cola.
+"""
+
+import argparse
+import importlib.util
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alertas import MotorAlertas
+from cola_scraping import ColaScraping, RUTA_COLA, DURACION_LEASE
+from catalogo import WAL_COMPARTIDO
+from database import get_repositorio, get_variable
+from planificador import PlanificadorScraping
+
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Tienda -> archivo del scraper (tienen guiones en el nombre: se cargan por ruta)
+SCRAPERS = {
+    "Carrefour": "carrefour-scraper.py",
+    "Disco": "disco-scraper.py",
+}
+
+# Cada cuánto el coordinador expande secciones / un trabajador sin trabajo vuelve a mirar
+INTERVALO_COORDINADOR = 2
+ESPERA_SIN_TRABAJO = 5
+
+# Minutos entre planes del planificador
+INTERVALO_PLAN = 15
+
+# El trabajador junta los productos cambiados y corre el matching incremental
+# por tandas: al llegar a LOTE_EMPAREJAMIENTO productos, cada
+# INTERVALO_EMPAREJAMIENTO segundos o cuando se queda sin trabajo (una
+# sincronización de la réplica por tanda, no por página)
+LOTE_EMPAREJAMIENTO = 500
+INTERVALO_EMPAREJAMIENTO = 300
+
+
+def get_cola():
+    return ColaScraping(
+        get_variable("CUIDAELMANGO_COLA") or RUTA_COLA,
+        wal=get_variable("CUIDAELMANGO_COLA_WAL", "1" if WAL_COMPARTIDO else "0") != "0"
+    )
+
+
+def cargar_scraper(tienda):
+    """Módulo del scraper de una tienda"""
+    archivo = SCRAPERS[tienda]
+    spec = importlib.util.spec_from_file_location(archivo[:-3].replace("-", "_"), os.path.join(DIRECTORIO, archivo))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+# ============================================
+# COORDINADOR
+# ============================================
+
+def coordinar(cola, corrida_id, intervalo=INTERVALO_COORDINADOR):
+    """
+    Expande la corrida hasta que no quedan unidades pendientes ni tomadas
+
+    Returns:
+        dict: Resumen final de la corrida
+    """
+    ultimo = None
+    while True:
+        cola.expandir(corrida_id)
+        resumen = cola.resumen(corrida_id)
+
+        estado = (resumen["unidades"]["hecha"], resumen["unidades"]["tomada"], resumen["unidades"]["pendiente"])
+        if estado != ultimo:
+            print(f"📋 Corrida {corrida_id}: {estado[0]} hechas, {estado[1]} en curso, {estado[2]} pendientes, "
+                  f"{resumen['unidades']['muerta']} muertas - {resumen['productos']} productos, "
+                  f"{resumen['secciones_terminadas']}/{resumen['secciones']} secciones terminadas")
+            ultimo = estado
+
+        if resumen["terminada"]:
+            break
+        time.sleep(intervalo)
+
+    cola.terminar_corrida(corrida_id)
+
+    # Lo mismo que hace cada scraper al final de run()
+    from catalogo import publicar_version
+    from snapshot import publicar_snapshot
+
+    try:
+        publicar_snapshot(get_repositorio())
+    except Exception as e:
+        print(f"❌ Error publicando snapshot: {e}")
+    publicar_version()
+
+    if resumen["unidades"]["muerta"]:
+        print(f"⚠️  {resumen['unidades']['muerta']} unidades en dead-letter "
+              f"(python scrapers/cola.py estado --corrida {corrida_id})")
+    print(f"🎉 Corrida {corrida_id} terminada: {resumen['productos']} productos")
+    return resumen
+
+
+# ============================================
+# TRABAJADOR
+# ============================================
+
+class Latido:
+    """
+    Renueva el lease de la unidad en curso desde otro thread
+
+    El scraping (Playwright sync) no se puede cortar a mitad de página: si el
+    lease se pierde solo se marca, y el resultado no se reporta.
+    """
+
+    def __init__(self, cola, unidad_id, trabajador, duracion=DURACION_LEASE):
+        self.cola = cola
+        self.unidad_id = unidad_id
+        self.trabajador = trabajador
+        self.duracion = duracion
+        self.perdido = False
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._latir, daemon=True)
+
+    def _latir(self):
+        while not self._parar.wait(self.duracion / 3):
+            try:
+                if not self.cola.latido(self.unidad_id, self.trabajador, self.duracion):
+                    self.perdido = True
+                    return
+            except Exception as e:
+                print(f"⚠️  Latido fallido: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+
+
+def procesar_unidad(cola, unidad, trabajador, modulo, page, motor_alertas):
+    """
+    Scrapea una página y reporta el resultado a la cola
+
+    Args:
+        motor_alertas (MotorAlertas): Uno por trabajador (su conexión se reusa entre páginas)
+
+    Returns:
+        int: Productos guardados (-1 si falló)
+    """
+    url_base = modulo.SECCIONES.get(unidad["seccion"])
+    if url_base is None:
+        cola.fallar(unidad["id"], trabajador, f"Sección '{unidad['seccion']}' no existe")
+        return -1
+
+    with Latido(cola, unidad["id"], trabajador) as latido:
+        productos = modulo.procesar_pagina(page, unidad["seccion"], unidad["pagina"], url_base)
+
+    # Volatilidad de la página para el planificador (cambios_precio se vacía por unidad)
+    modulo.registrar_visita(unidad["seccion"], unidad["pagina"], productos, len(modulo.cambios_precio))
+
+    # Alertas con los cambios de esta página
+    if modulo.cambios_precio:
+        try:
+            motor_alertas.evaluar(modulo.cambios_precio)
+        except Exception as e:
+            print(f"❌ Error evaluando alertas: {e}")
+        modulo.cambios_precio.clear()
+
+    if latido.perdido:
+        print(f"⚠️  Lease perdido: {unidad['tienda']}/{unidad['seccion']} página {unidad['pagina']}")
+        return productos
+
+    if productos < 0:
+        estado = cola.fallar(unidad["id"], trabajador, "procesar_pagina devolvió error")
+        print(f"🔁 {unidad['tienda']}/{unidad['seccion']} página {unidad['pagina']} → {estado}")
+    else:
+        cola.completar(unidad["id"], trabajador, productos)
+    return productos
+
+
+def emparejar_pendientes(modulos):
+    """
+    Matching incremental de todo lo que juntaron los scrapers desde la última tanda
+
+    La réplica se sincroniza una sola vez para todas las tiendas.
+    """
+    if not any(modulo.cambios_matching for modulo in modulos.values()):
+        return
+    try:
+        get_repositorio().sincronizar()
+    except Exception as e:
+        print(f"⚠️  No se pudo sincronizar la réplica antes de emparejar: {e}")
+    for modulo in modulos.values():
+        modulo.emparejar_cambios(sincronizar=False)
+
+
+def trabajar(cola, tiendas=None, salir_al_terminar=False):
+    """
+    Loop de un trabajador: un browser, una página reutilizada para todas las unidades
+    """
+    from playwright.sync_api import sync_playwright
+
+    trabajador = f"{socket.gethostname()}:{os.getpid()}"
+    modulos = {tienda: cargar_scraper(tienda) for tienda in (tiendas or SCRAPERS)}
+    motor_alertas = MotorAlertas()
+    print(f"👷 Trabajador {trabajador} ({', '.join(modulos)})")
+
+    with sync_playwright() as p:
+        browser = p.firefox.launch(headless=True)
+        context = browser.new_context(user_agent="Mozilla/5.0")
+        page = context.new_page()
+
+        total = 0
+        ultima_tanda = time.monotonic()
+        while True:
+            unidad = cola.tomar(trabajador, list(modulos))
+            if unidad is None:
+                emparejar_pendientes(modulos)
+                ultima_tanda = time.monotonic()
+                if salir_al_terminar and cola.corrida_activa() is None:
+                    break
+                time.sleep(ESPERA_SIN_TRABAJO)
+                continue
+
+            productos = procesar_unidad(cola, unidad, trabajador, modulos[unidad["tienda"]], page, motor_alertas)
+            total += max(productos, 0)
+
+            cambiados = sum(len(modulo.cambios_matching) for modulo in modulos.values())
+            if cambiados >= LOTE_EMPAREJAMIENTO or time.monotonic() - ultima_tanda >= INTERVALO_EMPAREJAMIENTO:
+                emparejar_pendientes(modulos)
+                ultima_tanda = time.monotonic()
+
+        browser.close()
+
+    print(f"👷 Trabajador {trabajador} terminó: {total} productos")
+    return total
+
+
+# ============================================
+# PLANIFICADOR
+# ============================================
+
+def planificar(cola, planificador, secciones, presupuesto_dia, intervalo=INTERVALO_PLAN, limite=None):
+    """
+    Loop de larga duración: cuando no hay corrida activa, encola las páginas
+    vencidas (de más a menos urgente) y coordina esa corrida
+
+    Args:
+        secciones (dict): tienda -> secciones del scraper (las nunca vistas van primero)
+        presupuesto_dia (float): Páginas por día
+        intervalo (float): Minutos entre planes
+        limite (int): Tope de páginas por corrida
+    """
+    print(f"🗓️  Planificador: {presupuesto_dia:g} páginas/día, plan cada {intervalo:g} min")
+    while True:
+        if cola.corrida_activa() is None:
+            plan = planificador.plan(presupuesto_dia, secciones, limite=limite)
+            if plan:
+                corrida_id = cola.crear_corrida_plan(plan)
+                print(f"🆕 Corrida {corrida_id}: {len(plan)} páginas vencidas")
+                coordinar(cola, corrida_id)
+            else:
+                print("😴 Nada vencido")
+        time.sleep(intervalo * 60)
+
+
+# ============================================
+# CLI
+# ============================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Scraping distribuido con cola de trabajo")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_coordinar = subparsers.add_parser("coordinar", help="Crear una corrida y coordinarla hasta el final")
+    p_coordinar.add_argument("--tiendas", help="Tiendas separadas por coma (default: todas)")
+    p_coordinar.add_argument("--secciones", help="Secciones separadas por coma (default: todas)")
+    p_coordinar.add_argument("--max-paginas", type=int, help="Tope de páginas por sección")
+    p_coordinar.add_argument("--corrida", type=int, help="Retomar una corrida existente en vez de crear otra")
+
+    p_trabajar = subparsers.add_parser("trabajar", help="Tomar y scrapear unidades")
+    p_trabajar.add_argument("--tiendas", help="Solo estas tiendas (separadas por coma)")
+    p_trabajar.add_argument("--salir-al-terminar", action="store_true",
+                            help="Salir cuando no quede ninguna corrida activa")
+
+    p_planificar = subparsers.add_parser("planificar", help="Encolar refrescos según la volatilidad de cada página")
+    p_planificar.add_argument("--tiendas", help="Tiendas separadas por coma (default: todas)")
+    p_planificar.add_argument("--presupuesto", type=float, required=True, help="Páginas por día")
+    p_planificar.add_argument("--cada", type=float, default=INTERVALO_PLAN, help="Minutos entre planes")
+    p_planificar.add_argument("--limite", type=int, help="Tope de páginas por corrida")
+
+    p_estado = subparsers.add_parser("estado", help="Progreso y dead-letter de una corrida")
+    p_estado.add_argument("--corrida", type=int, help="Default: la corrida activa")
+
+    p_reintentar = subparsers.add_parser("reintentar", help="Reencolar las unidades muertas")
+    p_reintentar.add_argument("--corrida", type=int, required=True)
+
+    args = parser.parse_args()
+    cola = get_cola()
+    tiendas = args.tiendas.split(",") if getattr(args, "tiendas", None) else None
+
+    if args.comando == "coordinar":
+        corrida_id = args.corrida
+        if corrida_id is None:
+            secciones = {}
+            for tienda in tiendas or SCRAPERS:
+                disponibles = list(cargar_scraper(tienda).SECCIONES)
+                elegidas = args.secciones.split(",") if args.secciones else disponibles
+                secciones[tienda] = [s for s in elegidas if s in disponibles]
+            corrida_id = cola.crear_corrida(secciones, args.max_paginas)
+            print(f"🆕 Corrida {corrida_id}: {sum(len(s) for s in secciones.values())} secciones")
+        coordinar(cola, corrida_id)
+
+    elif args.comando == "trabajar":
+        trabajar(cola, tiendas, args.salir_al_terminar)
+
+    elif args.comando == "planificar":
+        secciones = {tienda: list(cargar_scraper(tienda).SECCIONES) for tienda in tiendas or SCRAPERS}
+        planificar(cola, PlanificadorScraping(), secciones, args.presupuesto, args.cada, args.limite)
+
+    elif args.comando == "estado":
+        corrida_id = args.corrida or cola.corrida_activa()
+        if corrida_id is None:
+            print("No hay corridas activas")
+            return
+        print(cola.resumen(corrida_id))
+        for unidad in cola.muertas(corrida_id):
+            print(f"💀 {unidad['tienda']}/{unidad['seccion']} página {unidad['pagina']} "
+                  f"({unidad['intentos']} intentos): {unidad['error']}")
+
+    elif args.comando == "reintentar":
+        print(f"🔁 {cola.reintentar_muertas(args.corrida)} unidades reencoladas")
+
+
+if __name__ == "__main__":
+    main()
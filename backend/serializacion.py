@@ -0,0 +1,121 @@
+"""
+Serialización de respuestas para CuidaElMango
+JSON rápido (orjson si está instalado), modo compacto y gzip
+"""
+
+import json
+
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+from metricas import etapa
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa json de la librería estándar
+    orjson = None
+
+
+# Campos que el frontend muestra de cada producto en una comparación
+CAMPOS_COMPACTOS = (
+    "id", "nombre", "tienda", "marca", "precio", "precio_efectivo", "imagen_url",
+    "match_score", "match_nivel", "es_origen", "no_disponible",
+    "producto_origen_id", "corregido_manualmente",
+)
+
+# Campos de un producto alternativo (se manda una vez y se referencia por id)
+CAMPOS_ALTERNATIVA = ("id", "nombre", "tienda", "marca", "precio", "imagen_url")
+
+# Respuestas más chicas que esto no se comprimen
+GZIP_MINIMO = 1000
+
+
+def serializar(contenido):
+    """
+    Serializa a bytes JSON compacto
+
+    Args:
+        contenido: dict/list con tipos JSON nativos
+
+    Returns:
+        bytes: JSON en UTF-8
+    """
+    with etapa("encode"):
+        if orjson is not None:
+            return orjson.dumps(contenido, option=orjson.OPT_NON_STR_KEYS)
+
+        return json.dumps(
+            contenido, ensure_ascii=False, separators=(",", ":"), default=str
+        ).encode("utf-8")
+
+
+class RespuestaJSON(JSONResponse):
+    """
+    JSONResponse con el serializador rápido
+
+    Devolverla directamente desde un endpoint además evita el paso por
+    jsonable_encoder de FastAPI, que recorre todo el contenido.
+    """
+
+    def render(self, content):
+        return serializar(content)
+
+
+class GZipSinStreaming(GZipMiddleware):
+    """
+    GZip para respuestas grandes, salvo los endpoints de streaming
+    (comprimir por chunks retendría los registros en el buffer del compresor)
+    y la exportación (ya viene en gzip si se pide), ni las imágenes
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and (
+            scope["path"].endswith(("/stream", "/export")) or scope["path"] == "/imagenes"
+        ):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def compactar_fila(fila, alternativas):
+    """
+    Deja solo los campos que se muestran y reemplaza las alternativas por referencias
+
+    Args:
+        fila (dict): Fila de resultado de la comparación
+        alternativas (dict): Acumulador id -> alternativa (se completa acá)
+
+    Returns:
+        dict: Fila compacta
+    """
+    compacta = {campo: fila[campo] for campo in CAMPOS_COMPACTOS if campo in fila}
+
+    if fila.get("alternativas"):
+        compacta["alternativas"] = []
+        for alternativa in fila["alternativas"]:
+            alternativas.setdefault(alternativa["id"], {
+                campo: alternativa.get(campo) for campo in CAMPOS_ALTERNATIVA
+            })
+            compacta["alternativas"].append({
+                "id": alternativa["id"],
+                "match_score": alternativa.get("match_score")
+            })
+
+    return compacta
+
+
+def compactar_comparacion(resultados, tiendas):
+    """
+    Versión compacta de la respuesta de /comparar-inteligente
+
+    - Sin match_detalles ni columnas que el frontend no usa
+    - Alternativas como {id, match_score}; los datos de cada alternativa
+      van una sola vez en resultados["alternativas"]
+    """
+    alternativas = {}
+
+    for tienda in tiendas:
+        resultados[tienda] = [compactar_fila(fila, alternativas) for fila in resultados.get(tienda, [])]
+
+    resultados["alternativas"] = alternativas
+    return resultados
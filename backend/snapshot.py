@@ -0,0 +1,288 @@
+"""
+Snapshot inmutable del catálogo para CuidaElMango
+
+Se arma una vez por scrape y cada worker de uvicorn/gunicorn lo mapea en memoria
+(mmap de solo lectura): las páginas se comparten entre procesos, así la memoria
+no crece con la cantidad de workers y abrirlo no cuesta nada. El autocompletado
+lee del snapshot las claves, sus posiciones y los datos de cada sugerencia.
+
+Formato (little-endian, secciones alineadas a 8 bytes):
+- Encabezado: MAGIA, cantidad de productos, de claves y de strings, y offset de cada sección
+- Columnas: id (int64, ordenado), precio y peso_base (float64),
+  nombre/tienda/marca/categoría (int32, índice en la tabla de strings; -1 = sin dato)
+- Claves de autocompletado ordenadas: clave (int32, índice en la tabla de
+  strings) y posición del producto (int32)
+- Tabla de strings: offsets (uint32) + bytes UTF-8
+"""
+
+import math
+import mmap
+import os
+import struct
+from bisect import bisect_left
+
+from autocomplete import generar_claves
+from catalogo import DIR_COMPARTIDO
+from matching import normalizar_peso
+
+
+RUTA_SNAPSHOT = os.path.join(DIR_COMPARTIDO, "catalogo.snap")
+
+MAGIA = b"CEMSNAP2"
+
+# Columnas numéricas: (nombre, formato de array)
+COLUMNAS = [
+    ("id", "q"),
+    ("precio", "d"),
+    ("peso_base", "d"),
+    ("nombre", "i"),
+    ("tienda", "i"),
+    ("marca", "i"),
+    ("categoria", "i"),
+]
+
+COLUMNAS_TEXTO = ("nombre", "tienda", "marca", "categoria")
+
+# Claves de autocompletado (una fila por clave, ordenadas por texto)
+COLUMNAS_CLAVES = [
+    ("clave", "i"),
+    ("posicion", "i"),
+]
+
+# Columnas que hay que leer del catálogo para armarlo
+COLUMNAS_ORIGEN = "id,nombre,tienda,marca,categoria,precio,peso,peso_unidad,peso_base"
+
+# MAGIA, productos, claves, strings, offsets de columnas y de claves, offsets de strings, bytes de strings
+ENCABEZADO = struct.Struct("<8sIII" + "Q" * (len(COLUMNAS) + len(COLUMNAS_CLAVES)) + "QQ")
+
+
+def _alinear(n):
+    return (n + 7) & ~7
+
+
+def construir_snapshot(productos, ruta=RUTA_SNAPSHOT):
+    """
+    Escribe un snapshot y lo publica con un rename atómico
+
+    Los workers que tengan mapeado el anterior lo siguen leyendo sin problemas
+    (el archivo viejo vive hasta que lo cierran).
+
+    Args:
+        productos (list): Dicts con COLUMNAS_ORIGEN
+        ruta (str): Destino
+
+    Returns:
+        int: Productos escritos
+    """
+    productos = sorted(productos, key=lambda p: p["id"])
+
+    strings = []
+    indice_strings = {}
+
+    def id_string(texto):
+        if not texto:
+            return -1
+        if texto not in indice_strings:
+            indice_strings[texto] = len(strings)
+            strings.append(texto)
+        return indice_strings[texto]
+
+    columnas = {nombre: [] for nombre, _ in COLUMNAS}
+    entradas = []
+    for posicion, producto in enumerate(productos):
+        columnas["id"].append(producto["id"])
+        columnas["precio"].append(float(producto.get("precio") or 0))
+        peso_base = producto.get("peso_base") or normalizar_peso(producto.get("peso"), producto.get("peso_unidad"))
+        columnas["peso_base"].append(float(peso_base) if peso_base else math.nan)
+        for nombre in COLUMNAS_TEXTO:
+            columnas[nombre].append(id_string(producto.get(nombre)))
+        for clave in generar_claves(producto["nombre"], producto.get("marca")):
+            entradas.append((clave, posicion))
+
+    entradas.sort()
+    columnas["clave"] = [id_string(clave) for clave, _ in entradas]
+    columnas["posicion"] = [posicion for _, posicion in entradas]
+
+    bytes_strings = [texto.encode("utf-8") for texto in strings]
+    offsets_strings = [0]
+    for datos in bytes_strings:
+        offsets_strings.append(offsets_strings[-1] + len(datos))
+
+    # Secciones
+    secciones = [
+        struct.pack(f"<{len(columnas[nombre])}{formato}", *columnas[nombre])
+        for nombre, formato in COLUMNAS + COLUMNAS_CLAVES
+    ]
+    secciones.append(struct.pack(f"<{len(offsets_strings)}I", *offsets_strings))
+    secciones.append(b"".join(bytes_strings))
+
+    offsets = []
+    posicion = _alinear(ENCABEZADO.size)
+    for seccion in secciones:
+        offsets.append(posicion)
+        posicion = _alinear(posicion + len(seccion))
+
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+
+    with open(temporal, "wb") as archivo:
+        archivo.write(ENCABEZADO.pack(MAGIA, len(productos), len(entradas), len(strings), *offsets))
+        for offset, seccion in zip(offsets, secciones):
+            archivo.seek(offset)
+            archivo.write(seccion)
+        archivo.truncate(posicion)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+
+    os.replace(temporal, ruta)
+    return len(productos)
+
+
+class SnapshotCatalogo:
+    """
+    Vista de solo lectura sobre un snapshot mapeado en memoria
+    """
+
+    def __init__(self, ruta=RUTA_SNAPSHOT):
+        self.ruta = ruta
+
+        with open(ruta, "rb") as archivo:
+            self.inode = os.fstat(archivo.fileno()).st_ino
+            self._mmap = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < ENCABEZADO.size or self._mmap[:len(MAGIA)] != MAGIA:
+            raise ValueError(f"{ruta} no es un snapshot del catálogo (o es de un formato anterior)")
+
+        campos = ENCABEZADO.unpack_from(self._mmap, 0)
+        self.cantidad, cantidad_claves, cantidad_strings = campos[1:4]
+        offsets = campos[4:]
+        vista = memoryview(self._mmap)
+
+        self.columnas = {}
+        for (nombre, formato), offset in zip(COLUMNAS + COLUMNAS_CLAVES, offsets):
+            filas = self.cantidad if (nombre, formato) in COLUMNAS else cantidad_claves
+            self.columnas[nombre] = vista[offset:offset + struct.calcsize(formato) * filas].cast(formato)
+
+        offset_indices, offset_bytes = offsets[len(COLUMNAS) + len(COLUMNAS_CLAVES):]
+        self._offsets_strings = vista[offset_indices:offset_indices + 4 * (cantidad_strings + 1)].cast("I")
+        self._bytes_strings = vista[offset_bytes:]
+
+        self.claves = ClavesSnapshot(self)
+        self._tiendas = {}
+
+    def __len__(self):
+        return self.cantidad
+
+    def string(self, indice):
+        if indice < 0:
+            return None
+        inicio = self._offsets_strings[indice]
+        fin = self._offsets_strings[indice + 1]
+        return bytes(self._bytes_strings[inicio:fin]).decode("utf-8")
+
+    def posicion(self, producto_id):
+        """Posición del producto (búsqueda binaria sobre ids) o None"""
+        ids = self.columnas["id"]
+        i = bisect_left(ids, producto_id)
+        if i < self.cantidad and ids[i] == producto_id:
+            return i
+        return None
+
+    def tienda(self, i):
+        # Hay pocas tiendas distintas: se decodifican una sola vez
+        indice = self.columnas["tienda"][i]
+        tienda = self._tiendas.get(indice)
+        if tienda is None:
+            tienda = self._tiendas[indice] = self.string(indice)
+        return tienda
+
+    def fila(self, i):
+        """(id, nombre, tienda, marca, precio) del producto en la posición i"""
+        columnas = self.columnas
+        return (
+            columnas["id"][i],
+            self.string(columnas["nombre"][i]),
+            self.tienda(i),
+            self.string(columnas["marca"][i]),
+            columnas["precio"][i],
+        )
+
+    def producto(self, i):
+        peso_base = self.columnas["peso_base"][i]
+        return {
+            "id": self.columnas["id"][i],
+            "nombre": self.string(self.columnas["nombre"][i]),
+            "tienda": self.string(self.columnas["tienda"][i]),
+            "marca": self.string(self.columnas["marca"][i]),
+            "categoria": self.string(self.columnas["categoria"][i]),
+            "precio": self.columnas["precio"][i],
+            "peso_base": None if math.isnan(peso_base) else peso_base,
+        }
+
+    def obtener(self, producto_id):
+        i = self.posicion(producto_id)
+        return self.producto(i) if i is not None else None
+
+    def productos(self):
+        for i in range(self.cantidad):
+            yield self.producto(i)
+
+
+class ClavesSnapshot:
+    """
+    Claves de autocompletado del snapshot como secuencia de str ordenada
+
+    Se decodifica solo la clave que se pide, así bisect recorre el mmap sin
+    copiar la tabla a la memoria de cada worker.
+    """
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._indices = snapshot.columnas["clave"]
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, i):
+        return self._snapshot.string(self._indices[i])
+
+
+class SnapshotCompartido:
+    """
+    Mantiene abierto el snapshot vigente y cambia al nuevo cuando se publica otro
+
+    Un os.stat por llamada a actual(): si cambió el inode se vuelve a mapear.
+    """
+
+    def __init__(self, ruta=RUTA_SNAPSHOT):
+        self.ruta = ruta
+        self._snapshot = None
+
+    def actual(self):
+        """
+        Returns:
+            SnapshotCatalogo: Snapshot vigente, o None si todavía no se publicó ninguno
+        """
+        try:
+            inode = os.stat(self.ruta).st_ino
+        except FileNotFoundError:
+            return None
+
+        if self._snapshot is None or self._snapshot.inode != inode:
+            self._snapshot = SnapshotCatalogo(self.ruta)
+
+        return self._snapshot
+
+
+def publicar_snapshot(repositorio, ruta=RUTA_SNAPSHOT):
+    """
+    Arma el snapshot con todo el catálogo del repositorio (al terminar un scrape)
+    """
+    cantidad = construir_snapshot(repositorio.listar_productos(COLUMNAS_ORIGEN), ruta)
+    print(f"📦 Snapshot publicado: {cantidad} productos en {ruta}")
+    return cantidad
+
+
+if __name__ == "__main__":
+    from database import get_repositorio
+    publicar_snapshot(get_repositorio())
@@ -2,7 +2,9 @@
 Utilidades para extracción de atributos de productos
 """
 
-import re
+import unicodedata
+
+from cantidades import UNIDADES, analizar_cantidades
 
 # Lista de marcas conocidas (ir agregando más)
 MARCAS_CONOCIDAS = [
@@ -43,6 +45,25 @@ MARCAS_CONOCIDAS = [
     'nivea', 'rexona', 'axe', 'plusbelle', 'suave'
 ]
 
+# Alias de marcas → marca canónica (el resto es canónica tal cual)
+MARCAS_CANONICAS = {
+    'coca-cola': 'coca cola',
+    '7up': 'seven up',
+    'serenisima': 'la serenisima',
+    'paulina': 'la paulina',
+    'campagnola': 'la campagnola',
+    "hell'mann's": 'hellmanns',
+    'hellmans': 'hellmanns',
+    "l'oreal": 'loreal',
+}
+
+# Familia de cada unidad (solo se comparan pesos de la misma familia).
+# Incluye los alias para las filas guardadas antes de canonizar las unidades
+FAMILIAS_UNIDAD = {
+    alias: 'masa' if canonica in ('g', 'kg') else 'volumen'
+    for alias, canonica in UNIDADES.items()
+}
+
 # Palabras a ignorar al limpiar nombre
 PALABRAS_IGNORAR = [
     'de', 'la', 'el', 'en', 'con', 'sin', 'al', 'del', 'los', 'las',
@@ -84,45 +105,12 @@ def extraer_atributos_producto(nombre):
     
     nombre_lower = nombre.lower().strip()
     
-    # 1. EXTRAER PESO/VOLUMEN
-    # Patrones: 170g, 1.5L, 500ml, 1kg, 2,5 kg, etc
-    peso_patterns = [
-        r'(\d+(?:[.,]\d+)?)\s*(kg|g|l|lt|ml|cc|gr|grs|lts)\b',
-        r'(\d+(?:[.,]\d+)?)\s*x\s*(\d+(?:[.,]\d+)?)\s*(kg|g|l|lt|ml|cc|gr)\b'  # Pack: 6 x 1.5L
-    ]
-    
-    for pattern in peso_patterns:
-        peso_match = re.search(pattern, nombre_lower)
-        if peso_match:
-            if len(peso_match.groups()) == 2:
-                # Peso simple
-                peso_str = peso_match.group(1).replace(',', '.')
-                atributos['peso'] = float(peso_str)
-                atributos['peso_unidad'] = peso_match.group(2).lower()
-            elif len(peso_match.groups()) == 3:
-                # Pack (ej: 6 x 1.5L)
-                cantidad = int(peso_match.group(1))
-                peso_str = peso_match.group(2).replace(',', '.')
-                atributos['cantidad_unidades'] = cantidad
-                atributos['peso'] = float(peso_str)
-                atributos['peso_unidad'] = peso_match.group(3).lower()
-            break
-    
-    # 2. EXTRAER CANTIDAD DE UNIDADES
-    # Patrones: pack x 6, 12 unidades, pack 24, x6
-    if not atributos['cantidad_unidades']:
-        cantidad_patterns = [
-            r'pack\s*x?\s*(\d+)',
-            r'x\s*(\d+)\s*u',
-            r'(\d+)\s*unidades',
-            r'x\s*(\d+)(?!\d)',
-        ]
-        
-        for pattern in cantidad_patterns:
-            cantidad_match = re.search(pattern, nombre_lower)
-            if cantidad_match:
-                atributos['cantidad_unidades'] = int(cantidad_match.group(1))
-                break
+    # 1-2. PESO/VOLUMEN Y CANTIDAD DE UNIDADES
+    # Una sola pasada: 170g, 1,5 lts, 6 x 1.5L, 354 ml x 6, pack x 6, x 6 u
+    cantidades = analizar_cantidades(nombre_lower)
+    atributos['peso'] = cantidades['peso']
+    atributos['peso_unidad'] = cantidades['peso_unidad']
+    atributos['cantidad_unidades'] = cantidades['cantidad_unidades']
     
     # 3. DETECTAR MARCA
     for marca in MARCAS_CONOCIDAS:
@@ -137,11 +125,10 @@ def extraer_atributos_producto(nombre):
             break
     
     # 5. GENERAR NOMBRE LIMPIO
+    # Quitar peso y cantidades
     nombre_limpio = nombre_lower
-    
-    # Quitar peso
-    if peso_match:
-        nombre_limpio = nombre_limpio.replace(peso_match.group(0), ' ')
+    for inicio, fin in reversed(cantidades['tramos']):
+        nombre_limpio = nombre_limpio[:inicio] + ' ' + nombre_limpio[fin:]
     
     # Quitar marca
     if atributos['marca']:
@@ -173,23 +160,93 @@ def normalizar_peso_a_base(peso, unidad):
     if not peso or not unidad:
         return 0
     
-    unidad = unidad.lower()
+    unidad = UNIDADES.get(unidad.lower(), unidad.lower())
     
-    # Peso → gramos
-    if unidad in ['kg']:
+    # Peso → gramos, volumen → ml
+    if unidad in ['kg', 'l']:
         return peso * 1000
-    elif unidad in ['g', 'gr', 'grs']:
-        return peso
-    
-    # Volumen → ml
-    elif unidad in ['l', 'lt', 'lts']:
-        return peso * 1000
-    elif unidad in ['ml', 'cc']:
-        return peso
     
     return peso
 
 
+def calcular_features_match(atributos):
+    """
+    Features de matching derivadas de los atributos (se guardan al ingestar
+    para que el scoring no normalice strings en cada comparación)
+
+    Args:
+        atributos (dict): Resultado de extraer_atributos_producto (o una fila de productos)
+
+    Returns:
+        dict: peso_base, unidad_familia, marca_id, variante_id, firma_nombre
+    """
+    peso = atributos.get('peso')
+    unidad = (atributos.get('peso_unidad') or '').lower()
+
+    if peso and unidad in FAMILIAS_UNIDAD:
+        peso_base = normalizar_peso_a_base(peso, unidad)
+        unidad_familia = FAMILIAS_UNIDAD[unidad]
+    elif atributos.get('cantidad_unidades'):
+        peso_base = None
+        unidad_familia = 'unidad'
+    else:
+        peso_base = None
+        unidad_familia = None
+
+    variante = normalizar_texto(atributos.get('variante'))
+
+    return {
+        'peso_base': peso_base,
+        'unidad_familia': unidad_familia,
+        'marca_id': marca_canonica(atributos.get('marca')),
+        'variante_id': variante.replace(' ', '_') or None,
+        'firma_nombre': firma_nombre(atributos.get('nombre_limpio')),
+    }
+
+
+def firma_nombre(nombre):
+    """
+    Tokens normalizados del nombre, sin repetir y ordenados ("entera leche serenisima")
+
+    El scoring compara estos conjuntos (matching.similitud_tokens) en vez de
+    correr SequenceMatcher sobre los nombres en cada par.
+
+    Returns:
+        str: Tokens separados por espacio, o None si no hay nombre
+    """
+    return ' '.join(sorted(set(normalizar_texto(nombre).split()))) or None
+
+
+def marca_canonica(marca):
+    """
+    Id canónico de una marca (sin acentos y con los alias unificados)
+
+    Returns:
+        str: Marca canónica, o None si no hay marca
+    """
+    marca = normalizar_texto(marca)
+    return MARCAS_CANONICAS.get(marca, marca) or None
+
+
+def normalizar_texto(texto):
+    """
+    Normaliza texto para búsquedas: minúsculas, sin acentos y sin espacios extra
+
+    Args:
+        texto (str): Texto original
+
+    Returns:
+        str: Texto normalizado
+    """
+    if not texto:
+        return ""
+
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+
+    return ' '.join(texto.split())
+
+
 # Función de test
 if __name__ == "__main__":
     # Tests
@@ -200,6 +257,8 @@ if __name__ == "__main__":
         "Oreo Clásica 117g",
         "Fideos Matarazzo tirabuzones 500 gr",
         "Pack x 6 Quilmes Clásica 1 L",
+        "Agua mineral Villavicencio 6 x 1,5 L",
+        "Cerveza Brahma lata 473 ml x 6 u",
         "Mayonesa Hellmanns 475g",
         "Leche Serenísima entera 1L"
     ]
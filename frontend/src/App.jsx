@@ -1,12 +1,20 @@
 import { useState, useEffect } from 'react'
-import { supabase } from './config/supabase'
 import { Search, Loader2, X, Moon, Sun, Check, AlertTriangle, RefreshCw } from 'lucide-react'
 import './App.css'
 
+// Sugerencias del typeahead: se piden recién cuando el usuario deja de tipear
+const ESPERA_AUTOCOMPLETADO = 200
+const MINIMO_AUTOCOMPLETADO = 2
+
+// Miniatura servida por el proxy de imágenes del backend (cacheada y redimensionada)
+const imagenProxy = (url, ancho = 240) =>
+  `http://localhost:8000/imagenes?url=${encodeURIComponent(url)}&ancho=${ancho}`
+
 function App() {
   const [busqueda, setBusqueda] = useState('')
   const [loading, setLoading] = useState(false)
   const [resultadosBusqueda, setResultadosBusqueda] = useState([])
+  const [sugerencias, setSugerencias] = useState({})
   const [productosSeleccionados, setProductosSeleccionados] = useState([])
   const [comparacion, setComparacion] = useState(null)
   const [darkMode, setDarkMode] = useState(() => {
@@ -19,21 +27,52 @@ function App() {
     localStorage.setItem('darkMode', JSON.stringify(darkMode))
   }, [darkMode])
 
+  // Typeahead: una sola llamada al índice de autocompletado del backend (ambas tiendas)
+  useEffect(() => {
+    const texto = busqueda.trim()
+    if (texto.length < MINIMO_AUTOCOMPLETADO) {
+      setSugerencias({})
+      return
+    }
+
+    const controlador = new AbortController()
+    const espera = setTimeout(async () => {
+      try {
+        const params = new URLSearchParams({ q: texto, limit: 5 })
+        const response = await fetch(`http://localhost:8000/productos/autocomplete?${params}`, {
+          signal: controlador.signal
+        })
+        if (!response.ok) return
+        const data = await response.json()
+        setSugerencias(data.sugerencias || {})
+      } catch (error) {
+        if (error.name !== 'AbortError') console.error('Error:', error)
+      }
+    }, ESPERA_AUTOCOMPLETADO)
+
+    return () => {
+      clearTimeout(espera)
+      controlador.abort()
+    }
+  }, [busqueda])
+
   // Buscar productos
   const buscarProductos = async (e) => {
     e.preventDefault()
     if (!busqueda.trim()) return
 
     setLoading(true)
+    setSugerencias({})
     
     try {
-      const { data, error } = await supabase
-        .from('productos')
-        .select('*')
-        .ilike('nombre_normalizado', `%${busqueda}%`)
-        .limit(50)
+      const params = new URLSearchParams({ query: busqueda, limit: 50 })
+      const response = await fetch(`http://localhost:8000/productos/buscar?${params}`)
 
-      if (error) throw error
+      if (!response.ok) {
+        throw new Error('Error en la búsqueda')
+      }
+
+      const { productos: data } = await response.json()
 
       if (!data || data.length === 0) {
         alert(`No se encontraron productos con "${busqueda}"`)
@@ -51,6 +90,22 @@ function App() {
     }
   }
 
+  // Elegir una sugerencia: trae la fila completa (peso, categoría, imagen) para comparar
+  const elegirSugerencia = async (sugerencia) => {
+    let producto = sugerencia
+    try {
+      const params = new URLSearchParams({ query: sugerencia.nombre, tienda: sugerencia.tienda, limit: 20 })
+      const response = await fetch(`http://localhost:8000/productos/buscar?${params}`)
+      if (response.ok) {
+        const { productos } = await response.json()
+        producto = productos.find(p => p.id === sugerencia.id) || sugerencia
+      }
+    } catch (error) {
+      console.error('Error:', error)
+    }
+    seleccionarProducto(producto)
+  }
+
   // Seleccionar producto
   const seleccionarProducto = (producto) => {
     const yaSeleccionado = productosSeleccionados.some(p => p.id === producto.id)
@@ -59,9 +114,14 @@ function App() {
       return
     }
 
+    // Sumar popularidad para el autocompletado (no bloquea la UI)
+    fetch(`http://localhost:8000/productos/${producto.id}/seleccion`, { method: 'POST' })
+      .catch(() => {})
+
     setProductosSeleccionados([...productosSeleccionados, producto])
     setBusqueda('')
     setResultadosBusqueda([])
+    setSugerencias({})
   }
 
   // Comparar con matching inteligente
@@ -152,6 +212,7 @@ function App() {
   const limpiar = () => {
     setBusqueda('')
     setResultadosBusqueda([])
+    setSugerencias({})
     setProductosSeleccionados([])
     setComparacion(null)
   }
@@ -247,6 +308,28 @@ function App() {
                         disabled={loading}
                         autoFocus
                       />
+                      {resultadosBusqueda.length === 0 && Object.keys(sugerencias).length > 0 && (
+                        <div className="sugerencias">
+                          {Object.entries(sugerencias).map(([tienda, productos]) => (
+                            <div key={tienda} className="sugerencias-tienda">
+                              <div className="result-tienda">
+                                {tienda === 'Carrefour' ? '🛒 Carrefour' : '🛍️ Disco'}
+                              </div>
+                              {productos.map((producto) => (
+                                <button
+                                  type="button"
+                                  key={producto.id}
+                                  className="sugerencia"
+                                  onClick={() => elegirSugerencia(producto)}
+                                >
+                                  <span>{producto.nombre}</span>
+                                  <span className="sugerencia-precio">${parseFloat(producto.precio).toFixed(2)}</span>
+                                </button>
+                              ))}
+                            </div>
+                          ))}
+                        </div>
+                      )}
                       <p className="hint">
                         💡  
                       </p>
@@ -288,7 +371,7 @@ function App() {
                         <div key={producto.id} className="result-card" onClick={() => seleccionarProducto(producto)}>
                           {producto.imagen_url && (
                             <div className="result-image">
-                              <img src={producto.imagen_url} alt={producto.nombre} onError={(e) => e.target.style.display = 'none'} />
+                              <img src={imagenProxy(producto.imagen_url)} alt={producto.nombre} loading="lazy" onError={(e) => e.target.style.display = 'none'} />
                             </div>
                           )}
                           
@@ -409,7 +492,7 @@ function ProductoComparado({ producto, onCambiar }) {
         <div className="origin-badge">✓ Producto seleccionado</div>
         {producto.imagen_url && (
           <div className="product-image">
-            <img src={producto.imagen_url} alt={producto.nombre} onError={(e) => e.target.style.display = 'none'} />
+            <img src={imagenProxy(producto.imagen_url)} alt={producto.nombre} loading="lazy" onError={(e) => e.target.style.display = 'none'} />
           </div>
         )}
         <div className="product-name">{producto.nombre}</div>
@@ -437,7 +520,7 @@ function ProductoComparado({ producto, onCambiar }) {
 
       {producto.imagen_url && (
         <div className="product-image">
-          <img src={producto.imagen_url} alt={producto.nombre} onError={(e) => e.target.style.display = 'none'} />
+          <img src={imagenProxy(producto.imagen_url)} alt={producto.nombre} loading="lazy" onError={(e) => e.target.style.display = 'none'} />
         </div>
       )}
       
@@ -1,5 +1,4 @@
 import { useState } from 'react'
-import { supabase } from '../config/supabase'
 import { Search, Loader2, AlertCircle, TrendingDown, X } from 'lucide-react'
 
 export default function Home() {
@@ -34,23 +33,13 @@ export default function Home() {
       for (const productoBuscado of productosBuscados) {
         console.log(`🔍 Buscando: ${productoBuscado}`)
 
-        // Buscar en Carrefour
-        const { data: carrefourResults } = await supabase
-          .from('productos')
-          .select('*')
-          .eq('tienda', 'Carrefour')
-          .ilike('nombre', `%${productoBuscado}%`)
-          .order('precio', { ascending: true })
-          .limit(1)
-
-        // Buscar en Disco
-        const { data: discoResults } = await supabase
-          .from('productos')
-          .select('*')
-          .eq('tienda', 'Disco')
-          .ilike('nombre', `%${productoBuscado}%`)
-          .order('precio', { ascending: true })
-          .limit(1)
+        // Una sola llamada al autocompletado del backend trae el más popular de cada tienda
+        const params = new URLSearchParams({ q: productoBuscado, limit: 1 })
+        const response = await fetch(`http://localhost:8000/productos/autocomplete?${params}`)
+        if (!response.ok) throw new Error('Error en el autocompletado')
+        const { sugerencias } = await response.json()
+        const carrefourResults = sugerencias.Carrefour
+        const discoResults = sugerencias.Disco
 
         // Agregar a carritos
         if (carrefourResults && carrefourResults.length > 0) {